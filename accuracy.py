@@ -0,0 +1,115 @@
+import argparse
+import contextlib
+import io
+import json
+
+import genshin_stats
+import test
+from genshin_stats import CHAR_RULES, WEAPON_RULES
+
+# goal name -> (featured characters, featured weapons)
+GOALS = {"C0": (1, 0), "C1": (2, 0), "C0R1": (1, 1), "C2R1": (3, 1)}
+PITIES = (0, 70)
+WISHES = (50, 100, 180, 300, 600)
+
+
+def exact_engine(goal, wishes, pity):
+    char, weapon = GOALS[goal]
+    return genshin_stats.get_exact_proba(wishes, char, weapon, pity, pity)
+
+
+def prob_wanted_engine(goal, wishes, pity):
+    if GOALS[goal] != (1, 0):
+        return None
+    return genshin_stats.prob_wanted(pity, pity, wishes, wishes, *CHAR_RULES, *WEAPON_RULES)
+
+
+def test_engine(goal, wishes, pity):
+    char, weapon = GOALS[goal]
+    return test.get_proba(wishes, char, pity, False, weapon, pity, False) * 100
+
+
+def test2_engine(goal, wishes, pity):
+    import test2
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return test2.chance(goal, wishes, pity, pity)
+
+
+# every engine gives the chance in % or None when it can't model the goal
+ENGINES = {
+    "genshin_stats.get_exact_proba": exact_engine,
+    "prob_wanted": prob_wanted_engine,
+    "test.get_proba": test_engine,
+    "test2.chance": test2_engine,
+}
+
+
+def monte_carlo(goal, wishes, pity, number_of_pulls, confidence):
+    # (chance, lower, upper) in % from the batch simulation of genshin_stats
+    char, weapon = GOALS[goal]
+    combined_banner = genshin_stats.CombinedBanner(pity, pity)
+    res = combined_banner.test_number_of_pulls_counter(wishes, char + weapon, char, number_of_pulls, batch=True)
+    lower, upper = res.confidence_interval(confidence)
+    return float(res.proportion()) * 100, float(lower) * 100, float(upper) * 100
+
+
+def run_scenarios(engines=tuple(ENGINES), goals=tuple(GOALS), pities=PITIES, wishes=WISHES, number_of_pulls=1_000_000, confidence=0.95):
+    scenarios = []
+    summary = {engine: {"max_abs_deviation": 0.0, "inside_ci": 0, "compared": 0} for engine in engines}
+    for goal in goals:
+        for pity in pities:
+            for number_of_wishes in wishes:
+                chance, lower, upper = monte_carlo(goal, number_of_wishes, pity, number_of_pulls, confidence)
+                scenario = {"goal": goal, "pity": pity, "wishes": number_of_wishes, "monte_carlo": chance, "ci": [lower, upper], "engines": {}}
+                for engine in engines:
+                    try:
+                        value = ENGINES[engine](goal, number_of_wishes, pity)
+                    except ImportError as e:
+                        summary[engine]["skipped"] = str(e)
+                        continue
+                    if value is None:
+                        continue
+                    value = float(value)
+                    inside = bool(lower <= value <= upper)
+                    scenario["engines"][engine] = {"chance": value, "deviation": value - chance, "inside_ci": inside}
+                    summary[engine]["max_abs_deviation"] = max(summary[engine]["max_abs_deviation"], abs(value - chance))
+                    summary[engine]["inside_ci"] += inside
+                    summary[engine]["compared"] += 1
+                scenarios.append(scenario)
+    for engine_summary in summary.values():
+        engine_summary["agrees"] = engine_summary["compared"] > 0 and engine_summary["inside_ci"] == engine_summary["compared"]
+    return {"number_of_pulls": number_of_pulls, "confidence": confidence, "summary": summary, "scenarios": scenarios}
+
+
+def print_report(report):
+    for scenario in report["scenarios"]:
+        lower, upper = scenario["ci"]
+        print(f"{scenario['goal']:>5} pity {scenario['pity']:>2} {scenario['wishes']:>4} wishes: monte carlo {scenario['monte_carlo']:.3f}% [{lower:.3f}, {upper:.3f}]")
+        for engine, result in scenario["engines"].items():
+            mark = "" if result["inside_ci"] else "  <- outside"
+            print(f"    {engine:<30} {result['chance']:8.3f}% ({result['deviation']:+.3f}){mark}")
+    print("")
+    for engine, engine_summary in report["summary"].items():
+        if "skipped" in engine_summary:
+            print(f"{engine:<30} skipped: {engine_summary['skipped']}")
+            continue
+        print(f"{engine:<30} max |deviation| {engine_summary['max_abs_deviation']:.3f}%, {engine_summary['inside_ci']}/{engine_summary['compared']} inside the confidence interval")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the wish probability engines against the monte carlo simulation.")
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument("--goals", nargs="+", default=list(GOALS), choices=list(GOALS))
+    parser.add_argument("--pities", nargs="+", type=int, default=list(PITIES))
+    parser.add_argument("--wishes", nargs="+", type=int, default=list(WISHES))
+    parser.add_argument("--pulls", type=int, default=1_000_000, help="monte carlo trials per scenario")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--output", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    report = run_scenarios(args.engines, args.goals, args.pities, args.wishes, args.pulls, args.confidence)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
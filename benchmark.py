@@ -0,0 +1,127 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+import genshin_stats
+import test
+from genshin_stats import CHAR_RULES, WEAPON_RULES
+
+# goal name -> (featured characters, featured weapons)
+GOALS = {"C0": (1, 0), "C2R1": (3, 1), "C6R5": (7, 5)}
+PITIES = (0, 70)
+WISHES = (100, 500, 1000, 2000)
+
+
+def clear_caches(module):
+    for value in vars(module).values():
+        if hasattr(value, "cache_clear"):
+            value.cache_clear()
+
+
+def run_genshin_stats(goal, wishes, pity, number_of_pulls):
+    char, weapon = GOALS[goal]
+    genshin_stats.get_proba(wishes, char, weapon, pity, pity, number_of_pulls, batch=True)
+    return number_of_pulls
+
+
+def run_prob_wanted(goal, wishes, pity, number_of_pulls):
+    # closed form of a single wanted 5-star, every wish on the character banner
+    genshin_stats.prob_wanted(pity, pity, wishes, wishes, *CHAR_RULES, *WEAPON_RULES)
+    return 1
+
+
+def run_test(goal, wishes, pity, number_of_pulls):
+    char, weapon = GOALS[goal]
+    clear_caches(test)
+    test.get_proba(wishes, char, pity, False, weapon, pity, False)
+    return 1
+
+
+def run_test2(goal, wishes, pity, number_of_pulls):
+    import test2
+
+    clear_caches(test2)
+    with contextlib.redirect_stdout(io.StringIO()):
+        test2.chance(goal, wishes, pity, pity)
+    return 1
+
+
+ENGINES = {
+    "genshin_stats.get_proba": run_genshin_stats,
+    "prob_wanted": run_prob_wanted,
+    "test.get_proba": run_test,
+    "test2.chance": run_test2,
+}
+
+# prob_wanted only knows about the first wanted character
+SUPPORTED_GOALS = {"prob_wanted": ("C0",)}
+
+
+def measure(function, goal, wishes, pity, number_of_pulls, repeat):
+    """Best wall time over repeat runs, with the peak memory of the first one."""
+    tracemalloc.start()
+    function(goal, wishes, pity, number_of_pulls)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = function(goal, wishes, pity, number_of_pulls)
+        times.append(time.perf_counter() - start)
+    wall_time = min(times)
+    return {"wall_time": wall_time, "throughput": count / wall_time, "unit": "trials/s" if count > 1 else "queries/s", "peak_memory": peak}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(engines=tuple(ENGINES), goals=tuple(GOALS), pities=PITIES, wishes=WISHES, number_of_pulls=100_000, repeat=3):
+    results = []
+    for engine in engines:
+        for goal in goals:
+            if goal not in SUPPORTED_GOALS.get(engine, GOALS):
+                continue
+            for pity in pities:
+                for number_of_wishes in wishes:
+                    result = {"engine": engine, "goal": goal, "pity": pity, "wishes": number_of_wishes}
+                    try:
+                        result.update(measure(ENGINES[engine], goal, number_of_wishes, pity, number_of_pulls, repeat))
+                    except ImportError as e:
+                        result["skipped"] = str(e)
+                    results.append(result)
+                    print(result)
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "number_of_pulls": number_of_pulls,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the wish probability engines.")
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument("--goals", nargs="+", default=list(GOALS), choices=list(GOALS))
+    parser.add_argument("--pities", nargs="+", type=int, default=list(PITIES))
+    parser.add_argument("--wishes", nargs="+", type=int, default=list(WISHES))
+    parser.add_argument("--pulls", type=int, default=100_000, help="monte carlo trials per query")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="benchmark.json")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.engines, args.goals, args.pities, args.wishes, args.pulls, args.repeat)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
@@ -0,0 +1,41 @@
+import numpy as np
+
+# stat names of getStats in artefact_optim/backend/main.js (gcsim names), dmg%
+# is a damage bonus for every element that only sets and buffs give
+ARTIFACT_KEYS = ["hp", "hp%", "atk", "atk%", "def", "def%", "em", "er", "cr", "cd", "heal", "pyro%", "cryo%", "hydro%", "electro%", "anemo%", "geo%", "dendro%", "physical%", "dmg%"]
+KEY_INDEX = {key: index for index, key in enumerate(ARTIFACT_KEYS)}
+
+# static part of the set bonuses, shared by the optimizer and the rotation
+# simulator, conditional effects go in Target.stats of the optimizer
+SET_BONUSES = {
+    "archaicpetra": {2: {"geo%": 0.15}},
+    "blizzardstrayer": {2: {"cryo%": 0.15}, 4: {"cr": 0.4}},  # 4 pieces against a frozen enemy
+    "crimsonwitchofflames": {2: {"pyro%": 0.15}, 4: {"pyro%": 0.075}},  # 4 pieces with one stack
+    "deepwoodmemories": {2: {"dendro%": 0.15}},
+    "echoesofanoffering": {2: {"atk%": 0.18}},
+    "emblemofseveredfate": {2: {"er": 0.2}},
+    "finaleofthedeepgalleries": {2: {"cryo%": 0.15}},
+    "gladiatorsfinale": {2: {"atk%": 0.18}},
+    "heartofdepth": {2: {"hydro%": 0.15}},
+    "marechausseehunter": {2: {}},
+    "nighttimewhispersintheechoingwoods": {2: {"atk%": 0.18}},
+    "shimenawasreminiscence": {2: {"atk%": 0.18}},
+    "tenacityofthemillelith": {2: {"hp%": 0.2}},
+    "thunderingfury": {2: {"electro%": 0.15}},
+    "vermillionhereafter": {2: {"atk%": 0.18}},
+    "viridescentvenerer": {2: {"anemo%": 0.15}},
+    "wandererstroupe": {2: {"em": 80}},
+}
+
+
+def stats_vector(stats):
+    """Vector indexed like ARTIFACT_KEYS from a dict or a list of one-key dicts."""
+    if isinstance(stats, dict):
+        stats = [stats]
+    vector = np.zeros(len(ARTIFACT_KEYS))
+    for stat in stats:
+        for key, value in stat.items():
+            if key not in KEY_INDEX:
+                raise ValueError(f"Invalid stat key: {key}")
+            vector[KEY_INDEX[key]] += value
+    return vector
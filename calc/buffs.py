@@ -0,0 +1,103 @@
+from collections import namedtuple
+
+import numpy as np
+
+from char import Character
+
+# a buff is a constant delta on the stats of the buffed character, or on the
+# enemy for debuffs (resistance shred, def reduction), given as a dict
+Buff = namedtuple("Buff", ["name", "kind", "effect"])
+
+KINDS = ("character", "weapon", "set", "resonance", "enemy")
+
+# stats that are not on the Character sheet but change the damage formula
+EXTRA_KEYS = ["atk_flat", "enemy_resistance", "def_reduction", "def_ignore", "reaction_bonus"]
+BUFF_KEYS = Character.STAT_KEYS + EXTRA_KEYS
+BUFF_INDEX = {key: index for index, key in enumerate(BUFF_KEYS)}
+NUMBER_OF_STATS = len(Character.STAT_KEYS)
+
+BUFFS = {}
+
+
+def register_buff(name, kind, **effect):
+    if kind not in KINDS:
+        raise ValueError(f"Invalid buff kind: {kind}")
+    for key in effect:
+        if key not in BUFF_INDEX:
+            raise ValueError(f"Invalid buff key: {key}")
+    BUFFS[name] = Buff(name, kind, effect)
+    return BUFFS[name]
+
+
+def effect_vector(effect, ignore_unknown=False):
+    """Delta vector indexed like BUFF_KEYS from a {buff key: value} dict."""
+    vector = np.zeros(len(BUFF_KEYS))
+    for key, value in effect.items():
+        if key not in BUFF_INDEX:
+            if ignore_unknown:
+                continue
+            raise ValueError(f"Invalid buff key: {key}")
+        vector[BUFF_INDEX[key]] += value
+    return vector
+
+
+def buff_matrix(names):
+    """One delta row per registered buff."""
+    matrix = np.zeros((len(names), len(BUFF_KEYS)))
+    for row, name in enumerate(names):
+        matrix[row] = effect_vector(BUFFS[name].effect)
+    return matrix
+
+
+def team_delta(team):
+    """Delta of a team, the sum of its buffs (a buff given twice counts twice)."""
+    return buff_matrix(list(team)).sum(axis=0)
+
+
+def team_deltas(teams):
+    """
+    Deltas of many teams at once.
+
+    Parameters
+    ----------
+    teams : list of iterables of buff names
+
+    Returns
+    -------
+    numpy array of shape (len(teams), len(BUFF_KEYS))
+        Each team as counts of every buff used, times the buff matrix.
+    """
+    names = sorted({name for team in teams for name in team})
+    column = {name: index for index, name in enumerate(names)}
+    counts = np.zeros((len(teams), len(names)))
+    for row, team in enumerate(teams):
+        for name in team:
+            counts[row, column[name]] += 1
+    return counts @ buff_matrix(names)
+
+
+def apply_buffs(stats, deltas):
+    """
+    Stats of characters with team deltas added, stats has a row per character
+    and deltas a row per team, the result is (characters, teams, stats).
+    """
+    stats = np.atleast_2d(stats)
+    deltas = np.atleast_2d(deltas)
+    return stats[:, None, :] + deltas[None, :, :NUMBER_OF_STATS]
+
+
+def column(deltas, key):
+    return deltas[..., BUFF_INDEX[key]]
+
+
+# natlan / mavuika team from genshin_calc.py
+register_buff("natlan", "character", atk_percentage=0.3)
+register_buff("bennett_burst_c1", "character", atk_flat=1.01 * 799 * 1.2)
+register_buff("noblesse_oblige", "set", atk_percentage=0.2)
+register_buff("iansan_burst", "character", atk_flat=690)
+register_buff("xilonen_skill", "enemy", enemy_resistance=-0.36)
+register_buff("xilonen_a4", "character", pyro_damage=0.35)
+register_buff("scroll_of_the_hero", "set", pyro_damage=0.4)
+register_buff("thrilling_tales", "weapon", atk_percentage=0.48)
+register_buff("citlali_c0", "enemy", enemy_resistance=-0.2)
+register_buff("pyro_resonance", "resonance", atk_percentage=0.25)
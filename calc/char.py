@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class Character:
     STAT_KEYS = [
         "base_pv",
@@ -21,6 +24,27 @@ class Character:
         "healing_bonus_recieved",
         "damage_bonus",
     ]
+    STAT_INDEX = {key: index for index, key in enumerate(STAT_KEYS)}
+
+    # the stats are three float64 vectors indexed like STAT_KEYS: base stats,
+    # temporary stats and buffs, a stat is the sum of the three
+    __slots__ = (
+        "name",
+        "level",
+        "weapon",
+        "artifacts",
+        "passive_bonuses",
+        "elemental_type",
+        "stats_scalling",
+        "passive_effects",
+        "elemental_skill",
+        "burst",
+        "normal_attack",
+        "charged_attack",
+        "base",
+        "tmp",
+        "buff",
+    )
 
     def __init__(
         self,
@@ -38,9 +62,6 @@ class Character:
         normal_attack=None,
         charged_attack=None,
     ):
-        for key in base_stats:
-            if key not in self.STAT_KEYS:
-                raise ValueError(f"Invalid stat key: {key}")
         self.name = name
         self.level = level
         self.weapon = weapon
@@ -53,13 +74,61 @@ class Character:
         self.burst = burst
         self.normal_attack = normal_attack
         self.charged_attack = charged_attack
-        self.tmp_stats = {}
-        for key in self.STAT_KEYS:
-            setattr(self, key, base_stats.get(key, 0))
-            getter = self._make_getter(key)
-            setattr(self.__class__, key, property(getter))
-
-    def _make_getter(self, key):
-        def getter():
-            return getattr(self, key) + self.tmp_stats.get(key, 0)
-        return getter
+        self.base = self.stats_vector(base_stats)
+        self.tmp = np.zeros(len(self.STAT_KEYS))
+        self.buff = np.zeros(len(self.STAT_KEYS))
+
+    @classmethod
+    def stats_vector(cls, stats):
+        """Vector indexed like STAT_KEYS from a {stat key: value} dict."""
+        vector = np.zeros(len(cls.STAT_KEYS))
+        for key, value in stats.items():
+            if key not in cls.STAT_INDEX:
+                raise ValueError(f"Invalid stat key: {key}")
+            vector[cls.STAT_INDEX[key]] = value
+        return vector
+
+    @property
+    def stats(self):
+        return self.base + self.tmp + self.buff
+
+    def stats_dict(self):
+        return dict(zip(self.STAT_KEYS, self.stats.tolist()))
+
+    def add_buff(self, buff):
+        # buff is a {stat key: value} dict or a vector indexed like STAT_KEYS
+        self.buff += self.stats_vector(buff) if isinstance(buff, dict) else buff
+
+    def clear_buffs(self):
+        self.buff[:] = 0
+
+    def clear_tmp(self):
+        self.tmp[:] = 0
+
+    @classmethod
+    def stack(cls, characters, layer="stats"):
+        """One row per character of the given layer (stats, base, tmp or buff)."""
+        if not characters:
+            return np.zeros((0, len(cls.STAT_KEYS)))
+        return np.stack([getattr(character, layer) for character in characters])
+
+    @classmethod
+    def column(cls, stats, key):
+        """Column of a stacked array for a stat key."""
+        return stats[..., cls.STAT_INDEX[key]]
+
+
+def _make_property(index):
+    def getter(self):
+        return self.base[index] + self.tmp[index] + self.buff[index]
+
+    def setter(self, value):
+        # the base stat moves so that the stat gets the value
+        self.base[index] += value - getter(self)
+
+    return property(getter, setter)
+
+
+# one property per stat, installed once on the class
+for _index, _key in enumerate(Character.STAT_KEYS):
+    setattr(Character, _key, _make_property(_index))
@@ -0,0 +1,57 @@
+import numpy as np
+
+# Every function broadcasts its arguments with numpy, a single stat sheet can
+# be given as floats and many of them (or many enemies / buffs) as arrays.
+
+MELT_PYRO = 2.0  # pyro hitting cryo
+MELT_CRYO = 1.5
+VAPORIZE_HYDRO = 2.0  # hydro hitting pyro
+VAPORIZE_PYRO = 1.5
+
+
+def calc_res(res):
+    res = np.asarray(res, dtype=float)
+    return np.where(res < 0, 1 - res / 2, np.where(res < 0.75, 1 - res, 1 / (4 * res + 1)))
+
+
+def final_attack(base_attack, attack_percentage, attack_flat):
+    return np.asarray(base_attack, dtype=float) * (1 + np.asarray(attack_percentage)) + attack_flat
+
+
+def calc_def_mult(level, enemy_level, def_reduction=0.0, def_ignore=0.0):
+    level = np.asarray(level, dtype=float)
+    return (level + 100) / ((level + 100) + (np.asarray(enemy_level) + 100) * (1 - np.asarray(def_reduction)) * (1 - np.asarray(def_ignore)))
+
+
+def calc_amplification(elemental_mastery, reaction_multiplier=MELT_PYRO, reaction_bonus=0.0):
+    # melt / vaporize multiplier, reaction_multiplier 1 means no reaction
+    elemental_mastery = np.asarray(elemental_mastery, dtype=float)
+    amplification = reaction_multiplier * (1 + reaction_bonus + (2.78 * elemental_mastery) / (elemental_mastery + 1400))
+    return np.where(np.asarray(reaction_multiplier) == 1, 1.0, amplification)
+
+
+def calc_crit_mult(crit_rate, crit_damage, crit=None):
+    # average multiplier when crit is None, else the one of a (non) critical hit
+    if crit is None:
+        return 1 + np.clip(crit_rate, 0, 1) * np.asarray(crit_damage)
+    return 1 + np.asarray(crit_damage) * np.asarray(crit, dtype=float)
+
+
+def damage_breakdown(base_attack, attack_percentage, attack_flat, skill_multiplier, crit_rate, crit_damage, damage_bonus, elemental_mastery=0, level=90, enemy_level=100, enemy_resistance=0.1, def_reduction=0.0, def_ignore=0.0, reaction_multiplier=1.0, reaction_bonus=0.0, crit=None):
+    """Every multiplier of the damage formula, the damage is their product."""
+    return {
+        "base_damage": final_attack(base_attack, attack_percentage, attack_flat) * skill_multiplier,
+        "crit_multiplier": calc_crit_mult(crit_rate, crit_damage, crit),
+        "enemy_def_multiplier": calc_def_mult(level, enemy_level, def_reduction, def_ignore),
+        "resistance_multiplier": calc_res(enemy_resistance),
+        "damage_multiplier": 1.0 + np.asarray(damage_bonus, dtype=float),
+        "amplification_reaction": calc_amplification(elemental_mastery, reaction_multiplier, reaction_bonus),
+    }
+
+
+def calc_damage(*args, **kwargs):
+    """Damage of a hit, same arguments as damage_breakdown."""
+    res = 1.0
+    for multiplier in damage_breakdown(*args, **kwargs).values():
+        res = res * multiplier
+    return res
@@ -0,0 +1,206 @@
+import re
+from collections import namedtuple
+
+# one action of the rotation, count is the n of "attack:n"
+Action = namedtuple("Action", ["character", "action", "count"])
+
+WHITESPACE = re.compile(r"\s*")
+STATEMENT_END = re.compile(r"[;{}]")
+LOOP = re.compile(r"for\s+let\s+(\w+)\s*=\s*(-?\d+)\s*;\s*(\w+)\s*(<=|<)\s*(-?\d+)\s*;\s*(\w+)\s*=\s*(\w+)\s*\+\s*(\d+)\s*\{")
+
+
+class CharacterConfig:
+    def __init__(self, name, level=90, max_level=90, constellation=0, talents=(1, 1, 1)):
+        self.name = name
+        self.level = level
+        self.max_level = max_level
+        self.constellation = constellation
+        self.talents = talents
+        self.weapon = None  # {"name", "refine", "lvl"}
+        self.sets = {}  # {set name: pieces}
+        self.stats = {}  # {stat key: value}, every "add stats" summed
+
+
+class Config:
+    """
+    A gcsim config as in artefact_optim/backend/skirk.md: characters with
+    their weapon, sets and stats, options, targets, energy and the rotation
+    with its loops unrolled.
+    """
+
+    def __init__(self):
+        self.characters = {}
+        self.options = {}
+        self.targets = []
+        self.energy = {}
+        self.active = None
+        self.rotation = []
+
+    @property
+    def iterations(self):
+        return int(self.options.get("iteration", 1000))
+
+
+def strip_comments(text):
+    # "#" and "//" comments, up to the end of the line
+    return "\n".join(re.split(r"#|//", line, maxsplit=1)[0] for line in text.splitlines())
+
+
+def parse_value(value):
+    if value.startswith('"') and value.endswith('"'):
+        return value[1:-1]
+    if "," in value:
+        return [parse_value(part) for part in value.split(",")]
+    if "/" in value:
+        return tuple(parse_value(part) for part in value.split("/"))
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+def parse_fields(words):
+    # key=value words to a dict
+    fields = {}
+    for word in words:
+        if "=" not in word:
+            raise ValueError(f"Invalid field: {word}")
+        key, value = word.split("=", 1)
+        fields[key] = parse_value(value)
+    return fields
+
+
+def add_stats(stats, words):
+    # "add stats" can give a key more than once (one per substat), they add up
+    for word in words:
+        key, value = word.split("=", 1)
+        stats[key] = stats.get(key, 0) + parse_value(value)
+
+
+def parse_statement(config, statement):
+    words = re.findall(r'[^\s=]+="[^"]*"|\S+', statement)
+    if not words:
+        return
+    head = words[0]
+    if head == "options":
+        config.options.update(parse_fields(words[1:]))
+    elif head == "target":
+        config.targets.append(parse_fields(words[1:]))
+    elif head == "energy":
+        # energy every interval=480,720 amount=1
+        config.energy = parse_fields(words[2:])
+    elif head == "active":
+        config.active = words[1]
+    elif len(words) > 1 and words[1] == "char":
+        fields = parse_fields(words[2:])
+        level = fields.get("lvl", (90, 90))
+        level = level if isinstance(level, tuple) else (level, level)
+        talents = fields.get("talent", [1, 1, 1])
+        config.characters[head] = CharacterConfig(head, level[0], level[1], fields.get("cons", 0), tuple(talents))
+    elif len(words) > 2 and words[1] == "add":
+        if head not in config.characters:
+            raise ValueError(f"Unknown character: {head}")
+        character = config.characters[head]
+        kind = words[2].split("=", 1)[0]
+        if kind == "weapon":
+            character.weapon = parse_fields(words[2:])
+        elif kind == "set":
+            fields = parse_fields(words[2:])
+            character.sets[fields["set"]] = fields.get("count", 4)
+        elif kind == "stats":
+            add_stats(character.stats, words[3:])
+        else:
+            raise ValueError(f"Unknown add: {kind}")
+    elif head in config.characters:
+        # skirk skill, attack:2, burst;
+        for action in " ".join(words[1:]).split(","):
+            action = action.strip()
+            if not action:
+                continue
+            name, _, count = action.partition(":")
+            config.rotation.append(Action(head, name.strip(), int(count) if count else 1))
+    else:
+        raise ValueError(f"Unknown statement: {statement.strip()}")
+
+
+def parse_block(config, text, position=0):
+    # statements up to the closing brace, returns the position after it
+    while True:
+        position = WHITESPACE.match(text, position).end()
+        if position >= len(text):
+            return position
+        if text[position] == "}":
+            return position + 1
+        loop = LOOP.match(text, position)
+        if loop:
+            variable, first, condition, comparison, last, assigned, incremented, step = loop.groups()
+            if not variable == condition == assigned == incremented:
+                raise ValueError(f"Unsupported loop: {loop.group(0)}")
+            count = len(range(int(first), int(last) + (comparison == "<="), int(step)))
+            body_start = len(config.rotation)
+            position = parse_block(config, text, loop.end())
+            body = config.rotation[body_start:]
+            config.rotation[body_start:] = body * count
+            continue
+        end = STATEMENT_END.search(text, position)
+        if end is None:
+            parse_statement(config, text[position:])
+            return len(text)
+        if text[end.start()] != ";":
+            raise ValueError(f"Unsupported block: {text[position:end.start() + 1].strip()}")
+        parse_statement(config, text[position:end.start()])
+        position = end.end()
+
+
+def parse_config(text):
+    """Config of the text of a gcsim config."""
+    config = Config()
+    parse_block(config, strip_comments(text))
+    return config
+
+
+def format_value(value):
+    # inverse of parse_value, strings are always quoted
+    if isinstance(value, str):
+        return f'"{value}"'
+    if isinstance(value, list):
+        return ",".join(format_value(part) for part in value)
+    if isinstance(value, tuple):
+        return "/".join(format_value(part) for part in value)
+    return repr(value)
+
+
+def format_fields(fields):
+    return " ".join(f"{key}={format_value(value)}" for key, value in fields.items())
+
+
+def format_config(config):
+    """gcsim text of a Config, parse_config gives it back with the loops unrolled."""
+    lines = []
+    for name, character in config.characters.items():
+        lines.append(f"{name} char lvl={character.level}/{character.max_level} cons={character.constellation} talent={format_value(list(character.talents))};")
+        if character.weapon is not None:
+            lines.append(f"{name} add {format_fields(character.weapon)};")
+        for set_name, count in character.sets.items():
+            lines.append(f'{name} add set="{set_name}" count={count};')
+        if character.stats:
+            lines.append(f"{name} add stats {format_fields(character.stats)};")
+    if config.options:
+        lines.append(f"options {format_fields(config.options)};")
+    for target in config.targets:
+        lines.append(f"target {format_fields(target)};")
+    if config.energy:
+        lines.append(f"energy every {format_fields(config.energy)};")
+    if config.active is not None:
+        lines.append(f"active {config.active};")
+    for action in config.rotation:
+        lines.append(f"{action.character} {action.action}" + (f":{action.count}" if action.count != 1 else "") + ";")
+    return "\n".join(lines) + "\n"
+
+
+def load_config(path):
+    with open(path) as file:
+        return parse_config(file.read())
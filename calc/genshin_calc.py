@@ -1,13 +1,8 @@
 # 810538
 # 14668 no reaction, no bonus from teammates
 
-def calc_res(res):
-    if res < 0:
-        return 1 - (res / 2)
-    elif res < 0.75:
-        return 1 - res
-    else:
-        return 1 / (4 * res + 1)
+from buffs import column, team_delta
+from damage import MELT_PYRO, damage_breakdown
 
 
 
@@ -31,25 +26,22 @@ enemy_resistance = 0.1
 
 
 # team buffs
-
-# natlan's buffs
-attack_percentage += 0.3 # natlan's passive
-
-# Bennett's buffs
-attack_flat += 1.01 * 799  * 1.2 # Bennett's ATK buff and C1
-attack_percentage += 0.2 # Noble Obligation artifact set bonus
-
-# iansan's buffs
-# attack_flat += 690
-
-# xilonen's buffs
-enemy_resistance -= 0.36
-elemental_damage += 0.35
-
-# citlali's buffs
-elemental_damage += 0.4 # scrolls artifact set bonus
-attack_percentage += 0.48 # ttds weapon passive
-enemy_resistance -= 0.2 # citlali's debuff
+team = [
+    "natlan", # natlan's passive
+    "bennett_burst_c1", # Bennett's ATK buff and C1
+    "noblesse_oblige", # Noble Obligation artifact set bonus
+    # "iansan_burst",
+    "xilonen_skill", # xilonen's res shred
+    "xilonen_a4",
+    "scroll_of_the_hero", # scrolls artifact set bonus
+    "thrilling_tales", # ttds weapon passive
+    "citlali_c0", # citlali's debuff
+]
+delta = team_delta(team)
+attack_percentage += column(delta, "atk_percentage")
+attack_flat += column(delta, "atk_flat")
+elemental_damage += column(delta, "pyro_damage")
+enemy_resistance += column(delta, "enemy_resistance")
 
 # cleanup stats
 crit_rate = max(min(crit_rate,1.0), 0)
@@ -59,30 +51,26 @@ crit = True
 skill_multiplier = 8.006 + (0.029*200) # Base skill multiplier + bonus from 200 fp
 
 
-final_attack = (base_attack) * (1 + attack_percentage) + attack_flat
-
-
-base_damage = final_attack * skill_multiplier
 melt = True
-dammage_multiplier = 1.0 + (elemental_damage + bonus_damage)
-avg_crit_multiplier = 1 + (crit_rate * crit_damage)
-true_crit_multiplier = 1 + (crit_damage * int(crit))
-
-enemy_def_mult = (level + 100) / ((level + 100) + (enemy_level + 100) * (1 - 0.0)) * (1 - 0) # no def reduc, no def ignore
-base_resistance = enemy_resistance - 0.0 # no resistance shred
-res_mult = calc_res(base_resistance)
-
-amplification_reaction = 2 * (1 + 0 + (2.78* elemental_mastery) / (elemental_mastery + 1400)) # no reaction bonus
-if not melt:
-    amplification_reaction = 1
 
-total_damage_avg = base_damage * avg_crit_multiplier * enemy_def_mult * res_mult * dammage_multiplier * amplification_reaction
-total_damage = base_damage * true_crit_multiplier * enemy_def_mult * res_mult * dammage_multiplier * amplification_reaction
+breakdown = damage_breakdown(
+    base_attack, attack_percentage, attack_flat, skill_multiplier,
+    crit_rate, crit_damage, elemental_damage + bonus_damage,
+    elemental_mastery=elemental_mastery,
+    level=level,
+    enemy_level=enemy_level,
+    enemy_resistance=enemy_resistance, # with the xilonen and citlali shred of the team
+    reaction_multiplier=MELT_PYRO if melt else 1.0, # no reaction bonus
+    crit=crit,
+) # no def reduc, no def ignore
+total_damage = 1.0
+for multiplier in breakdown.values():
+    total_damage *= float(multiplier)
 print("Total Damage:", total_damage)
 print("inspect formula")
-print("Base Damage:", base_damage)
-print("Crit Multiplier:", true_crit_multiplier)
-print("Enemy Def Multiplier:", enemy_def_mult)
-print("Resistance Multiplier:", res_mult)
-print("Damage Multiplier:", dammage_multiplier)
-print("Amplification Reaction:", amplification_reaction)
+print("Base Damage:", float(breakdown["base_damage"]))
+print("Crit Multiplier:", float(breakdown["crit_multiplier"]))
+print("Enemy Def Multiplier:", float(breakdown["enemy_def_multiplier"]))
+print("Resistance Multiplier:", float(breakdown["resistance_multiplier"]))
+print("Damage Multiplier:", float(breakdown["damage_multiplier"]))
+print("Amplification Reaction:", float(breakdown["amplification_reaction"]))
@@ -1,3 +1,6 @@
+from buffs import NUMBER_OF_STATS, effect_vector
+
+
 class Object:
     def __init__(self, name,effect_bonus={},passive_bonus={}):
         self.name = name
@@ -5,6 +8,5 @@ class Object:
         self.passive_bonus = passive_bonus
     
     def add_effect_bonus(self, character):
-        for key, bonus in self.effect_bonus.items():
-            if hasattr(character, key):
-                setattr(character, key, getattr(character, key) + bonus)
\ No newline at end of file
+        # keys the character sheet does not have are skipped, as before
+        character.add_buff(effect_vector(self.effect_bonus, ignore_unknown=True)[:NUMBER_OF_STATS])
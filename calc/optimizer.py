@@ -0,0 +1,594 @@
+import heapq
+import math
+import multiprocessing
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from artifact_stats import ARTIFACT_KEYS, KEY_INDEX, SET_BONUSES, stats_vector
+from damage import calc_amplification, calc_damage, calc_def_mult, calc_res, final_attack
+
+SLOTS = ["flower", "plume", "sands", "goblet", "circlet"]
+# the slots with many main stats first, so the bounds of the branches only
+# guess the substats of the flower and plume
+SEARCH_ORDER = [4, 3, 2, 0, 1]
+LINEAR_BOUNDS = 3  # tangent points tried for the bound of a branch
+CHUNK_SIZE = 1 << 15  # partial builds expanded at once
+
+# one artifact of the inventory, stats1 is its main stat and stats2 its
+# substats, both as getStats gives them ({"cr": 0.07} dicts)
+Artifact = namedtuple("Artifact", ["slot", "set", "stats1", "stats2"])
+
+# the character scored, base is its base stat for the scaling (base atk with
+# the weapon for atk) and stats every stat that is not from the artifacts
+Target = namedtuple(
+    "Target",
+    ["base", "scaling", "element", "stats", "skill_multiplier", "level", "enemy_level", "enemy_resistance", "reaction_multiplier"],
+    defaults=(1.0, 90, 100, 0.1, 1.0),
+)
+
+Build = namedtuple("Build", ["score", "artifacts"])
+
+# combinations: builds of the inventory, front_combinations: builds left
+# after the dominance pruning, scored: full builds scored, the others were cut
+# by the bounds, timings: seconds of every phase
+SearchReport = namedtuple("SearchReport", ["combinations", "front_combinations", "scored", "visited", "timings"])
+
+# Character.STAT_KEYS to ARTIFACT_KEYS, base stats are Target.base
+CHARACTER_KEYS = {
+    "pv_percentage": "hp%",
+    "def_percentage": "def%",
+    "atk_percentage": "atk%",
+    "elemental_mastery": "em",
+    "crit_rate": "cr",
+    "crit_damage": "cd",
+    "pyro_damage": "pyro%",
+    "cryo_damage": "cryo%",
+    "hydro_damage": "hydro%",
+    "electro_damage": "electro%",
+    "anemo_damage": "anemo%",
+    "geo_damage": "geo%",
+    "dendro_damage": "dendro%",
+    "physical_damage": "physical%",
+    "healing_bonus": "heal",
+    "damage_bonus": "dmg%",
+}
+SCALING_BASE = {"atk": "base_atk", "hp": "base_pv", "def": "base_def"}
+
+
+def artifacts_from_stats(stats, sets, substats_per_artifact=4):
+    """
+    Split a getStats result in its five artifacts, getStats only gives the
+    count of every set so the set of each artifact comes in order in sets.
+    """
+    return [
+        Artifact(slot, set_name, stats["stats1"][index], stats["stats2"][index * substats_per_artifact:(index + 1) * substats_per_artifact])
+        for index, (slot, set_name) in enumerate(zip(SLOTS, sets))
+    ]
+
+
+def score(target, stats):
+    """Average damage of the target with the artifact stats, stats is (..., ARTIFACT_KEYS)."""
+    stats = stats + stats_vector(target.stats)
+
+    def column(key):
+        return stats[..., KEY_INDEX[key]]
+
+    return calc_damage(
+        target.base, column(target.scaling + "%"), column(target.scaling), target.skill_multiplier,
+        column("cr"), column("cd"), column(target.element + "%") + column("dmg%"),
+        elemental_mastery=column("em"),
+        level=target.level,
+        enemy_level=target.enemy_level,
+        enemy_resistance=target.enemy_resistance,
+        reaction_multiplier=target.reaction_multiplier,
+    )
+
+
+def target_from_character(character, skill_multiplier, stats={}, **kwargs):
+    """
+    Target of a calc.char.Character, scaling on its stats_scalling ("atk",
+    "hp" or "def") and damage of its elemental_type, stats are added to the
+    ones of the character, kwargs are the other fields of Target.
+    """
+    scaling = character.stats_scalling or "atk"
+    if scaling not in SCALING_BASE:
+        raise ValueError(f"Invalid stats scalling: {scaling}")
+    res = {CHARACTER_KEYS[key]: value for key, value in character.stats_dict().items() if key in CHARACTER_KEYS and value}
+    for key, value in stats.items():
+        res[key] = res.get(key, 0) + value
+    return Target(float(getattr(character, SCALING_BASE[scaling])), scaling, character.elemental_type or "physical", res, skill_multiplier, **kwargs)
+
+
+def relevant_keys(target):
+    # the stats the damage of the target grows with
+    keys = [target.scaling + "%", target.scaling, "cr", "cd", target.element + "%", "dmg%"]
+    if target.reaction_multiplier != 1:
+        keys.append("em")
+    return keys
+
+
+def dominance_front(stats, sets, columns, top=1):
+    """
+    Rows of one slot kept by the dominance pruning: a row is dropped once top
+    rows of the same set are at least as good on every column and better on
+    one, a build with it is then beaten by top builds.
+    """
+    stats = stats[:, columns]
+    keep = np.ones(len(stats), dtype=bool)
+    for set_id in np.unique(sets):
+        rows = np.flatnonzero(sets == set_id)
+        group = stats[rows]
+        at_least = (group[:, None, :] >= group[None, :, :]).all(axis=2)
+        better = (group[:, None, :] > group[None, :, :]).any(axis=2)
+        # dominated[i, j]: j dominates i
+        dominated = (at_least & better).T
+        keep[rows] = dominated.sum(axis=1) < top
+    return np.flatnonzero(keep)
+
+
+def log_linear_bound(target, low, high, point):
+    """
+    Linear upper bound of the log of the damage on a box of stats: for every
+    stats between low and high, log(score(stats)) <= value + weights @ (stats - low).
+
+    The crit rate cap is dropped and crit rate * crit damage is replaced by
+    its linear over estimate on the box, then every log factor is concave and
+    is under its tangent at point, which should be near the best stats.
+    """
+    extra = stats_vector(target.stats)
+    low = low + extra
+    high = high + extra
+    point = point + extra
+
+    def column(stats, key):
+        return stats[..., KEY_INDEX[key]]
+
+    weights = np.zeros(point.shape)
+    value = np.log(target.skill_multiplier * calc_def_mult(target.level, target.enemy_level) * calc_res(target.enemy_resistance)) * np.ones(point.shape[:-1])
+
+    def tangent(keys, factor, slopes):
+        # log(factor) at point and its slopes on the keys
+        nonlocal value
+        value = value + np.log(factor)
+        for key, slope in zip(keys, slopes):
+            weights[..., KEY_INDEX[key]] += slope / factor
+            value = value + slope / factor * (column(low, key) - column(point, key))
+
+    scaling = (target.scaling + "%", target.scaling)
+    tangent(scaling, final_attack(target.base, column(point, scaling[0]), column(point, scaling[1])), (target.base, 1.0))
+    # crit rate * crit damage <= crit rate * high crit damage + low crit rate * (crit damage - high crit damage)
+    crit_rate = column(point, "cr")
+    crit_damage = column(point, "cd")
+    high_crit_damage = column(high, "cd")
+    low_crit_rate = column(low, "cr")
+    tangent(("cr", "cd"), 1 + crit_rate * high_crit_damage + low_crit_rate * (crit_damage - high_crit_damage), (high_crit_damage, low_crit_rate))
+    bonus = (target.element + "%", "dmg%")
+    tangent(bonus, 1 + column(point, bonus[0]) + column(point, bonus[1]), (1.0, 1.0))
+    elemental_mastery = column(point, "em")
+    amplification = calc_amplification(elemental_mastery, target.reaction_multiplier)
+    slope = 0.0 if target.reaction_multiplier == 1 else target.reaction_multiplier * 2.78 * 1400 / (elemental_mastery + 1400) ** 2
+    tangent(("em",), amplification, (slope,))
+    return value, weights
+
+
+class Inventory:
+    """Artifacts stored as one stat matrix per slot."""
+
+    def __init__(self, artifacts):
+        # dicts with the fields of Artifact work too, as in a json inventory
+        self.artifacts = [Artifact(**artifact) if isinstance(artifact, dict) else artifact for artifact in artifacts]
+        self.set_names = sorted({artifact.set for artifact in self.artifacts})
+        set_index = {name: index for index, name in enumerate(self.set_names)}
+        self.index = []  # position in artifacts of every row
+        self.stats = []
+        self.sets = []
+        for slot in SLOTS:
+            rows = [index for index, artifact in enumerate(self.artifacts) if artifact.slot == slot]
+            self.index.append(np.array(rows, dtype=np.int64))
+            self.stats.append(np.array([stats_vector([self.artifacts[i].stats1] + list(self.artifacts[i].stats2)) for i in rows]).reshape(len(rows), len(ARTIFACT_KEYS)))
+            self.sets.append(np.array([set_index[self.artifacts[i].set] for i in rows], dtype=np.int64))
+        for slot, index in zip(SLOTS, self.index):
+            if len(index) == 0:
+                raise ValueError(f"No artifact for the slot: {slot}")
+        # bonus[s, c]: set bonus of c pieces of the set s
+        self.bonus = np.zeros((len(self.set_names), 6, len(ARTIFACT_KEYS)))
+        for s, name in enumerate(self.set_names):
+            for pieces, effect in SET_BONUSES.get(name, {}).items():
+                self.bonus[s, pieces:] += stats_vector(effect)
+
+    def __len__(self):
+        return len(self.artifacts)
+
+
+def set_requirements(inventory, sets):
+    # {set name: pieces} to a vector of the pieces needed for every set
+    required = np.zeros(len(inventory.set_names), dtype=np.int64)
+    for name, pieces in (sets or {}).items():
+        if name not in inventory.set_names:
+            raise ValueError(f"No artifact of the set: {name}")
+        required[inventory.set_names.index(name)] = pieces
+    if required.sum() > len(SLOTS):
+        raise ValueError("The set constraints need more than five artifacts")
+    return required
+
+
+def optimize(target, inventory, sets=None, top=1, prune=True, report=False):
+    """
+    Best artifact builds of the target by branch and bound.
+
+    Parameters
+    ----------
+    target : Target
+    inventory : Inventory or list of Artifact
+    sets : dict, optional
+        Minimal number of pieces of some sets, e.g. {"finaleofthedeepgalleries": 4}.
+    top : int
+        Number of builds kept.
+    prune : bool
+        Drop first the artifacts dominated on the stats of the target.
+    report : bool
+        Also give the SearchReport of the search.
+
+    Returns
+    -------
+    list of Build
+        Best builds first, artifacts are indices in inventory.artifacts.
+
+    The damage only grows with every stat, so the damage of the stats chosen
+    so far plus, stat by stat, the best of every slot left and of every set
+    bonus is an upper bound of the branch, tightened by linear bounds of the
+    log of the damage where every slot left can take its own best artifact.
+    """
+    start = time.perf_counter()
+    if not isinstance(inventory, Inventory):
+        inventory = Inventory(inventory)
+    inventory_time = time.perf_counter() - start
+    search = BuildSearch(target, inventory, sets, top, prune)
+    search.timings = {"inventory": inventory_time, **search.timings}
+    search.run()
+    if report:
+        return search.builds(), search.report()
+    return search.builds()
+
+
+def print_report(report):
+    print(f"Combinations: {report.combinations:,}")
+    print(f"Pruned by dominance: {report.combinations - report.front_combinations:,}")
+    print(f"Pruned by the bounds: {report.front_combinations - report.scored:,}")
+    print(f"Scored: {report.scored:,} ({report.scored / max(report.combinations, 1):.2e} of the combinations)")
+    for phase, seconds in report.timings.items():
+        print(f"{phase}: {seconds:.3f}s")
+
+
+class BuildSearch:
+    """
+    Depth first search over batches of partial builds: every batch is
+    expanded with all the artifacts of the next slot at once, the branches
+    whose bound is under the worst kept build are dropped and the others are
+    searched best bound first, CHUNK_SIZE builds at a time.
+    """
+
+    def __init__(self, target, inventory, sets, top, prune=True):
+        self.target = target
+        self.inventory = inventory
+        self.top = top
+        self.timings = {}
+        self.required = set_requirements(inventory, sets)
+        # the stats with a slope in the linear bounds
+        self.columns = np.array([KEY_INDEX[key] for key in relevant_keys(target)])
+        start = time.perf_counter()
+        # kept[d]: rows of the slot searched at depth d left by the pruning
+        self.kept = []
+        for slot in SEARCH_ORDER:
+            if prune:
+                self.kept.append(dominance_front(inventory.stats[slot], inventory.sets[slot], self.columns, top))
+            else:
+                self.kept.append(np.arange(len(inventory.stats[slot])))
+        self.timings["dominance"] = time.perf_counter() - start
+        start = time.perf_counter()
+        self.stats = [inventory.stats[slot][kept] for slot, kept in zip(SEARCH_ORDER, self.kept)]
+        self.sets = [inventory.sets[slot][kept] for slot, kept in zip(SEARCH_ORDER, self.kept)]
+        self.one_hot = np.eye(len(inventory.set_names), dtype=np.int64)
+        # best[d]: stat by stat maximum of the slots d and after, the upper
+        # bound of the partial sums of the slots left
+        self.best = np.zeros((len(SLOTS) + 1, len(ARTIFACT_KEYS)))
+        for depth in reversed(range(len(SLOTS))):
+            self.best[depth] = np.maximum(self.stats[depth].max(axis=0), 0) + self.best[depth + 1]
+        # no build of five pieces has more than one 4 pieces and one 2 pieces bonus
+        bonus = inventory.bonus
+        self.best_bonus = np.maximum(bonus[:, 5].max(axis=0), 0) + np.maximum(bonus[:, 2].max(axis=0), 0)
+        self.flat_bonus = bonus.reshape(-1, len(ARTIFACT_KEYS))
+        # step[s, c]: bonus won by the piece c + 1 of the set s
+        self.step = np.diff(bonus, axis=1)
+        self.heap = []  # (score, rows) of the best builds, the worst first
+        self.visited = 0
+        self.scored = 0
+        # rows of the first slot searched, all of them when None
+        self.first = None
+        # worst kept score of all the workers of a parallel search
+        self.shared_threshold = None
+        self.timings["bounds"] = time.perf_counter() - start
+
+    def threshold(self):
+        threshold = self.heap[0][0] if len(self.heap) >= self.top else -np.inf
+        if self.shared_threshold is not None:
+            return max(threshold, self.shared_threshold.value)
+        return threshold
+
+    def log_threshold(self):
+        threshold = self.threshold()
+        return np.log(threshold) if threshold > 0 else -np.inf
+
+    def feasible(self, counts, slots_left):
+        # the sets still needed fit in the slots left
+        if not self.required.any():
+            return np.ones(len(counts), dtype=bool)
+        return np.maximum(self.required - counts, 0).sum(axis=-1) <= slots_left
+
+    def allowed_sets(self, counts, slots_left):
+        # sets the slots left can take, only the sets still needed once they
+        # need every slot left
+        if not self.required.any():
+            return None
+        need = np.maximum(self.required - counts, 0)
+        return (need > 0) | (need.sum(axis=1) < slots_left)[:, None]
+
+    def set_bonus(self, counts):
+        # bonus of the pieces of every set, summed over the sets
+        bonus = self.inventory.bonus
+        return bonus[np.arange(len(bonus)), np.minimum(counts, 5)].sum(axis=-2)
+
+    def bonus_bound(self, counts, slots_left):
+        # every set gets at most the bonus of its pieces plus all the slots left
+        return np.minimum(self.set_bonus(counts + slots_left), self.best_bonus)
+
+    def bonus_gain(self, weights, counts, slots_left):
+        # best weights @ set bonus of the completions, the slots left go to
+        # at most two sets since five pieces never hold more than two bonuses
+        number_of_sets = len(self.inventory.set_names)
+        weighted = (weights @ self.flat_bonus.T).reshape(len(weights), number_of_sets, 6)
+        levels = np.minimum(counts[:, :, None] + np.arange(slots_left + 1), 5)
+        gains = np.take_along_axis(weighted, levels, axis=2)
+        current = gains[:, :, 0].sum(axis=1)
+        gains = gains - gains[:, :, :1]
+        res = gains.max(axis=(1, 2))
+        if number_of_sets > 1:
+            # best and second best set for every number of pieces added
+            order = np.argsort(-gains, axis=1)
+            best = np.take_along_axis(gains, order[:, :1], axis=1)[:, 0]
+            second = np.take_along_axis(gains, order[:, 1:2], axis=1)[:, 0]
+            for first in range(1, slots_left):
+                for other in range(1, slots_left - first + 1):
+                    same = order[:, 0, first] == order[:, 0, other]
+                    pair = np.where(same, np.maximum(best[:, first] + second[:, other], second[:, first] + best[:, other]), best[:, first] + best[:, other])
+                    res = np.maximum(res, pair)
+        return current + res
+
+    def bound(self, depth, partial, counts, bonus):
+        # best damage of the partial builds (one per row) completed with the
+        # slots depth and after, the lowest of the stat by stat bound and of
+        # linear ones where every slot left gives its best artifact, the
+        # tangent point moves to the completion the last linear bound picked
+        slots_left = len(SLOTS) - depth
+        high = partial + self.best[depth] + self.bonus_bound(counts, slots_left)
+        bounds = np.log(score(self.target, high))
+        alive = np.flatnonzero(bounds > self.log_threshold())
+        point = partial[alive]
+        for _ in range(LINEAR_BOUNDS):
+            if len(alive) == 0:
+                break
+            value, weights = log_linear_bound(self.target, partial[alive], high[alive], point)
+            value = value + self.bonus_gain(weights, counts[alive], slots_left)
+            point = partial[alive] + bonus[alive]
+            weights = weights[:, self.columns]
+            allowed = self.allowed_sets(counts[alive], slots_left)
+            for stats, sets in zip(self.stats[depth:], self.sets[depth:]):
+                gains = weights @ stats[:, self.columns].T
+                if allowed is not None:
+                    gains[~allowed[:, sets]] = -np.inf
+                best = gains.argmax(axis=1)
+                value = value + gains[np.arange(len(best)), best]
+                point = point + stats[best]
+            bounds[alive] = np.minimum(bounds[alive], value)
+            keep = bounds[alive] > self.log_threshold()
+            alive, point = alive[keep], point[keep]
+        return np.exp(bounds)
+
+    def run(self, first=None):
+        start = time.perf_counter()
+        self.first = first
+        counts = np.zeros((1, len(self.inventory.set_names)), dtype=np.int64)
+        empty = np.zeros((1, len(ARTIFACT_KEYS)))
+        self.search(0, empty, counts, empty, np.zeros((1, 0), dtype=np.int64))
+        self.timings["search"] = time.perf_counter() - start
+
+    def search(self, depth, partial, counts, bonus, rows):
+        # one row per partial build of depth slots: its artifact stats, pieces
+        # of every set, set bonus and rows in the slots
+        stats = self.stats[depth]
+        sets = self.sets[depth]
+        size = len(stats)
+        bonus = (bonus[:, None, :] + self.step[sets, np.minimum(counts[:, sets], 4)]).reshape(-1, len(ARTIFACT_KEYS))
+        partial = (partial[:, None, :] + stats[None, :, :]).reshape(-1, len(ARTIFACT_KEYS))
+        counts = (counts[:, None, :] + self.one_hot[sets][None, :, :]).reshape(-1, counts.shape[1])
+        rows = np.concatenate((np.repeat(rows, size, axis=0), np.tile(np.arange(size), len(rows))[:, None]), axis=1)
+        self.visited += len(rows)
+        keep = self.feasible(counts, len(SLOTS) - depth - 1)
+        if depth == 0 and self.first is not None:
+            keep &= np.isin(rows[:, 0], self.first)
+        if not keep.all():
+            partial, counts, bonus, rows = partial[keep], counts[keep], bonus[keep], rows[keep]
+        if depth == len(SLOTS) - 1:
+            self.scored += len(rows)
+            self.push(score(self.target, partial + bonus), rows)
+            return
+        bounds = self.bound(depth + 1, partial, counts, bonus)
+        order = np.argsort(-bounds)
+        order = order[bounds[order] > self.threshold()]
+        step = max(CHUNK_SIZE // len(self.stats[depth + 1]), 1)
+        for start in range(0, len(order), step):
+            chunk = order[start:start + step]
+            chunk = chunk[bounds[chunk] > self.threshold()]
+            if len(chunk):
+                self.search(depth + 1, partial[chunk], counts[chunk], bonus[chunk], rows[chunk])
+
+    def push(self, scores, rows):
+        # keep the best builds of a batch of full builds
+        candidates = np.flatnonzero(scores > self.threshold())
+        if len(candidates) > self.top:
+            candidates = candidates[np.argpartition(-scores[candidates], self.top - 1)[:self.top]]
+        for index in candidates:
+            value = float(scores[index])
+            if len(self.heap) < self.top:
+                heapq.heappush(self.heap, (value, tuple(rows[index].tolist())))
+            elif value > self.heap[0][0]:
+                heapq.heapreplace(self.heap, (value, tuple(rows[index].tolist())))
+        if self.shared_threshold is not None and len(self.heap) >= self.top and self.heap[0][0] > self.shared_threshold.value:
+            self.shared_threshold.value = self.heap[0][0]
+
+    def merge(self, heap):
+        # add the builds of another search of the same inventory
+        builds = {rows: value for value, rows in self.heap + list(heap)}
+        self.heap = heapq.nsmallest(self.top, ((value, rows) for rows, value in builds.items()), key=lambda build: -build[0])
+        heapq.heapify(self.heap)
+
+    def inventory_rows(self, rows):
+        # rows in search order to rows in slot order
+        res = [None] * len(SLOTS)
+        for depth, row in enumerate(rows):
+            res[SEARCH_ORDER[depth]] = self.kept[depth][row]
+        return res
+
+    def report(self):
+        return SearchReport(
+            math.prod(len(stats) for stats in self.inventory.stats),
+            math.prod(len(stats) for stats in self.stats),
+            self.scored,
+            self.visited,
+            dict(self.timings),
+        )
+
+    def builds(self):
+        return [
+            Build(value, tuple(int(self.inventory.index[slot][row]) for slot, row in enumerate(self.inventory_rows(rows))))
+            for value, rows in sorted(self.heap, reverse=True)
+        ]
+
+
+class SharedInventory:
+    """
+    Stats and sets of every slot in two shared memory blocks, the workers of
+    a parallel search attach to them by name instead of getting a copy.
+    Only the fields BuildSearch reads are there.
+    """
+
+    def __init__(self, stats, sets, set_names, bonus, names=None):
+        self.set_names = set_names
+        self.bonus = bonus
+        self.lengths = [len(slot_stats) for slot_stats in stats]
+        total = sum(self.lengths)
+        create = names is None
+        if create:
+            self.blocks = [
+                shared_memory.SharedMemory(create=True, size=max(total * len(ARTIFACT_KEYS) * 8, 1)),
+                shared_memory.SharedMemory(create=True, size=max(total * 8, 1)),
+            ]
+        else:
+            self.blocks = [shared_memory.SharedMemory(name=name) for name in names]
+        all_stats = np.ndarray((total, len(ARTIFACT_KEYS)), dtype=np.float64, buffer=self.blocks[0].buf)
+        all_sets = np.ndarray((total,), dtype=np.int64, buffer=self.blocks[1].buf)
+        if create:
+            all_stats[:] = np.concatenate(stats)
+            all_sets[:] = np.concatenate(sets)
+        bounds = np.cumsum([0] + self.lengths)
+        self.stats = [all_stats[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+        self.sets = [all_sets[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def description(self):
+        # what a worker needs to attach, only small objects are pickled
+        return {"stats": self.lengths, "set_names": self.set_names, "bonus": self.bonus, "names": [block.name for block in self.blocks]}
+
+    @classmethod
+    def attach(cls, description):
+        stats = [np.zeros((length, 0)) for length in description["stats"]]
+        return cls(stats, None, description["set_names"], description["bonus"], description["names"])
+
+    def close(self):
+        # the numpy views must go before the blocks
+        self.stats = self.sets = None
+        for block in self.blocks:
+            block.close()
+
+    def unlink(self):
+        for block in self.blocks:
+            block.unlink()
+
+
+# search of the worker process, built once by worker_init
+worker_search = None
+
+
+def worker_init(description, target, sets, top, threshold):
+    global worker_search
+    inventory = SharedInventory.attach(description)
+    worker_search = BuildSearch(target, inventory, sets, top, prune=False)
+    worker_search.shared_threshold = threshold
+
+
+def worker_run(first):
+    # one shard of the first slot, the heap of the worker is kept between its
+    # shards so it is merged whole at the end
+    visited, scored = worker_search.visited, worker_search.scored
+    worker_search.run(first)
+    return list(worker_search.heap), worker_search.visited - visited, worker_search.scored - scored
+
+
+def optimize_parallel(target, inventory, sets=None, top=1, prune=True, processes=None, shards_per_process=4, report=False):
+    """
+    optimize on a process pool, the rows of the first slot searched are
+    sharded over the workers.
+
+    The inventory left by the dominance pruning is put once in shared memory,
+    every worker keeps its own top builds and the worst kept score of all the
+    workers is shared so they all cut with it. The shards are dealt in bound
+    order so they all start with good builds.
+    """
+    start = time.perf_counter()
+    if not isinstance(inventory, Inventory):
+        inventory = Inventory(inventory)
+    inventory_time = time.perf_counter() - start
+    search = BuildSearch(target, inventory, sets, top, prune)
+    search.timings = {"inventory": inventory_time, **search.timings}
+    start = time.perf_counter()
+    slot_stats = [None] * len(SLOTS)
+    slot_sets = [None] * len(SLOTS)
+    for depth, slot in enumerate(SEARCH_ORDER):
+        slot_stats[slot] = search.stats[depth]
+        slot_sets[slot] = search.sets[depth]
+    shared = SharedInventory(slot_stats, slot_sets, inventory.set_names, inventory.bonus)
+    search.timings["shared memory"] = time.perf_counter() - start
+    try:
+        start = time.perf_counter()
+        processes = processes or multiprocessing.cpu_count()
+        first = search.stats[0]
+        counts = search.one_hot[search.sets[0]]
+        bounds = search.bound(1, first, counts, search.step[search.sets[0], 0])
+        order = np.argsort(-bounds)
+        number_of_shards = max(min(processes * shards_per_process, len(order)), 1)
+        shards = [order[index::number_of_shards] for index in range(number_of_shards)]
+        threshold = multiprocessing.Value("d", -np.inf, lock=False)
+        with multiprocessing.Pool(processes, initializer=worker_init, initargs=(shared.description(), target, sets, top, threshold)) as pool:
+            for heap, visited, scored in pool.imap_unordered(worker_run, shards):
+                search.merge(heap)
+                search.visited += visited
+                search.scored += scored
+        search.timings["search"] = time.perf_counter() - start
+    finally:
+        shared.close()
+        shared.unlink()
+    if report:
+        return search.builds(), search.report()
+    return search.builds()
@@ -0,0 +1,307 @@
+import json
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+from artifact_stats import KEY_INDEX, SET_BONUSES, stats_vector
+from damage import calc_damage
+from gcsim import load_config
+
+FRAME_RATE = 60
+PARTICLE_ENERGY = 3.0  # energy of one particle for the character on the field
+OFF_FIELD_ENERGY = 0.6  # share of it for the others
+
+# frames: length of the action, hits: (frame of the hit, skill multiplier),
+# cooldown in frames, energy_cost for bursts and particles made by the action
+ActionData = namedtuple("ActionData", ["frames", "hits", "cooldown", "energy_cost", "particles"], defaults=((), 0, 0, 0))
+
+# talent (index in the talent= of the config) scaling the multipliers of an action
+TALENTS = {"attack": 0, "charge": 0, "aim": 0, "high_plunge": 0, "low_plunge": 0, "skill": 1, "burst": 2}
+CHARACTER_FIELDS = ("element", "scaling", "base_hp", "base_atk", "base_def", "actions")
+
+# Frame data, multipliers and base stats come from a JSON table, nothing is
+# made up for a character, weapon or action missing from it:
+# {
+#   "characters": {name: {"element", "scaling" (atk, hp or def), "base_hp",
+#       "base_atk", "base_def" (at the config level), "stats" (optional),
+#       "actions": {action: {"frames", "hits", "cooldown", "energy_cost",
+#       "particles"} or a list of them for a combo (attack:5 goes N1 to N5)}}},
+#   "weapons": {name: {"base_atk", "stats" (optional)}}
+# }
+# a hit is [frame, multiplier], the multiplier being a number or one value
+# per talent level starting at level 1.
+
+SimulationResult = namedtuple("SimulationResult", ["dps", "damage", "duration", "character_damage"])
+
+
+def parse_action(value, where):
+    for field in value:
+        if field not in ActionData._fields:
+            raise ValueError(f"Unknown field {field} in {where}")
+    if "frames" not in value:
+        raise ValueError(f"No frames in {where}")
+    hits = tuple((int(frame), multiplier if np.isscalar(multiplier) else tuple(multiplier)) for frame, multiplier in value.get("hits", ()))
+    if any(frame < 0 for frame, _ in hits):
+        raise ValueError(f"Hit before the start of {where}")
+    return ActionData(int(value["frames"]), hits, int(value.get("cooldown", 0)), float(value.get("energy_cost", 0)), float(value.get("particles", 0)))
+
+
+def parse_data(table):
+    """Check a table as described above and turn its actions into ActionData (a combo into a tuple)."""
+    characters = {}
+    for name, character in table.get("characters", {}).items():
+        for field in CHARACTER_FIELDS:
+            if field not in character:
+                raise ValueError(f"No {field} for the character {name}")
+        actions = {}
+        for action, value in character["actions"].items():
+            where = f"the action {action} of {name}"
+            actions[action] = tuple(parse_action(step, where) for step in value) if isinstance(value, list) else parse_action(value, where)
+        characters[name] = {**character, "stats": character.get("stats", {}), "actions": actions}
+    weapons = {}
+    for name, weapon in table.get("weapons", {}).items():
+        if "base_atk" not in weapon:
+            raise ValueError(f"No base_atk for the weapon {name}")
+        weapons[name] = {"base_atk": weapon["base_atk"], "stats": weapon.get("stats", {})}
+    return {"characters": characters, "weapons": weapons}
+
+
+def load_data(path):
+    with open(path) as file:
+        return parse_data(json.load(file))
+
+
+def character_data(data, name):
+    if name not in data["characters"]:
+        raise ValueError(f"No data for the character {name}")
+    return data["characters"][name]
+
+
+def action_data(data, character, action, step=0):
+    """ActionData of an action, step is the position in the combo for a combo action."""
+    actions = character_data(data, character)["actions"]
+    if action not in actions:
+        raise ValueError(f"No data for the action {action} of {character}")
+    res = actions[action]
+    return res if isinstance(res, ActionData) else res[step % len(res)]
+
+
+def hit_multiplier(multiplier, character, action):
+    # a multiplier per talent level is read at the level of the config
+    if np.isscalar(multiplier):
+        return multiplier
+    level = character.talents[TALENTS[action]] if action in TALENTS else 1
+    if not 1 <= level <= len(multiplier):
+        raise ValueError(f"No multiplier of {action} at talent level {level} for {character.name}")
+    return multiplier[level - 1]
+
+
+def character_stats(data, character):
+    """(base stat of the scaling, stats vector, element, scaling) of a CharacterConfig."""
+    sheet = character_data(data, character.name)
+    if character.weapon is None:
+        raise ValueError(f"No weapon for {character.name}")
+    weapon_name = character.weapon.get("weapon")
+    if weapon_name not in data["weapons"]:
+        raise ValueError(f"No data for the weapon {weapon_name}")
+    weapon = data["weapons"][weapon_name]
+    stats = stats_vector(sheet["stats"]) + stats_vector(weapon["stats"]) + stats_vector(character.stats)
+    for name, pieces in character.sets.items():
+        for needed, effect in SET_BONUSES.get(name, {}).items():
+            if pieces >= needed:
+                stats += stats_vector(effect)
+    if sheet["scaling"] not in ("atk", "hp", "def"):
+        raise ValueError(f"Invalid scaling for {character.name}: {sheet['scaling']}")
+    base = {"atk": sheet["base_atk"] + weapon["base_atk"], "hp": sheet["base_hp"], "def": sheet["base_def"]}[sheet["scaling"]]
+    return base, stats, sheet["element"], sheet["scaling"]
+
+
+def rotation_actions(data, config):
+    """(character, action name, ActionData) of every single action, attacks in a row go through the combo."""
+    res = []
+    previous, step = None, 0
+    for action in config.rotation:
+        for _ in range(action.count):
+            step = step + 1 if action.action == "attack" and previous == (action.character, "attack") else 0
+            previous = (action.character, action.action)
+            res.append((action.character, action.action, action_data(data, action.character, action.action, step)))
+    return res
+
+
+def simulate(config, data, iterations=None, seed=None, max_frames=FRAME_RATE * 600):
+    """
+    Run the rotation of a gcsim Config frame by frame, every iteration is a
+    row of the numpy state so they all step together.
+
+    Parameters
+    ----------
+    config : gcsim.Config
+    data : dict
+        Table of the characters and weapons, from load_data or parse_data.
+    iterations : int, optional
+        Number of runs, the iteration option of the config by default.
+    seed : int, optional
+        Seed of the numpy generator, every run has its own crits and energy.
+    max_frames : int
+        Runs still going after that many frames stop there.
+
+    Returns
+    -------
+    SimulationResult
+        dps, damage and duration (frames) per run, damage per character per run.
+
+    An action starts once the character is swapped in (swap_delay frames),
+    its cooldown is over and, for a burst, its energy is full. A hit lands
+    its frame after the start of its action, even once the action ended and
+    the next one started, and a run lasts until its last hit. Every character
+    starts with full energy. Particles come at the start of the action, the
+    random energy of the config goes to the active character, the others get
+    OFF_FIELD_ENERGY of it. Reactions are not modeled, only the first
+    target is hit and only the static set bonuses of SET_BONUSES count.
+    A character, weapon or action missing from data raises a ValueError.
+    """
+    iterations = iterations or config.iterations
+    rng = np.random.default_rng(seed)
+    names = list(config.characters)
+    if not names:
+        raise ValueError("No character in the config")
+    index = {name: position for position, name in enumerate(names)}
+    target = config.targets[0] if config.targets else {}
+    enemy_level = target.get("lvl", 100)
+    enemy_resistance = target.get("resist", 0.1)
+    swap_delay = int(config.options.get("swap_delay", 1))
+
+    # one row per single action, "attack:5" is five attacks
+    actions = [(index[character], name, action) for character, name, action in rotation_actions(data, config)]
+    if not actions:
+        raise ValueError("Empty rotation")
+    number_of_actions = len(actions)
+    number_of_hits = max(max(len(action.hits) for _, _, action in actions), 1)
+    actor = np.array([character for character, _, _ in actions] + [0])
+    frames = np.array([action.frames for _, _, action in actions] + [0])
+    cooldown = np.array([action.cooldown for _, _, action in actions] + [0])
+    # every action of every character has its own cooldown
+    timers = {}
+    timer = np.array([timers.setdefault((character, name), len(timers)) for character, name, _ in actions] + [0])
+    energy_cost = np.array([action.energy_cost for _, _, action in actions] + [0], dtype=float)
+    particles = np.array([action.particles for _, _, action in actions] + [0], dtype=float)
+    hit_frame = np.full((number_of_actions + 1, number_of_hits), -1)
+    multipliers = np.zeros((number_of_actions + 1, number_of_hits))
+    for row, (character, name, action) in enumerate(actions):
+        for column, (frame, multiplier) in enumerate(action.hits):
+            hit_frame[row, column] = frame
+            multipliers[row, column] = hit_multiplier(multiplier, config.characters[names[character]], name)
+
+    # character stats, one row per character
+    sheets = [character_stats(data, config.characters[name]) for name in names]
+    base = np.array([sheet[0] for sheet in sheets])
+    stats = np.array([sheet[1] for sheet in sheets])
+    scaling = [sheet[3] for sheet in sheets]
+    percentage = stats[np.arange(len(names)), [KEY_INDEX[key + "%"] for key in scaling]]
+    flat = stats[np.arange(len(names)), [KEY_INDEX[key] for key in scaling]]
+    crit_rate = stats[:, KEY_INDEX["cr"]]
+    crit_damage = stats[:, KEY_INDEX["cd"]]
+    damage_bonus = stats[np.arange(len(names)), [KEY_INDEX[sheet[2] + "%"] for sheet in sheets]] + stats[:, KEY_INDEX["dmg%"]]
+    energy_recharge = 1 + stats[:, KEY_INDEX["er"]]
+    level = np.array([config.characters[name].level for name in names])
+    max_energy = np.array([max([action.energy_cost for character, _, action in actions if character == position] + [0]) for position in range(len(names))], dtype=float)
+
+    runs = np.arange(iterations)
+    current = np.zeros(iterations, dtype=np.int64)  # action of every run
+    started = np.full(iterations, -1)  # frame the action started, -1 before
+    ready = np.zeros(iterations, dtype=np.int64)  # first frame the action can start
+    active = np.full(iterations, index.get(config.active, actor[0]))
+    ready[active != actor[0]] = swap_delay
+    energy = np.tile(max_energy, (iterations, 1))
+    cooldown_end = np.zeros((iterations, len(timers)), dtype=np.int64)
+    interval = config.energy.get("interval")
+    if interval is not None:
+        low, high = (interval, interval) if np.isscalar(interval) else interval
+        next_energy = rng.integers(low, high + 1, iterations)
+    amount = float(config.energy.get("amount", 1))
+    damage = np.zeros(iterations)
+    character_damage = np.zeros((iterations, len(names)))
+    end = np.full(iterations, max_frames)
+    # hits can land after their action ended: {frame: [(runs, actions, hit columns)]}
+    pending = {}
+    last_hit = np.full(iterations, -1)
+
+    for frame in range(max_frames):
+        running = current < number_of_actions
+        if not running.any() and not pending:
+            break
+        if interval is not None:
+            drop = running & (frame >= next_energy)
+            if drop.any():
+                gain = np.where(np.arange(len(names)) == active[:, None], 1.0, OFF_FIELD_ENERGY) * amount * PARTICLE_ENERGY * energy_recharge
+                energy[drop] = np.minimum(energy[drop] + gain[drop], max_energy)
+                next_energy[drop] += rng.integers(low, high + 1, drop.sum())
+
+        # actions starting on this frame
+        character = actor[current]
+        start = running & (started < 0) & (frame >= ready) & (cooldown_end[runs, timer[current]] <= frame) & (energy[runs, character] >= energy_cost[current])
+        if start.any():
+            rows = runs[start]
+            action = current[start]
+            started[start] = frame
+            active[start] = character[start]
+            cooldown_end[rows, timer[action]] = np.where(cooldown[action] > 0, frame + cooldown[action], cooldown_end[rows, timer[action]])
+            energy[rows, character[start]] -= energy_cost[action]
+            gain = particles[action, None] * PARTICLE_ENERGY * energy_recharge * np.where(np.arange(len(names)) == character[start, None], 1.0, OFF_FIELD_ENERGY)
+            energy[rows] = np.minimum(energy[rows] + gain, max_energy)
+            # the hits of the started actions are queued on the frame they land
+            hit_rows, columns = np.nonzero(hit_frame[action] >= 0)
+            land = frame + hit_frame[action[hit_rows], columns]
+            np.maximum.at(last_hit, rows[hit_rows], land)
+            for landing in np.unique(land):
+                hit = land == landing
+                pending.setdefault(int(landing), []).append((rows[hit_rows[hit]], action[hit_rows[hit]], columns[hit]))
+
+        # hits landing on this frame
+        landing = pending.pop(frame, None)
+        if landing is not None:
+            rows, hit_actions, columns = (np.concatenate(parts) for parts in zip(*landing))
+            who = actor[hit_actions]
+            crit = rng.random(len(rows)) < crit_rate[who]
+            values = calc_damage(
+                base[who], percentage[who], flat[who], multipliers[hit_actions, columns],
+                crit_rate[who], crit_damage[who], damage_bonus[who],
+                level=level[who],
+                enemy_level=enemy_level,
+                enemy_resistance=enemy_resistance,
+                crit=crit,
+            )
+            np.add.at(damage, rows, values)
+            np.add.at(character_damage, (rows, who), values)
+
+        # actions ending on this frame
+        elapsed = np.where(started >= 0, frame - started, -2)
+        done = running & (started >= 0) & (elapsed >= frames[current] - 1)
+        if done.any():
+            current[done] += 1
+            started[done] = -1
+            swap = actor[current[done]] != active[done]
+            ready[done] = frame + 1 + np.where(swap & (current[done] < number_of_actions), swap_delay, 0)
+            end[done & (current >= number_of_actions)] = frame + 1
+
+    # a run lasts until its last action ended and its last hit landed
+    duration = np.minimum(np.maximum(end, last_hit + 1), max_frames)
+    dps = damage / (duration / FRAME_RATE)
+    return SimulationResult(dps, damage, duration, {name: character_damage[:, position] for position, name in enumerate(names)})
+
+
+def print_result(result):
+    print(f"DPS: {result.dps.mean():.0f} (std {result.dps.std():.0f}, min {result.dps.min():.0f}, max {result.dps.max():.0f})")
+    print(f"Duration: {result.duration.mean() / FRAME_RATE:.2f}s")
+    for name, values in result.character_damage.items():
+        print(f"{name}: {values.mean() / result.damage.mean():.1%} of the damage")
+
+
+if __name__ == "__main__":
+    # python rotation.py config data.json, data.json being a table as described
+    # at the top of this file. None is shipped with the repository (there is
+    # no game data here), so skirk.md needs one made for its team first.
+    if len(sys.argv) != 3:
+        sys.exit("usage: python rotation.py <gcsim config> <data.json>")
+    print_result(simulate(load_config(sys.argv[1]), load_data(sys.argv[2]), seed=0))
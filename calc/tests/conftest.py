@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the calc modules import each other as scripts run from calc/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
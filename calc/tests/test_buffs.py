@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from buffs import BUFF_KEYS, BUFFS, NUMBER_OF_STATS, apply_buffs, buff_matrix, column, effect_vector, register_buff, team_delta, team_deltas
+from char import Character
+
+
+def test_effect_vector():
+    vector = effect_vector({"atk_percentage": 0.2, "enemy_resistance": -0.1})
+    assert vector.shape == (len(BUFF_KEYS),)
+    assert column(vector, "atk_percentage") == 0.2
+    assert column(vector, "enemy_resistance") == -0.1
+    assert np.count_nonzero(vector) == 2
+    with pytest.raises(ValueError):
+        effect_vector({"not_a_stat": 1})
+    assert not effect_vector({"not_a_stat": 1}, ignore_unknown=True).any()
+
+
+def test_register_buff_checks():
+    with pytest.raises(ValueError, match="kind"):
+        register_buff("test_bad_kind", "food", atk_percentage=0.1)
+    with pytest.raises(ValueError, match="key"):
+        register_buff("test_bad_key", "character", atk=0.1)
+    assert "test_bad_kind" not in BUFFS and "test_bad_key" not in BUFFS
+
+
+def test_team_delta_sums_buffs():
+    delta = team_delta(["natlan", "noblesse_oblige", "xilonen_skill", "citlali_c0"])
+    assert column(delta, "atk_percentage") == pytest.approx(0.5)
+    assert column(delta, "enemy_resistance") == pytest.approx(-0.56)
+    # a buff given twice counts twice
+    assert column(team_delta(["natlan", "natlan"]), "atk_percentage") == pytest.approx(0.6)
+
+
+def test_team_deltas_match_team_delta():
+    teams = [["natlan", "bennett_burst_c1"], ["pyro_resonance"], [], ["xilonen_a4", "scroll_of_the_hero", "natlan"]]
+    deltas = team_deltas(teams)
+    assert deltas.shape == (len(teams), len(BUFF_KEYS))
+    for team, delta in zip(teams, deltas):
+        assert np.allclose(delta, team_delta(team))
+
+
+def test_buff_matrix_rows():
+    matrix = buff_matrix(["natlan", "iansan_burst"])
+    assert column(matrix, "atk_percentage").tolist() == [0.3, 0.0]
+    assert column(matrix, "atk_flat").tolist() == [0.0, 690]
+
+
+def test_apply_buffs_broadcast():
+    stats = np.stack([Character.stats_vector({"atk_percentage": 0.1}), Character.stats_vector({"crit_rate": 0.5})])
+    deltas = team_deltas([["natlan"], ["pyro_resonance", "xilonen_skill"]])
+    res = apply_buffs(stats, deltas)
+    assert res.shape == (2, 2, NUMBER_OF_STATS)
+    assert np.allclose(Character.column(res, "atk_percentage"), [[0.4, 0.35], [0.3, 0.25]])
+    assert Character.column(res, "crit_rate").tolist() == [[0.0, 0.0], [0.5, 0.5]]
+
+
+def test_character_add_buff():
+    character = Character("test", base_stats={"atk_percentage": 0.1})
+    character.add_buff(team_delta(["natlan"])[:NUMBER_OF_STATS])
+    assert character.atk_percentage == pytest.approx(0.4)
+    character.clear_buffs()
+    assert character.atk_percentage == pytest.approx(0.1)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from char import Character
+from damage import MELT_PYRO, calc_damage
+
+
+def make_mavuika():
+    # stats of genshin_calc.py with the team buffs as buffs
+    character = Character("mavuika", base_stats={"base_atk": 359 + 510, "atk_percentage": 0.087 + 0.25, "elemental_mastery": 352, "crit_rate": 0.94, "crit_damage": 2.306, "pyro_damage": 0.466, "damage_bonus": 0.15 + 0.4 + 0.08 * 5})
+    character.add_buff({"atk_percentage": 0.3 + 0.2 + 0.48, "pyro_damage": 0.35 + 0.4})
+    return character
+
+
+def test_stats_layers():
+    character = make_mavuika()
+    assert character.atk_percentage == pytest.approx(1.317)
+    assert character.stats_dict()["pyro_damage"] == pytest.approx(1.216)
+    character.tmp[Character.STAT_INDEX["crit_rate"]] = 0.1
+    assert character.crit_rate == pytest.approx(1.04)
+    character.clear_tmp()
+    character.clear_buffs()
+    assert character.atk_percentage == pytest.approx(0.337)
+    assert character.stats.tolist() == character.base.tolist()
+    with pytest.raises(ValueError):
+        Character("nobody", base_stats={"atk": 1})
+
+
+def test_stat_setter_moves_the_base():
+    character = make_mavuika()
+    character.atk_percentage = 2.0
+    assert character.atk_percentage == pytest.approx(2.0)
+    assert character.base[Character.STAT_INDEX["atk_percentage"]] == pytest.approx(2.0 - 0.98)
+    # the buffs are still there to clear
+    character.clear_buffs()
+    assert character.atk_percentage == pytest.approx(1.02)
+    character.healing_bonus += 0.1
+    assert character.healing_bonus == pytest.approx(0.1)
+
+
+def test_stack():
+    characters = [make_mavuika(), Character("other", base_stats={"base_atk": 100})]
+    stats = Character.stack(characters)
+    assert stats.shape == (2, len(Character.STAT_KEYS))
+    assert Character.column(stats, "base_atk").tolist() == [869, 100]
+    assert Character.column(Character.stack(characters, "buff"), "atk_percentage").tolist() == pytest.approx([0.98, 0])
+    assert Character.column(Character.stack(characters, "base"), "atk_percentage").tolist() == pytest.approx([0.337, 0])
+    assert Character.stack([]).shape == (0, len(Character.STAT_KEYS))
+    # the rows are copies
+    stats[0, 0] = 1
+    assert characters[0].stats[0] == 0
+
+
+def test_stacked_damage_matches_baseline():
+    stats = Character.stack([make_mavuika()])
+    column = lambda key: Character.column(stats, key)
+    damage = calc_damage(
+        column("base_atk"), column("atk_percentage"), 18 + 311 + 1.01 * 799 * 1.2, 8.006 + 0.029 * 200,
+        column("crit_rate"), column("crit_damage"), column("pyro_damage") + column("damage_bonus"),
+        elemental_mastery=column("elemental_mastery"), enemy_level=103, enemy_resistance=0.1 - 0.36 - 0.2,
+        reaction_multiplier=MELT_PYRO, crit=True,
+    )
+    assert damage.shape == (1,)
+    assert float(damage[0]) == pytest.approx(886821.7923965089, rel=1e-12)
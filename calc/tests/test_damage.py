@@ -0,0 +1,87 @@
+import os
+import runpy
+
+import numpy as np
+import pytest
+
+from damage import MELT_CRYO, MELT_PYRO, VAPORIZE_PYRO, calc_amplification, calc_crit_mult, calc_damage, calc_def_mult, calc_res, damage_breakdown
+
+# genshin_calc.py of the baseline, its buffs written out by hand
+MAVUIKA = dict(
+    base_attack=359 + 510,
+    attack_percentage=0.087 + 0.25 + 0.3 + 0.2 + 0.48,
+    attack_flat=18 + 311 + 1.01 * 799 * 1.2,
+    skill_multiplier=8.006 + 0.029 * 200,
+    crit_rate=0.94,
+    crit_damage=2.306,
+    damage_bonus=0.466 + 0.35 + 0.4 + 0.15 + 0.4 + 0.08 * 5,
+    elemental_mastery=352,
+    level=90,
+    enemy_level=103,
+    enemy_resistance=0.1 - 0.36 - 0.2,
+    reaction_multiplier=MELT_PYRO,
+)
+BASELINE_DAMAGE = 886821.7923965089
+
+
+def test_baseline_damage():
+    assert calc_damage(**MAVUIKA, crit=True) == pytest.approx(BASELINE_DAMAGE, rel=1e-12)
+
+
+def test_genshin_calc_output(capsys):
+    runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "genshin_calc.py"))
+    first_line = capsys.readouterr().out.splitlines()[0]
+    assert first_line.startswith("Total Damage: ")
+    assert float(first_line.split(": ")[1]) == pytest.approx(BASELINE_DAMAGE, rel=1e-12)
+
+
+def test_calc_res():
+    # negative resistance halved, under 75% linear, above 1 / (4 res + 1)
+    assert calc_res([-0.4, 0.0, 0.1, 0.75, 1.0]).tolist() == pytest.approx([1.2, 1.0, 0.9, 0.25, 0.2])
+
+
+def test_calc_def_mult():
+    assert calc_def_mult(90, 100) == pytest.approx(190 / 390)
+    assert calc_def_mult(90, 100, def_reduction=0.5) == pytest.approx(190 / (190 + 100))
+    assert calc_def_mult(90, 100, def_ignore=1.0) == pytest.approx(1)
+
+
+def test_calc_amplification():
+    assert calc_amplification(0, MELT_PYRO) == pytest.approx(2)
+    assert calc_amplification(0, MELT_CRYO) == pytest.approx(1.5)
+    assert calc_amplification(0, VAPORIZE_PYRO, reaction_bonus=0.15) == pytest.approx(1.5 * 1.15)
+    assert calc_amplification(352, MELT_PYRO) == pytest.approx(2 * (1 + 2.78 * 352 / (352 + 1400)))
+    # no reaction, whatever the mastery and bonus
+    assert calc_amplification([0, 352, 1000], 1.0, 0.5).tolist() == [1, 1, 1]
+
+
+def test_calc_crit_mult():
+    assert calc_crit_mult(0.5, 2.0) == pytest.approx(2)
+    # the average clips the crit rate, a given hit does not look at it
+    assert calc_crit_mult(1.5, 2.0) == pytest.approx(3)
+    assert calc_crit_mult(-0.2, 2.0) == pytest.approx(1)
+    assert calc_crit_mult(0.1, 2.0, crit=True) == pytest.approx(3)
+    assert calc_crit_mult(0.9, 2.0, crit=False) == pytest.approx(1)
+
+
+def test_average_crit_damage():
+    crit, no_crit = calc_damage(**MAVUIKA, crit=True), calc_damage(**MAVUIKA, crit=False)
+    assert calc_damage(**MAVUIKA) == pytest.approx(0.94 * crit + 0.06 * no_crit)
+
+
+def test_breakdown_product():
+    breakdown = damage_breakdown(**MAVUIKA, crit=True)
+    assert list(breakdown) == ["base_damage", "crit_multiplier", "enemy_def_multiplier", "resistance_multiplier", "damage_multiplier", "amplification_reaction"]
+    assert np.prod([float(value) for value in breakdown.values()]) == pytest.approx(BASELINE_DAMAGE, rel=1e-12)
+
+
+def test_broadcast():
+    # one value per stat sheet, against the scalar formula
+    attack_percentage = np.array([0.5, 1.317, 2.0])
+    damage = calc_damage(**dict(MAVUIKA, attack_percentage=attack_percentage), crit=True)
+    assert damage.shape == (3,)
+    for value, damage_of_sheet in zip(attack_percentage, damage):
+        assert damage_of_sheet == pytest.approx(calc_damage(**dict(MAVUIKA, attack_percentage=value), crit=True))
+    # stat sheets against enemies
+    damage = calc_damage(**dict(MAVUIKA, attack_percentage=attack_percentage[:, None], enemy_resistance=np.array([0.1, -0.2])))
+    assert damage.shape == (3, 2)
@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+from gcsim import Action, format_config, load_config, parse_config, parse_value
+
+SKIRK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "artefact_optim", "backend", "skirk.md")
+
+
+def assert_same_config(config, other):
+    assert list(config.characters) == list(other.characters)
+    for name, character in config.characters.items():
+        assert vars(character) == vars(other.characters[name])
+    assert config.options == other.options
+    assert config.targets == other.targets
+    assert config.energy == other.energy
+    assert config.active == other.active
+    assert config.rotation == other.rotation
+
+
+def test_parse_value():
+    assert parse_value('"azurelight"') == "azurelight"
+    assert parse_value("90/90") == (90, 90)
+    assert parse_value("480,720") == [480, 720]
+    assert parse_value("0.466") == 0.466
+    assert parse_value("cryo") == "cryo"
+
+
+def test_skirk_config():
+    config = load_config(SKIRK)
+    assert list(config.characters) == ["skirk", "furina", "escoffier", "citlali"]
+    skirk = config.characters["skirk"]
+    assert (skirk.level, skirk.max_level, skirk.constellation, skirk.talents) == (90, 90, 0, (6, 10, 10))
+    assert skirk.weapon == {"weapon": "azurelight", "refine": 1, "lvl": (90, 90)}
+    assert skirk.sets == {"finaleofthedeepgalleries": 4}
+    # the substats given twice add up
+    assert skirk.stats["cr"] == pytest.approx(0.0933 + 0.1205 + 0.07 + 0.0661 + 0.105)
+    assert config.options == {"swap_delay": 12, "iteration": 100}
+    assert config.iterations == 100
+    assert config.targets[0]["lvl"] == 100 and config.targets[0]["pos"] == [0, 2.4]
+    assert config.energy == {"interval": [480, 720], "amount": 1}
+    assert config.active == "furina"
+    # 14 actions in the loop body, 4 times
+    assert len(config.rotation) == 56
+    assert config.rotation[:3] == [Action("furina", "skill", 1), Action("furina", "dash", 1), Action("furina", "burst", 1)]
+    assert config.rotation[7] == Action("skirk", "attack", 2)
+
+
+def test_round_trip_skirk():
+    config = load_config(SKIRK)
+    text = format_config(config)
+    assert_same_config(parse_config(text), config)
+    # formatting the parsed text again gives the same text
+    assert format_config(parse_config(text)) == text
+
+
+def test_round_trip_small():
+    text = (
+        'bob char lvl=80/90 cons=2 talent=9,9,9;\n'
+        'bob add weapon="blade" refine=5 lvl=90/90;\n'
+        'bob add set="gladiatorsfinale" count=2;\n'
+        'bob add stats atk%=0.18 cr=0.05;\n'
+        'options swap_delay=12 iteration=10;\n'
+        'target lvl=100 resist=0.1;\n'
+        'energy every interval=480,720 amount=1;\n'
+        'active bob;\n'
+        'bob attack:3;\n'
+        'bob skill;\n'
+    )
+    assert format_config(parse_config(text)) == text
+
+
+def test_loops_and_comments():
+    config = parse_config(
+        "a char lvl=90/90 cons=0 talent=1,1,1; # comment\n"
+        "// full line comment\n"
+        "for let i=0; i<3; i=i+1 {\n"
+        "  a skill;\n"
+        "  for let j=1; j<=2; j=j+1 { a attack:2; }\n"
+        "}\n"
+    )
+    assert config.rotation == [Action("a", "skill", 1), Action("a", "attack", 2), Action("a", "attack", 2)] * 3
+
+
+def test_errors():
+    with pytest.raises(ValueError, match="Unknown character"):
+        parse_config("a add stats cr=0.1;")
+    with pytest.raises(ValueError, match="Unknown statement"):
+        parse_config("b skill;")
+    with pytest.raises(ValueError, match="Unsupported loop"):
+        parse_config("a char lvl=90/90; for let i=0; j<3; i=i+1 { a skill; }")
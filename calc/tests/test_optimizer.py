@@ -0,0 +1,138 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from char import Character
+from optimizer import KEY_INDEX, SET_BONUSES, SLOTS, Artifact, Inventory, SharedInventory, Target, dominance_front, optimize, optimize_parallel, score, stats_vector, target_from_character
+
+MAIN = {
+    "flower": [{"hp": 4780}],
+    "plume": [{"atk": 311}],
+    "sands": [{"atk%": 0.466}, {"er": 0.518}, {"em": 186.5}],
+    "goblet": [{"cryo%": 0.466}, {"atk%": 0.466}, {"pyro%": 0.466}],
+    "circlet": [{"cr": 0.311}, {"cd": 0.622}, {"atk%": 0.466}],
+}
+SUBSTATS = {"hp": 298.75, "atk": 19.45, "def": 23.15, "hp%": 0.0583, "atk%": 0.0583, "em": 23.31, "er": 0.0648, "cr": 0.0389, "cd": 0.0777}
+SETS = ["finaleofthedeepgalleries", "blizzardstrayer", "gladiatorsfinale", "shimenawasreminiscence"]
+
+TARGET = Target(base=359 + 674, scaling="atk", element="cryo", stats={"cr": 0.271, "cd": 0.88, "atk%": 0.2}, skill_multiplier=2.5)
+
+
+def random_inventory(per_slot, seed=0):
+    rng = np.random.default_rng(seed)
+    res = []
+    for slot in SLOTS:
+        for _ in range(per_slot):
+            main = MAIN[slot][rng.integers(len(MAIN[slot]))]
+            keys = [key for key in SUBSTATS if key not in main]
+            rolls = rng.multinomial(4, [0.25] * 4) + 1
+            res.append(Artifact(slot, SETS[rng.integers(len(SETS))], main, [{key: round(SUBSTATS[key] * roll, 4)} for key, roll in zip(rng.choice(keys, 4, replace=False), rolls)]))
+    return res
+
+
+def brute_force(target, artifacts, sets=None):
+    # (score, artifacts) of every build meeting the set constraints, best first
+    by_slot = [[index for index, artifact in enumerate(artifacts) if artifact.slot == slot] for slot in SLOTS]
+    res = []
+    for build in itertools.product(*by_slot):
+        counts = {}
+        for index in build:
+            counts[artifacts[index].set] = counts.get(artifacts[index].set, 0) + 1
+        if any(counts.get(name, 0) < pieces for name, pieces in (sets or {}).items()):
+            continue
+        stats = sum(stats_vector([artifacts[index].stats1] + list(artifacts[index].stats2)) for index in build)
+        for name, count in counts.items():
+            for pieces, effect in SET_BONUSES.get(name, {}).items():
+                if count >= pieces:
+                    stats = stats + stats_vector(effect)
+        res.append((float(score(target, stats)), build))
+    return sorted(res, reverse=True)
+
+
+@pytest.fixture(scope="module")
+def artifacts():
+    return random_inventory(5, seed=1)
+
+
+def test_score_hand_computed():
+    # atk 1000 * 1.5 + 100 = 1600, skill 2, crit 1 + 0.5 * 1, cryo 1.2, def 0.5, res 0.9
+    target = Target(base=1000, scaling="atk", element="cryo", stats={"cr": 0.5, "cd": 1.0, "atk%": 0.5}, skill_multiplier=2.0, enemy_level=90)
+    value = score(target, stats_vector({"atk": 100, "cryo%": 0.2}))
+    assert value == pytest.approx(1600 * 2 * 1.5 * 1.2 * 0.5 * 0.9)
+
+
+def test_inventory_layout(artifacts):
+    inventory = Inventory(artifacts)
+    assert len(inventory) == 25
+    for slot, index in zip(SLOTS, inventory.index):
+        assert all(artifacts[i].slot == slot for i in index)
+    # dicts work as artifacts too
+    assert Inventory([artifact._asdict() for artifact in artifacts]).artifacts == artifacts
+    with pytest.raises(ValueError, match="slot"):
+        Inventory([artifact for artifact in artifacts if artifact.slot != "goblet"])
+
+
+@pytest.mark.parametrize("sets", [None, {"finaleofthedeepgalleries": 2}, {"gladiatorsfinale": 2, "shimenawasreminiscence": 2}])
+def test_optimize_matches_brute_force(artifacts, sets):
+    expected = brute_force(TARGET, artifacts, sets)[:5]
+    builds = optimize(TARGET, artifacts, sets, top=5)
+    assert [build.score for build in builds] == pytest.approx([value for value, _ in expected])
+    assert builds[0].artifacts == expected[0][1]
+
+
+def test_optimize_unknown_set(artifacts):
+    with pytest.raises(ValueError, match="No artifact of the set"):
+        optimize(TARGET, artifacts, {"archaicpetra": 2})
+    with pytest.raises(ValueError, match="more than five"):
+        optimize(TARGET, artifacts, {"finaleofthedeepgalleries": 4, "blizzardstrayer": 2})
+
+
+def test_target_from_character():
+    character = Character("test", base_stats={"base_atk": 1000, "crit_rate": 0.05, "crit_damage": 0.5}, elemental_type="cryo", stats_scalling="atk")
+    target = target_from_character(character, 2.0, {"cr": 0.1})
+    assert target.base == 1000 and target.element == "cryo" and target.scaling == "atk"
+    assert target.stats["cr"] == pytest.approx(0.15) and target.stats["cd"] == 0.5
+
+
+def test_dominance_front():
+    columns = [KEY_INDEX["atk%"], KEY_INDEX["cr"]]
+    stats = np.array([stats_vector(row) for row in [{"atk%": 0.1, "cr": 0.1}, {"atk%": 0.2, "cr": 0.1}, {"atk%": 0.05, "cr": 0.3}, {"atk%": 0.3, "cr": 0.2}]])
+    # row 3 dominates rows 0 and 1, row 0 is also dominated by row 1
+    assert dominance_front(stats, np.zeros(4, dtype=np.int64), columns).tolist() == [2, 3]
+    # a row is dropped once top rows dominate it
+    assert dominance_front(stats, np.zeros(4, dtype=np.int64), columns, top=2).tolist() == [1, 2, 3]
+    # rows of other sets never dominate each other
+    assert dominance_front(stats, np.array([0, 1, 0, 0]), columns).tolist() == [1, 2, 3]
+
+
+@pytest.mark.parametrize("sets", [None, {"blizzardstrayer": 4}])
+def test_pruning_keeps_the_best_builds(artifacts, sets):
+    pruned, report = optimize(TARGET, artifacts, sets, top=3, report=True)
+    unpruned = optimize(TARGET, artifacts, sets, top=3, prune=False)
+    assert [build.score for build in pruned] == pytest.approx([build.score for build in unpruned])
+    assert report.combinations == 5 ** 5
+    assert report.scored <= report.front_combinations <= report.combinations
+
+
+def test_shared_inventory_attach(artifacts):
+    inventory = Inventory(artifacts)
+    shared = SharedInventory(inventory.stats, inventory.sets, inventory.set_names, inventory.bonus)
+    try:
+        attached = SharedInventory.attach(shared.description())
+        for slot in range(len(SLOTS)):
+            assert np.array_equal(attached.stats[slot], inventory.stats[slot])
+            assert np.array_equal(attached.sets[slot], inventory.sets[slot])
+        attached.close()
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+@pytest.mark.parametrize("sets", [None, {"finaleofthedeepgalleries": 2}])
+def test_optimize_parallel_matches_optimize(artifacts, sets):
+    expected = optimize(TARGET, artifacts, sets, top=4)
+    builds, report = optimize_parallel(TARGET, artifacts, sets, top=4, processes=2, report=True)
+    assert [build.score for build in builds] == pytest.approx([build.score for build in expected])
+    assert builds[0].artifacts == expected[0].artifacts
+    assert report.scored <= report.front_combinations
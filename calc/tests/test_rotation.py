@@ -0,0 +1,117 @@
+import os
+
+import numpy as np
+import pytest
+
+from gcsim import parse_config
+from rotation import FRAME_RATE, action_data, load_data, parse_data, simulate
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rotation_data.json")
+
+CONFIG = """
+alpha char lvl=90/90 cons=0 talent=1,1,1;
+alpha add weapon="blade" refine=1 lvl=90/90;
+beta char lvl=90/90 cons=0 talent=1,1,1;
+beta add weapon="catalyst" refine=1 lvl=90/90;
+options swap_delay=12 iteration=5;
+target lvl=90 resist=0.1;
+active alpha;
+"""
+
+
+@pytest.fixture(scope="module")
+def data():
+    return load_data(DATA)
+
+
+def run(data, rotation, **kwargs):
+    return simulate(parse_config(CONFIG + rotation), data, seed=0, **kwargs)
+
+
+def test_single_character_reference(data):
+    # atk 500 * 1.5 = 750, def 190 / 380 = 0.5, res 0.9, no crit and no bonus:
+    # 337.5 per multiplier unit, N1 1.0 + N2 2.0 + skill 3.0 (talent 1)
+    result = run(data, "alpha attack:2, skill;")
+    assert np.allclose(result.damage, 337.5 * 6)
+    # 20 + 30 + 30 frames, no swap
+    assert np.all(result.duration == 80)
+    assert np.allclose(result.dps, 2025 / (80 / FRAME_RATE))
+    assert np.allclose(result.character_damage["beta"], 0)
+
+
+def test_team_reference(data):
+    # beta: hp 10000, crits always (cd 1.0), hydro 20%: 10000 * 0.1 * 2 * 0.5 * 0.9 * 1.2 = 1080 a hit
+    result = run(data, "alpha attack; beta burst; alpha attack:2;")
+    assert np.allclose(result.character_damage["beta"], 2 * 1080)
+    # the combo starts over after the swap: N1 twice and N2 once
+    assert np.allclose(result.character_damage["alpha"], 337.5 * (1 + 1 + 2))
+    # 20 + 12 (swap) + 50 + 12 (swap) + 20 + 30
+    assert np.all(result.duration == 144)
+
+
+def test_burst_waits_for_energy(data):
+    # the second burst needs 60 energy, with no energy in the config it never comes
+    result = run(data, "beta burst; beta burst;", max_frames=2000)
+    assert np.all(result.duration == 2000)
+    assert np.allclose(result.damage, 2 * 1080)
+
+
+def test_hit_after_the_action(data):
+    # the burst lasts 30 frames and hits at frame 45
+    result = run(data, "alpha burst;")
+    assert np.allclose(result.damage, 337.5 * 2)
+    assert np.all(result.duration == 46)
+    # it still lands once the next action started: N1 hits at 30 + 10, the burst at 45
+    result = run(data, "alpha burst, attack;")
+    assert np.allclose(result.damage, 337.5 * (2 + 1))
+    assert np.all(result.duration == 50)
+
+
+def test_cooldown_per_action(data):
+    # the skill cooldown (300 frames) holds the second skill but not the attack
+    result = run(data, "alpha skill, attack, skill;")
+    assert np.allclose(result.damage, 337.5 * (3 + 1 + 3))
+    assert np.all(result.duration == 330)
+
+
+def test_hit_before_the_action():
+    with pytest.raises(ValueError, match="Hit before the start"):
+        parse_data({"characters": {"alpha": {"element": "cryo", "scaling": "atk", "base_hp": 1, "base_atk": 1, "base_def": 1, "actions": {"attack": {"frames": 10, "hits": [[-1, 1.0]]}}}}})
+
+
+def test_talent_level(data):
+    config = parse_config(CONFIG.replace("alpha char lvl=90/90 cons=0 talent=1,1,1", "alpha char lvl=90/90 cons=0 talent=1,2,1") + "alpha skill;")
+    assert np.allclose(simulate(config, data, seed=0).damage, 337.5 * 4)
+    config = parse_config(CONFIG.replace("alpha char lvl=90/90 cons=0 talent=1,1,1", "alpha char lvl=90/90 cons=0 talent=1,3,1") + "alpha skill;")
+    with pytest.raises(ValueError, match="talent level 3"):
+        simulate(config, data)
+
+
+def test_combo_steps(data):
+    assert action_data(data, "alpha", "attack", 0).frames == 20
+    assert action_data(data, "alpha", "attack", 1).frames == 30
+    assert action_data(data, "alpha", "attack", 2).frames == 20
+
+
+def test_unknown_character(data):
+    config = parse_config("gamma char lvl=90/90 cons=0 talent=1,1,1;\ngamma add weapon=\"blade\";\ngamma attack;")
+    with pytest.raises(ValueError, match="character gamma"):
+        simulate(config, data)
+
+
+def test_unknown_weapon(data):
+    config = parse_config(CONFIG.replace('"blade"', '"spear"') + "alpha attack;")
+    with pytest.raises(ValueError, match="weapon spear"):
+        simulate(config, data)
+
+
+def test_unknown_action(data):
+    with pytest.raises(ValueError, match="action dash of alpha"):
+        run(data, "alpha dash;")
+
+
+def test_missing_field():
+    with pytest.raises(ValueError, match="No base_atk for the character alpha"):
+        parse_data({"characters": {"alpha": {"element": "cryo", "scaling": "atk", "base_hp": 1, "base_def": 1, "actions": {}}}})
+    with pytest.raises(ValueError, match="Unknown field frame"):
+        parse_data({"characters": {"alpha": {"element": "cryo", "scaling": "atk", "base_hp": 1, "base_atk": 1, "base_def": 1, "actions": {"attack": {"frame": 1}}}}})
@@ -0,0 +1,57 @@
+import numpy as np
+
+# under this length np.convolve is faster than going through the FFT
+FFT_THRESHOLD = 500
+
+
+def convolve(f_list, g_list, a):
+    """First a+1 terms of the convolution of f_list and g_list."""
+    f = np.asarray(f_list[:a + 1], dtype=float)
+    g = np.asarray(g_list[:a + 1], dtype=float)
+    values = np.zeros(a + 1)
+    if len(f) == 0 or len(g) == 0:
+        return values
+    if min(len(f), len(g)) < FFT_THRESHOLD:
+        result = np.convolve(f, g)
+    else:
+        size = len(f) + len(g) - 1
+        n = 1 << (size - 1).bit_length()
+        result = np.fft.irfft(np.fft.rfft(f, n) * np.fft.rfft(g, n), n)[:size]
+    values[:min(len(result), a + 1)] = result[:a + 1]
+    return values
+
+
+def convolve_rows(f_rows, g_list, a):
+    """First a+1 terms of the convolution of every row of f_rows with g_list."""
+    f = np.asarray(f_rows, dtype=float)[:, :a + 1]
+    g = np.asarray(g_list[:a + 1], dtype=float)
+    values = np.zeros((len(f), a + 1))
+    if f.shape[1] == 0 or len(g) == 0:
+        return values
+    size = f.shape[1] + len(g) - 1
+    n = 1 << (size - 1).bit_length()
+    result = np.fft.irfft(np.fft.rfft(f, n, axis=1) * np.fft.rfft(g, n), n, axis=1)[:, :size]
+    values[:, :min(size, a + 1)] = result[:, :a + 1]
+    return values
+
+
+def p_combine(f_list, g_list, a):
+    """Chance of f then g at pull x, g needs at least one pull (g_list[0] is left out)."""
+    g = np.array(g_list[:a + 1], dtype=float)
+    if len(g):
+        g[0] = 0
+    return convolve(f_list, g, a)
+
+
+def convolve_power(f_list, n, a):
+    """f_list convolved n times with itself, by squaring."""
+    result = np.zeros(a + 1)
+    result[0] = 1
+    power = np.asarray(f_list[:a + 1], dtype=float)
+    while n > 0:
+        if n & 1:
+            result = convolve(result, power, a)
+        n >>= 1
+        if n:
+            power = convolve(power, power, a)
+    return result
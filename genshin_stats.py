@@ -1,25 +1,217 @@
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import random
 from tqdm import tqdm
 import math
+import statistics
+import time
+import numpy as np
+
+from result_cache import persistent
+
+
+# ---------------- accumulators ----------------
+# Simulations feed these as they go instead of keeping one result per trial,
+# the memory only depends on the largest number of pulls seen.
+
+class PullHistogram:
+    def __init__(self, size=0):
+        self.counts = np.zeros(size, dtype=np.int64)
+
+    def add(self, pulls):
+        if isinstance(pulls, int) and pulls < len(self.counts):
+            self.counts[pulls] += 1
+            return self
+        pulls = np.asarray(pulls, dtype=np.int64).ravel()
+        if pulls.size == 0:
+            return self
+        size = max(len(self.counts), int(pulls.max()) + 1)
+        counts = np.bincount(pulls, minlength=size)
+        counts[:len(self.counts)] += self.counts
+        self.counts = counts
+        return self
+
+    def merge(self, other):
+        if len(other.counts) > len(self.counts):
+            self.counts, other_counts = other.counts.copy(), self.counts
+        else:
+            other_counts = other.counts
+        self.counts[:len(other_counts)] += other_counts
+        return self
+
+    def __len__(self):
+        return int(self.counts.sum())
+
+    def mean(self):
+        return float(np.arange(len(self.counts)) @ self.counts / len(self))
+
+    def variance(self):
+        values = np.arange(len(self.counts))
+        return float((values - self.mean()) ** 2 @ self.counts / len(self))
+
+    def cdf(self):
+        # cdf[k] is the fraction of trials done within k pulls
+        return np.cumsum(self.counts) / len(self)
+
+    def quantile(self, q):
+        # smallest number of pulls reached by at least a fraction q of the trials
+        return int(np.searchsorted(self.cdf(), q))
+
+    def quantiles(self, n=4):
+        return [self.quantile(i / n) for i in range(1, n)]
+
+    def confidence_interval(self, confidence=0.95):
+        # normal approximation for the mean number of pulls
+        z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+        half_width = z * math.sqrt(self.variance() / len(self))
+        return self.mean() - half_width, self.mean() + half_width
+
+
+class SuccessCounter:
+    def __init__(self, successes=0, trials=0):
+        self.successes = successes
+        self.trials = trials
+
+    def add(self, results):
+        if isinstance(results, bool):
+            self.successes += results
+            self.trials += 1
+            return self
+        results = np.asarray(results, dtype=bool)
+        self.successes += int(np.count_nonzero(results))
+        self.trials += results.size
+        return self
+
+    def merge(self, other):
+        self.successes += other.successes
+        self.trials += other.trials
+        return self
+
+    def __len__(self):
+        return self.trials
+
+    def proportion(self):
+        if self.trials <= 0:
+            raise ValueError("No trial in the counter")
+        return self.successes / self.trials
+
+    def confidence_interval(self, confidence=0.95, method="wilson"):
+        if method == "clopper-pearson":
+            return self.clopper_pearson_interval(confidence)
+        if method != "wilson":
+            raise ValueError(f"Unknown confidence interval method: {method}")
+        # Wilson score interval on the success probability
+        z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+        p = self.proportion()
+        denominator = 1 + z * z / self.trials
+        center = (p + z * z / (2 * self.trials)) / denominator
+        half_width = z * math.sqrt(p * (1 - p) / self.trials + z * z / (4 * self.trials ** 2)) / denominator
+        return center - half_width, center + half_width
+
+    def clopper_pearson_interval(self, confidence=0.95):
+        # exact interval from the beta quantiles
+        alpha = 1 - confidence
+        k, n = self.successes, self.trials
+        lower = 0.0 if k == 0 else inverse_regularized_beta(alpha / 2, k, n - k + 1)
+        upper = 1.0 if k == n else inverse_regularized_beta(1 - alpha / 2, k + 1, n - k)
+        return lower, upper
+
+
+def beta_continued_fraction(a, b, x, max_iterations=100_000, eps=1e-15):
+    # Lentz's method for the continued fraction of the incomplete beta function
+    tiny = 1e-300
+    c = 1.0
+    d = 1 - (a + b) * x / (a + 1)
+    d = 1 / (d if abs(d) > tiny else tiny)
+    res = d
+    for m in range(1, max_iterations + 1):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1 + numerator * d
+            d = 1 / (d if abs(d) > tiny else tiny)
+            c = 1 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            delta = c * d
+            res *= delta
+        if abs(delta - 1) < eps:
+            break
+    return res
+
+
+def regularized_beta(x, a, b):
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    log_front = math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log1p(-x)
+    if x < (a + 1) / (a + b + 2):
+        return math.exp(log_front) * beta_continued_fraction(a, b, x) / a
+    return 1 - math.exp(log_front) * beta_continued_fraction(b, a, 1 - x) / b
+
+
+def inverse_regularized_beta(q, a, b):
+    low, high = 0.0, 1.0
+    for _ in range(100):
+        middle = (low + high) / 2
+        if regularized_beta(middle, a, b) < q:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+# batched simulations never hold more than this many trials at once
+CHUNK_SIZE = 100_000
+
+
+def chunk_sizes(number_of_trials, chunk_size):
+    number_of_chunks = max(1, math.ceil(number_of_trials / chunk_size))
+    return [chunk_size] * (number_of_chunks - 1) + [number_of_trials - chunk_size * (number_of_chunks - 1)]
+
+
+# ---------------- rule tables ----------------
+# Rate of a 5-star for the pull made at every pity and the chance to see no
+# 5-star in the first pulls, computed once per rules and shared read-only by
+# the simulations, the exact solver and prob_wanted.
+
+@lru_cache(maxsize=None)
+def compile_rate_table(rate_5_star, hard_pity, soft_pity_start, soft_pity_step):
+    pity = np.arange(hard_pity + 1)
+    rate = np.where(pity < soft_pity_start, rate_5_star, rate_5_star + soft_pity_step * (pity - soft_pity_start + 1))
+    rate = np.minimum(rate, 1.0)
+    # survival[k]: no 5-star from pull 1 to pull k starting at pity 0
+    survival = np.ones(hard_pity + 1)
+    survival[1:] = np.cumprod(1 - rate[1:])
+    rate.setflags(write=False)
+    survival.setflags(write=False)
+    return rate, survival
+
 
 class Banner(ABC):
-    def __init__(self, rate_5_star, hard_pity, soft_pity_start, initial_pity=0):
+    # states of the counter carried by calc_proba_when_5_star (radiance)
+    number_of_radiance_states = 1
+
+    # a 4-star is guaranteed on the 10th wish without one
+    hard_pity_4_star = 10
+
+    def __init__(self, rate_5_star, hard_pity, soft_pity_start, initial_pity=0, rate_4_star=5.1):
         self.rate_5_star = rate_5_star / 100
+        self.rate_4_star = rate_4_star / 100
         self.hard_pity = hard_pity
         self.initial_pity = initial_pity
         self.current_pull = initial_pity
         self.total_pull = 0
         self.soft_pity_start = soft_pity_start
         self.garentee = False
+        ratio = math.ceil(100 / (self.hard_pity - self.soft_pity_start + 1)) / 100
+        self.rate_table, self.survival_table = compile_rate_table(self.rate_5_star, hard_pity, soft_pity_start, ratio)
 
     def calc_rate(self):
+        return self.rate_table[min(self.current_pull, self.hard_pity)]
 
-        if self.current_pull < self.soft_pity_start:
-            return self.rate_5_star
-        soft_pity_pull = self.current_pull - self.soft_pity_start + 1
-        ratio = math.ceil(100 / (self.hard_pity - self.soft_pity_start + 1)) / 100
-        return self.rate_5_star + ratio * soft_pity_pull
+    def calc_rate_batch(self, current_pull):
+        return self.rate_table.take(current_pull, mode="clip")
 
     def calc_proba(self):
         self.current_pull += 1
@@ -28,18 +220,21 @@ class Banner(ABC):
         return res
 
     def get_proba(self):
-        self.current_pull = 0
-        res = []
-        for i in range(1, self.hard_pity + 1):
-            self.current_pull = i
-            res.append(self.calc_rate() * 100)
-        self.current_pull = 0
-        return res
+        return (self.rate_table[1:] * 100).tolist()
 
     @abstractmethod
     def calc_proba_when_5_star(self):
         pass
 
+    @abstractmethod
+    def calc_proba_when_5_star_batch(self, index, rng):
+        pass
+
+    @abstractmethod
+    def outcomes_when_5_star(self, radiance):
+        # list of (probability, result, new radiance) of calc_proba_when_5_star
+        pass
+
     def pull(self):
         result = False
         if self.calc_proba():
@@ -53,6 +248,208 @@ class Banner(ABC):
         self.total_pull = 0
         self.garentee = False
 
+    # ---------------- batched simulation ----------------
+    # The batch_* arrays hold the state of the trials still running, one slot
+    # per trial, and mirror garentee of the scalar simulation. Instead of
+    # stepping wish by wish, the number of wishes until the next 5-star is
+    # drawn from its distribution, so only the 5-star outcome runs per 5-star.
+
+    def init_batch(self, number_of_trials):
+        self.batch_garentee = np.zeros(number_of_trials, dtype=bool)
+
+    def keep_batch(self, keep):
+        self.batch_garentee = self.batch_garentee[keep]
+
+    def gap_cdf(self, pity):
+        # cdf[k] is the chance to get the next 5-star within k wishes from this pity
+        if pity >= self.hard_pity:
+            return np.array([0.0, 1.0])
+        return 1 - self.survival_table[pity:] / self.survival_table[pity]
+
+    def sample_gaps(self, pity, size, rng):
+        # inverse cdf sampling, cdf[0] = 0 so every gap is at least one wish
+        return np.searchsorted(self.gap_cdf(pity), rng.random(size), side="right")
+
+    def run_batch(self, number_of_trials, number_of_pulls, number_of_wanted_5_stars, rng):
+        # number of wishes spent by every trial, -1 when it ran out of wishes
+        self.init_batch(number_of_trials)
+        spent = np.full(number_of_trials, -1, dtype=np.int64)
+        trials = np.arange(number_of_trials)
+        budgets = np.asarray(number_of_pulls)
+        obtained = np.zeros(number_of_trials, dtype=np.int64)
+        # wish at which every running trial gets its next 5-star
+        pulls = self.sample_gaps(self.initial_pity, number_of_trials, rng)
+        while trials.size:
+            keep = pulls <= budgets
+            if not keep.all():
+                trials, budgets, obtained, pulls = trials[keep], budgets[keep], obtained[keep], pulls[keep]
+                self.keep_batch(keep)
+            wanted = self.calc_proba_when_5_star_batch(np.arange(trials.size), rng) | self.batch_garentee
+            self.batch_garentee = ~wanted
+            obtained += wanted
+            done = obtained >= number_of_wanted_5_stars
+            spent[trials[done]] = pulls[done]
+            keep = ~done
+            trials, budgets, obtained, pulls = trials[keep], budgets[keep], obtained[keep], pulls[keep]
+            self.keep_batch(keep)
+            pulls += self.sample_gaps(0, trials.size, rng)
+        return spent
+
+    def pull_until_wanted_5_star_batch(self, number_of_trials, number_of_wanted_5_stars=1, rng=None):
+        rng = np.random.default_rng() if rng is None else rng
+        if number_of_wanted_5_stars <= 0:
+            return np.zeros(number_of_trials, dtype=np.int64)
+        unlimited = np.full(number_of_trials, np.iinfo(np.int64).max)
+        return self.run_batch(number_of_trials, unlimited, number_of_wanted_5_stars, rng)
+
+    def try_pull_batch(self, number_of_trials, number_of_pulls, number_of_wanted_5_stars=1, rng=None):
+        # number_of_pulls can be an array to give every trial its own budget
+        rng = np.random.default_rng() if rng is None else rng
+        number_of_pulls = np.broadcast_to(number_of_pulls, (number_of_trials,))
+        if number_of_wanted_5_stars <= 0:
+            # try_pull stops after the first wish whatever it gives
+            spent = np.where(number_of_pulls > 0, 1, -1)
+        else:
+            spent = self.run_batch(number_of_trials, number_of_pulls, number_of_wanted_5_stars, rng)
+        success = spent > 0
+        # same remaining wishes as try_pull
+        remaining = np.where(success, number_of_pulls - spent + 2, 0)
+        return success, remaining
+
+    # ---------------- starglitter simulation ----------------
+    # Wish by wish batch simulation of the notebook economy: 4-stars with their
+    # pity and 50/50, starglitter refunds, and wishes paid with 5 starglitter
+    # whenever there is enough of it.
+
+    def starglitter_batch(self, five_star, wanted, four_star, featured, rng):
+        # starglitter given by this wish, off-banner 4-stars give 2 and 5-stars 10,
+        # the featured ones depend on the banner, rng is for the overrides that
+        # draw part of the refund
+        return np.where(five_star & ~wanted, 10, np.where(four_star & ~featured, 2, 0))
+
+    def run_starglitter_batch(self, number_of_trials, number_of_pulls, number_of_wanted_5_stars, starglitter, rng, use_starglitter=True):
+        # (success, paid wishes spent, starglitter left) of every trial,
+        # number_of_pulls is the budget of paid wishes
+        success = np.zeros(number_of_trials, dtype=bool)
+        paid = np.zeros(number_of_trials, dtype=np.int64)
+        left = np.array(np.broadcast_to(starglitter, (number_of_trials,)), dtype=np.int64)
+        if number_of_wanted_5_stars <= 0:
+            success[:] = True
+            return success, paid, left
+        self.init_batch(number_of_trials)
+        state = {
+            "trial": np.arange(number_of_trials),
+            "budget": np.array(np.broadcast_to(number_of_pulls, (number_of_trials,))),
+            "paid": paid.copy(),
+            "starglitter": left.copy(),
+            "current_pull": np.full(number_of_trials, self.initial_pity, dtype=np.int64),
+            "current_pull_4_star": np.zeros(number_of_trials, dtype=np.int64),
+            "garentee_4_star": np.zeros(number_of_trials, dtype=bool),
+            "obtained": np.zeros(number_of_trials, dtype=np.int64),
+        }
+
+        def keep_state(keep):
+            paid[state["trial"][~keep]] = state["paid"][~keep]
+            left[state["trial"][~keep]] = state["starglitter"][~keep]
+            for key in state:
+                state[key] = state[key][keep]
+            self.keep_batch(keep)
+
+        while state["trial"].size:
+            free = use_starglitter & (state["starglitter"] >= 5)
+            keep = free | (state["paid"] < state["budget"])
+            if not keep.all():
+                keep_state(keep)
+                free = free[keep]
+            state["starglitter"] -= 5 * free
+            state["paid"] += ~free
+            size = free.size
+
+            state["current_pull"] += 1
+            five_star = rng.random(size) <= self.calc_rate_batch(state["current_pull"])
+            hit = np.flatnonzero(five_star)
+            state["current_pull"][hit] = 0
+            wanted = np.zeros(size, dtype=bool)
+            wanted[hit] = self.calc_proba_when_5_star_batch(hit, rng) | self.batch_garentee[hit]
+            self.batch_garentee[hit] = ~wanted[hit]
+
+            # the 4-star pity only moves on wishes without a 5-star
+            state["current_pull_4_star"] += ~five_star
+            four_star = ~five_star & ((state["current_pull_4_star"] >= self.hard_pity_4_star) | (rng.random(size) <= self.rate_4_star))
+            state["current_pull_4_star"][four_star] = 0
+            featured = four_star & ((rng.random(size) <= 0.5) | state["garentee_4_star"])
+            state["garentee_4_star"][four_star] = ~featured[four_star]
+
+            state["starglitter"] += self.starglitter_batch(five_star, wanted, four_star, featured, rng)
+            state["obtained"] += wanted
+            done = state["obtained"] >= number_of_wanted_5_stars
+            if done.any():
+                success[state["trial"][done]] = True
+                keep_state(~done)
+        return success, paid, left
+
+    # ---------------- exact solver ----------------
+    # Markov chain over (5-stars obtained, garentee, radiance, pity), the
+    # probability vector is moved forward one wish at a time.
+
+    def outcome_matrices(self):
+        # transitions of (garentee, radiance) when a 5-star drops, split
+        # between the wanted and not wanted results as in pull()
+        states = self.number_of_radiance_states
+        lose = np.zeros((2 * states, 2 * states))
+        win = np.zeros((2 * states, 2 * states))
+        for garentee in (0, 1):
+            for radiance in range(states):
+                for probability, result, new_radiance in self.outcomes_when_5_star(radiance):
+                    wanted = result or garentee
+                    target = (0 if wanted else states) + new_radiance
+                    (win if wanted else lose)[garentee * states + radiance, target] += probability
+        return lose, win
+
+    def exact_cdf(self, number_of_wishes, number_of_wanted_5_stars=1, garentee=False, radiance=0):
+        # cdf[k] is the probability to have the wanted 5-stars within k wishes
+        cdf = np.zeros(number_of_wishes + 1)
+        if number_of_wanted_5_stars <= 0:
+            cdf[:] = 1
+            return cdf
+        start = self.exact_start(garentee, radiance, self.initial_pity)
+        success, _ = self.exact_run(start, number_of_wanted_5_stars, number_of_wishes)
+        return np.cumsum(success.sum(axis=1))
+
+    def exact_start(self, garentee=False, radiance=0, pity=0):
+        # distribution over (garentee and radiance, pity) of a known state, every
+        # state of a banner has room for its initial pity so they can be summed
+        start = np.zeros((2 * self.number_of_radiance_states, max(self.hard_pity, self.initial_pity + 1, pity + 1)))
+        start[int(garentee) * self.number_of_radiance_states + radiance, pity] = 1
+        return start
+
+    def exact_run(self, start, number_of_wanted_5_stars, number_of_wishes):
+        # success[k, r]: probability to get the last wanted 5-star on wish k with
+        # radiance r after it, pulling[k]: distribution of the state of the
+        # trials still pulling after k wishes
+        size = start.shape[1]
+        # rate of the next wish for every pity
+        rate = self.calc_rate_batch(np.arange(1, size + 1))
+        lose, win = self.outcome_matrices()
+        state = np.zeros((number_of_wanted_5_stars,) + start.shape)
+        state[0] = start
+        success = np.zeros((number_of_wishes + 1, self.number_of_radiance_states))
+        pulling = np.zeros((number_of_wishes + 1,) + start.shape)
+        pulling[0] = start
+        for wish in range(1, number_of_wishes + 1):
+            five_star = (state * rate).sum(axis=2)
+            state[:, :, 1:] = state[:, :, :-1] * (1 - rate[:-1])
+            state[:, :, 0] = five_star @ lose
+            state[1:, :, 0] += five_star[:-1] @ win
+            # a wanted 5-star always ends without garentee
+            success[wish] = (five_star[-1] @ win)[:self.number_of_radiance_states]
+            pulling[wish] = state.sum(axis=0)
+        return success, pulling
+
+    def __getstate__(self):
+        # the batch arrays are scratch space, no need to send them to the workers
+        return {key: value for key, value in self.__dict__.items() if not key.startswith("batch_")}
+
     def pull_until_wanted_5_star(self, number_of_wanted_5_stars=1):
         self.init()
         current_pull = 0
@@ -71,21 +468,58 @@ class Banner(ABC):
                 return True , number_of_pulls - current_wishes_spend + 1
         return False,0
 
-    def test_banner_garentee(self, number_of_pulls=10000, number_of_wanted_5_stars=1):
+    def test_banner_garentee(self, number_of_pulls=10000, number_of_wanted_5_stars=1, batch=False):
+        # list of the number of pulls of every trial
+        if batch:
+            return [pulls for size in chunk_sizes(number_of_pulls, CHUNK_SIZE) for pulls in self.pull_until_wanted_5_star_batch(size, number_of_wanted_5_stars).tolist()]
         res = []
         for _ in tqdm(range(number_of_pulls), desc="Pulling for 5-star item"):
             res.append(self.pull_until_wanted_5_star(number_of_wanted_5_stars))
         return res
     
-    def test_number_of_pulls(self,number_of_wishes, number_of_wanted_5_stars=1, number_of_pulls=100_000):
+    def test_number_of_pulls(self,number_of_wishes, number_of_wanted_5_stars=1, number_of_pulls=100_000, batch=False):
+        # list of the success of every trial
+        if batch:
+            return [success for size in chunk_sizes(number_of_pulls, CHUNK_SIZE) for success in self.try_pull_batch(size, number_of_wishes, number_of_wanted_5_stars)[0].tolist()]
         res = []
         for _ in tqdm(range(number_of_pulls), desc="Pulling for 5-star item"):
             res.append(self.try_pull(number_of_wishes, number_of_wanted_5_stars)[0])
         return res
 
+    def test_banner_garentee_histogram(self, number_of_pulls=10000, number_of_wanted_5_stars=1, batch=False):
+        # same trials as test_banner_garentee counted in a PullHistogram
+        res = PullHistogram()
+        if batch:
+            for size in chunk_sizes(number_of_pulls, CHUNK_SIZE):
+                res.add(self.pull_until_wanted_5_star_batch(size, number_of_wanted_5_stars))
+            return res
+        for _ in tqdm(range(number_of_pulls), desc="Pulling for 5-star item"):
+            res.add(self.pull_until_wanted_5_star(number_of_wanted_5_stars))
+        return res
+
+    def test_number_of_pulls_counter(self, number_of_wishes, number_of_wanted_5_stars=1, number_of_pulls=100_000, batch=False):
+        # same trials as test_number_of_pulls counted in a SuccessCounter
+        res = SuccessCounter()
+        if batch:
+            for size in chunk_sizes(number_of_pulls, CHUNK_SIZE):
+                res.add(self.try_pull_batch(size, number_of_wishes, number_of_wanted_5_stars)[0])
+            return res
+        for _ in tqdm(range(number_of_pulls), desc="Pulling for 5-star item"):
+            res.add(self.try_pull(number_of_wishes, number_of_wanted_5_stars)[0])
+        return res
+
+    def test_banner_garentee_parallel(self, number_of_pulls=10000, number_of_wanted_5_stars=1, seed=None, max_workers=None):
+        return run_parallel(pulls_histogram, self, number_of_pulls, seed, max_workers, number_of_wanted_5_stars)
+
+    def test_number_of_pulls_parallel(self, number_of_wishes, number_of_wanted_5_stars=1, number_of_pulls=100_000, seed=None, max_workers=None):
+        return run_parallel(success_counter, self, number_of_pulls, seed, max_workers, number_of_wishes, number_of_wanted_5_stars)
+
 class CharBanner(Banner):
-    def __init__(self, rate_5_star=0.6, hard_pity=90, soft_pity_start=74, initial_pity=0):
-        super().__init__(rate_5_star, hard_pity, soft_pity_start, initial_pity)
+    number_of_radiance_states = 4
+
+    def __init__(self, rate_5_star=0.6, hard_pity=90, soft_pity_start=74, initial_pity=0, rate_4_star=5.1, number_of_C0=1):
+        super().__init__(rate_5_star, hard_pity, soft_pity_start, initial_pity, rate_4_star)
+        self.number_of_C0 = number_of_C0
         self.radiance = 0
         self.global_radiance = 0
 
@@ -102,24 +536,79 @@ class CharBanner(Banner):
         self.global_radiance += 1 if res else 0
         return res
 
+    def calc_proba_when_5_star_batch(self, index, rng):
+        radiance = self.batch_radiance[index]
+        first_roll = rng.random(index.size) <= 0.5
+        res = first_roll.copy()
+        reroll = ~first_roll & (radiance == 2)
+        res[reroll] = rng.random(np.count_nonzero(reroll)) <= 0.5
+        res[~first_roll & (radiance == 3)] = True
+        self.batch_radiance[index] = np.where(first_roll, 0, radiance + ~res)
+        return res
+
+    def outcomes_when_5_star(self, radiance):
+        if radiance == 2:
+            return [(0.5, True, 0), (0.25, True, 2), (0.25, False, 3)]
+        if radiance == 3:
+            return [(0.5, True, 0), (0.5, True, 3)]
+        return [(0.5, True, 0), (0.5, False, radiance + 1)]
+
     def init(self):
         super().init()
         self.radiance = 0
 
+    def init_batch(self, number_of_trials):
+        super().init_batch(number_of_trials)
+        self.batch_radiance = np.zeros(number_of_trials, dtype=np.int64)
+        # copies of each of the 3 featured 4-stars and featured 5-stars obtained
+        self.batch_count_4_star = np.zeros((number_of_trials, 3), dtype=np.int64)
+        self.batch_wanted = np.zeros(number_of_trials, dtype=np.int64)
+
+    def keep_batch(self, keep):
+        super().keep_batch(keep)
+        self.batch_radiance = self.batch_radiance[keep]
+        self.batch_count_4_star = self.batch_count_4_star[keep]
+        self.batch_wanted = self.batch_wanted[keep]
+
+    def starglitter_batch(self, five_star, wanted, four_star, featured, rng):
+        res = super().starglitter_batch(five_star, wanted, four_star, featured, rng)
+        # featured 5-stars past the wanted C0s are constellations
+        res += 10 * (wanted & (self.batch_wanted > self.number_of_C0))
+        # a new banner (and 4-star line up) for every wanted C0 but the last
+        new_banner = wanted & (self.batch_wanted + 1 < self.number_of_C0)
+        self.batch_count_4_star[new_banner] = 0
+        self.batch_wanted += wanted
+        index = np.flatnonzero(featured)
+        last_4_star = rng.integers(0, 3, index.size)
+        self.batch_count_4_star[index, last_4_star] += 1
+        count = self.batch_count_4_star[index, last_4_star]
+        res[index] += np.where(count > 7, 5, np.where(count > 1, 2, 0))
+        return res
+
 
 class WeaponBanner(Banner):
-    def __init__(self, rate_5_star=0.7, hard_pity=77, soft_pity_start=63,initial_pity=0):
-        super().__init__(rate_5_star, hard_pity, soft_pity_start,initial_pity)
+    def __init__(self, rate_5_star=0.7, hard_pity=77, soft_pity_start=63,initial_pity=0, rate_4_star=6.0):
+        super().__init__(rate_5_star, hard_pity, soft_pity_start,initial_pity, rate_4_star)
 
     def calc_proba_when_5_star(self):
         return random.random() <= 0.75 and random.random() <= 0.5
+
+    def calc_proba_when_5_star_batch(self, index, rng):
+        # the fate point of this banner is the garentee flag handled in run_batch
+        return (rng.random(index.size) <= 0.75) & (rng.random(index.size) <= 0.5)
+
+    def outcomes_when_5_star(self, radiance):
+        return [(0.375, True, 0), (0.625, False, 0)]
+
+    def starglitter_batch(self, five_star, wanted, four_star, featured, rng):
+        return super().starglitter_batch(five_star, wanted, four_star, featured, rng) + np.where(wanted, 10, np.where(featured, 2, 0))
     
 
 
 
 class CombinedBanner:
-    def __init__(self, initial_pity_char=0, initial_pity_weapon=0):
-        self.char_banner = CharBanner(initial_pity=initial_pity_char)
+    def __init__(self, initial_pity_char=0, initial_pity_weapon=0, number_of_C0=1):
+        self.char_banner = CharBanner(initial_pity=initial_pity_char, number_of_C0=number_of_C0)
         self.weapon_banner = WeaponBanner(initial_pity=initial_pity_weapon)
 
     def pull_until_wanted_5_stars(self, number_of_wanted_5_stars_chars=1, number_of_wanted_5_stars_weapons=1):
@@ -127,7 +616,18 @@ class CombinedBanner:
         weapon_pull = self.weapon_banner.pull_until_wanted_5_star(number_of_wanted_5_stars_weapons)
         return char_pull + weapon_pull
 
-    def test_number_of_pulls(self, number_of_wishes, number_of_wanted_5_stars=1, number_of_wanted_char_5_stars=1, number_of_pulls=100_000):
+    def test_number_of_pulls_batch(self, number_of_wishes, number_of_wanted_5_stars=1, number_of_wanted_char_5_stars=1, number_of_pulls=100_000, rng=None):
+        rng = np.random.default_rng() if rng is None else rng
+        char_success, char_remaining = self.char_banner.try_pull_batch(number_of_pulls, number_of_wishes, number_of_wanted_char_5_stars, rng)
+        weapon_success, _ = self.weapon_banner.try_pull_batch(np.count_nonzero(char_success), char_remaining[char_success], number_of_wanted_5_stars - number_of_wanted_char_5_stars, rng)
+        res = np.zeros(number_of_pulls, dtype=bool)
+        res[char_success] = weapon_success
+        return res
+
+    def test_number_of_pulls(self, number_of_wishes, number_of_wanted_5_stars=1, number_of_wanted_char_5_stars=1, number_of_pulls=100_000, batch=False):
+        # list of the success of every trial
+        if batch:
+            return [success for size in chunk_sizes(number_of_pulls, CHUNK_SIZE) for success in self.test_number_of_pulls_batch(number_of_wishes, number_of_wanted_5_stars, number_of_wanted_char_5_stars, size).tolist()]
         res = []
         for _ in tqdm(range(number_of_pulls), desc="Pulling for 5-star item"):
             char_success, char_remaining = self.char_banner.try_pull(number_of_wishes, number_of_wanted_char_5_stars)
@@ -137,25 +637,194 @@ class CombinedBanner:
             weapon_success, _ = self.weapon_banner.try_pull(char_remaining if char_success else number_of_wishes, number_of_wanted_5_stars - number_of_wanted_char_5_stars)
             res.append(weapon_success)
         return res
+
+    def test_number_of_pulls_counter(self, number_of_wishes, number_of_wanted_5_stars=1, number_of_wanted_char_5_stars=1, number_of_pulls=100_000, batch=False):
+        # same trials as test_number_of_pulls counted in a SuccessCounter
+        res = SuccessCounter()
+        if batch:
+            for size in chunk_sizes(number_of_pulls, CHUNK_SIZE):
+                res.add(self.test_number_of_pulls_batch(number_of_wishes, number_of_wanted_5_stars, number_of_wanted_char_5_stars, size))
+            return res
+        for _ in tqdm(range(number_of_pulls), desc="Pulling for 5-star item"):
+            char_success, char_remaining = self.char_banner.try_pull(number_of_wishes, number_of_wanted_char_5_stars)
+            if not char_success:
+                res.add(False)
+                continue
+            weapon_success, _ = self.weapon_banner.try_pull(char_remaining if char_success else number_of_wishes, number_of_wanted_5_stars - number_of_wanted_char_5_stars)
+            res.add(weapon_success)
+        return res
     
-    def get_proba(self, number_of_wishes, number_of_wanted_5_stars=1, number_of_wanted_char_5_stars=1, number_of_pulls=100_000):
-        res = self.test_number_of_pulls(number_of_wishes, number_of_wanted_5_stars, number_of_wanted_char_5_stars, number_of_pulls)
-        return sum(res) / len(res) * 100
+    def test_funded_pulls_batch(self, number_of_wishes, number_of_wanted_5_stars=1, number_of_wanted_char_5_stars=1, initial_starglitter=0, number_of_pulls=100_000, rng=None, use_starglitter=True):
+        # number_of_wishes paid wishes, the weapon banner is pulled first and its
+        # starglitter left goes to the character banner as in the notebook
+        rng = np.random.default_rng() if rng is None else rng
+        weapon_success, weapon_paid, starglitter = self.weapon_banner.run_starglitter_batch(number_of_pulls, number_of_wishes, number_of_wanted_5_stars - number_of_wanted_char_5_stars, initial_starglitter, rng, use_starglitter)
+        res = np.zeros(number_of_pulls, dtype=bool)
+        index = np.flatnonzero(weapon_success)
+        char_success, _, _ = self.char_banner.run_starglitter_batch(index.size, number_of_wishes - weapon_paid[index], number_of_wanted_char_5_stars, starglitter[index], rng, use_starglitter)
+        res[index] = char_success
+        return res
+
+    def test_funded_pulls(self, number_of_wishes, number_of_wanted_5_stars=1, number_of_wanted_char_5_stars=1, initial_starglitter=0, number_of_pulls=100_000, use_starglitter=True, seed=None, rng=None):
+        # one generator for every chunk, seeded by seed unless rng is given
+        rng = np.random.default_rng(seed) if rng is None else rng
+        res = SuccessCounter()
+        for size in chunk_sizes(number_of_pulls, CHUNK_SIZE):
+            res.add(self.test_funded_pulls_batch(number_of_wishes, number_of_wanted_5_stars, number_of_wanted_char_5_stars, initial_starglitter, size, rng, use_starglitter))
+        return res
 
-def get_proba(number_of_wishes, number_of_5_stars_char, number_of_5_stars_weapon, initial_pity_char=0, initial_pity_weapon=0, number_of_pulls=100_000):
+    def get_funded_proba(self, number_of_wishes, number_of_wanted_5_stars=1, number_of_wanted_char_5_stars=1, initial_starglitter=0, number_of_pulls=100_000, use_starglitter=True, seed=None, rng=None):
+        res = self.test_funded_pulls(number_of_wishes, number_of_wanted_5_stars, number_of_wanted_char_5_stars, initial_starglitter, number_of_pulls, use_starglitter, seed, rng)
+        return res.proportion() * 100
+
+    def get_proba(self, number_of_wishes, number_of_wanted_5_stars=1, number_of_wanted_char_5_stars=1, number_of_pulls=100_000, batch=False):
+        res = self.test_number_of_pulls_counter(number_of_wishes, number_of_wanted_5_stars, number_of_wanted_char_5_stars, number_of_pulls, batch)
+        return res.proportion() * 100
+
+    def test_number_of_pulls_parallel(self, number_of_wishes, number_of_wanted_5_stars=1, number_of_wanted_char_5_stars=1, number_of_pulls=100_000, seed=None, max_workers=None):
+        return run_parallel(combined_success_counter, self, number_of_pulls, seed, max_workers, number_of_wishes, number_of_wanted_5_stars, number_of_wanted_char_5_stars)
+
+    def get_proba_parallel(self, number_of_wishes, number_of_wanted_5_stars=1, number_of_wanted_char_5_stars=1, number_of_pulls=100_000, seed=None, max_workers=None):
+        res = self.test_number_of_pulls_parallel(number_of_wishes, number_of_wanted_5_stars, number_of_wanted_char_5_stars, number_of_pulls, seed, max_workers)
+        return res.proportion() * 100
+
+    def test_number_of_pulls_adaptive(self, number_of_wishes, number_of_wanted_5_stars=1, number_of_wanted_char_5_stars=1, ci_width=0.5, confidence=0.95, method="wilson", max_pulls=10_000_000, time_budget=None, seed=None):
+        # run batches until the confidence interval (in %) is narrower than
+        # ci_width, or max_pulls trials / time_budget seconds are spent
+        if max_pulls <= 0:
+            raise ValueError(f"Invalid max_pulls: {max_pulls}")
+        rng = np.random.default_rng(seed)
+        start = time.perf_counter()
+        res = SuccessCounter()
+        size = 1_000
+        while len(res) < max_pulls:
+            size = min(size, max_pulls - len(res))
+            res.add(self.test_number_of_pulls_batch(number_of_wishes, number_of_wanted_5_stars, number_of_wanted_char_5_stars, size, rng))
+            lower, upper = res.confidence_interval(confidence, method)
+            if (upper - lower) * 100 <= ci_width:
+                break
+            if time_budget is not None and time.perf_counter() - start >= time_budget:
+                break
+            size = min(2 * size, CHUNK_SIZE)
+        return res
+
+    def get_proba_adaptive(self, number_of_wishes, number_of_wanted_5_stars=1, number_of_wanted_char_5_stars=1, ci_width=0.5, confidence=0.95, method="wilson", max_pulls=10_000_000, time_budget=None, seed=None):
+        res = self.test_number_of_pulls_adaptive(number_of_wishes, number_of_wanted_5_stars, number_of_wanted_char_5_stars, ci_width, confidence, method, max_pulls, time_budget, seed)
+        return res.proportion() * 100, len(res)
+
+    def get_exact_proba(self, number_of_wishes, number_of_wanted_5_stars=1, number_of_wanted_char_5_stars=1):
+        if number_of_wishes <= 0:
+            return 0.0
+        char_cdf = self.char_banner.exact_cdf(number_of_wishes, number_of_wanted_char_5_stars)
+        char_pmf = np.diff(char_cdf)
+        if number_of_wanted_char_5_stars <= 0:
+            # try_pull stops after the first wish
+            char_pmf[:] = 0
+            char_pmf[0] = 1
+        # the weapon banner gets the same remaining wishes as in test_number_of_pulls
+        weapon_cdf = self.weapon_banner.exact_cdf(number_of_wishes + 1, number_of_wanted_5_stars - number_of_wanted_char_5_stars)
+        remaining = number_of_wishes - np.arange(1, number_of_wishes + 1) + 2
+        return float(char_pmf @ weapon_cdf[remaining]) * 100
+
+    def get_best_allocation(self, number_of_wishes, number_of_wanted_5_stars=1, number_of_wanted_char_5_stars=1):
+        # (wishes for the char banner of the best fixed split, its proba, proba of pulling
+        # each banner until its goal), probas in %. With independent banners the
+        # sequential policy succeeds iff both goals fit in the budget, whatever the
+        # order, and is never worse than a fixed split. Wishes are counted exactly,
+        # without the 2 extra wishes test_number_of_pulls gives the weapon banner.
+        char_cdf = self.char_banner.exact_cdf(number_of_wishes, number_of_wanted_char_5_stars)
+        weapon_cdf = self.weapon_banner.exact_cdf(number_of_wishes, number_of_wanted_5_stars - number_of_wanted_char_5_stars)
+        split_proba = char_cdf * weapon_cdf[::-1]
+        char_wishes = int(np.argmax(split_proba))
+        char_pmf = np.diff(char_cdf, prepend=0)
+        sequential_proba = float(char_pmf @ weapon_cdf[::-1])
+        return char_wishes, float(split_proba[char_wishes]) * 100, sequential_proba * 100
+
+# ---------------- parallel runner ----------------
+# Trials are cut in chunks of CHUNK_SIZE, each with its own SeedSequence
+# stream, so a run only depends on its seed and not on the number of workers.
+
+
+def pulls_histogram(banner, number_of_trials, seed, number_of_wanted_5_stars):
+    rng = np.random.default_rng(seed)
+    return PullHistogram().add(banner.pull_until_wanted_5_star_batch(number_of_trials, number_of_wanted_5_stars, rng))
+
+
+def success_counter(banner, number_of_trials, seed, number_of_wishes, number_of_wanted_5_stars):
+    rng = np.random.default_rng(seed)
+    success, _ = banner.try_pull_batch(number_of_trials, number_of_wishes, number_of_wanted_5_stars, rng)
+    return SuccessCounter().add(success)
+
+
+def combined_success_counter(combined_banner, number_of_trials, seed, number_of_wishes, number_of_wanted_5_stars, number_of_wanted_char_5_stars):
+    rng = np.random.default_rng(seed)
+    return SuccessCounter().add(combined_banner.test_number_of_pulls_batch(number_of_wishes, number_of_wanted_5_stars, number_of_wanted_char_5_stars, number_of_trials, rng))
+
+
+def merge_accumulators(accumulators):
+    res = accumulators[0]
+    for accumulator in accumulators[1:]:
+        res.merge(accumulator)
+    return res
+
+
+def run_parallel(function, banner, number_of_trials, seed=None, max_workers=None, *args):
+    sizes = chunk_sizes(number_of_trials, CHUNK_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(banner, size, chunk_seed) + args for size, chunk_seed in zip(sizes, seeds)]
+    if max_workers == 1:
+        return merge_accumulators([function(*job) for job in jobs])
+    with ProcessPoolExecutor(max_workers) as executor:
+        return merge_accumulators(list(executor.map(function, *zip(*jobs))))
+
+
+def banner_rules():
+    # everything the results depend on besides the query, for result_cache
+    banners = (CharBanner(), WeaponBanner())
+    return [(type(banner).__name__, banner.rate_table, [banner.outcomes_when_5_star(radiance) for radiance in range(banner.number_of_radiance_states)]) for banner in banners]
+
+
+@persistent("genshin_stats.get_exact_proba", banner_rules)
+def get_exact_proba(number_of_wishes, number_of_5_stars_char, number_of_5_stars_weapon, initial_pity_char=0, initial_pity_weapon=0):
+    combined_banner = CombinedBanner(initial_pity_char, initial_pity_weapon)
+    return combined_banner.get_exact_proba(number_of_wishes, number_of_5_stars_char + number_of_5_stars_weapon, number_of_5_stars_char)
+
+def get_best_allocation(number_of_wishes, number_of_5_stars_char, number_of_5_stars_weapon, initial_pity_char=0, initial_pity_weapon=0):
+    combined_banner = CombinedBanner(initial_pity_char, initial_pity_weapon)
+    return combined_banner.get_best_allocation(number_of_wishes, number_of_5_stars_char + number_of_5_stars_weapon, number_of_5_stars_char)
+
+def get_funded_proba(number_of_wishes, number_of_5_stars_char, number_of_5_stars_weapon, initial_starglitter=0, initial_pity_char=0, initial_pity_weapon=0, number_of_C0=1, number_of_pulls=100_000, use_starglitter=True, seed=None):
+    # chance with number_of_wishes paid wishes, starglitter refunds buying more
+    # unless use_starglitter is False
+    combined_banner = CombinedBanner(initial_pity_char, initial_pity_weapon, number_of_C0)
+    return combined_banner.get_funded_proba(number_of_wishes, number_of_5_stars_char + number_of_5_stars_weapon, number_of_5_stars_char, initial_starglitter, number_of_pulls, use_starglitter, seed)
+
+def get_proba(number_of_wishes, number_of_5_stars_char, number_of_5_stars_weapon, initial_pity_char=0, initial_pity_weapon=0, number_of_pulls=100_000, batch=False):
+    combined_banner = CombinedBanner(initial_pity_char, initial_pity_weapon)
+    return combined_banner.get_proba(number_of_wishes, number_of_5_stars_char + number_of_5_stars_weapon, number_of_5_stars_char, number_of_pulls, batch)
+
+def get_proba_adaptive(number_of_wishes, number_of_5_stars_char, number_of_5_stars_weapon, initial_pity_char=0, initial_pity_weapon=0, ci_width=0.5, confidence=0.95, method="wilson", max_pulls=10_000_000, time_budget=None, seed=None):
+    # (probability in %, number of trials used)
+    combined_banner = CombinedBanner(initial_pity_char, initial_pity_weapon)
+    return combined_banner.get_proba_adaptive(number_of_wishes, number_of_5_stars_char + number_of_5_stars_weapon, number_of_5_stars_char, ci_width, confidence, method, max_pulls, time_budget, seed)
+
+def get_proba_parallel(number_of_wishes, number_of_5_stars_char, number_of_5_stars_weapon, initial_pity_char=0, initial_pity_weapon=0, number_of_pulls=100_000, seed=None, max_workers=None):
     combined_banner = CombinedBanner(initial_pity_char, initial_pity_weapon)
-    return combined_banner.get_proba(number_of_wishes, number_of_5_stars_char + number_of_5_stars_weapon, number_of_5_stars_char, number_of_pulls)
+    return combined_banner.get_proba_parallel(number_of_wishes, number_of_5_stars_char + number_of_5_stars_weapon, number_of_5_stars_char, number_of_pulls, seed, max_workers)
 
 import math
 
+# per-pull probability table with soft/hard pity (linear ramp up to 1 at tmax)
+def pity_table(p0: float, tstart: int, tmax: int) -> np.ndarray:
+    return compile_rate_table(p0, tmax, tstart, (1 - p0) / (tmax - tstart + 1))[0]
+
 # per-pull probability function with soft/hard pity
 def pity_prob(p0: float, tstart: int, tmax: int, pity_index: int) -> float:
-    if pity_index < tstart:
-        return p0
-    elif pity_index >= tmax:
-        return 1.0
-    else:
-        return p0 + (1 - p0) * ((pity_index - tstart + 1) / (tmax - tstart + 1))
+    return float(pity_table(p0, tstart, tmax)[min(pity_index, tmax)])
+
+# genshin rules as taken by prob_wanted: (p0, tstart, tmax, q) per banner
+CHAR_RULES = (0.006, 74, 90, 0.5)
+WEAPON_RULES = (0.007, 63, 77, 0.375)
 
 # probability of at least one wanted 5★
 def prob_wanted(
@@ -166,21 +835,31 @@ def prob_wanted(
     w_w = N - w_c  # wishes spent on weapon banner
 
     # product for character banner
-    Pno_char = 1.0
-    for j in range(1, w_c + 1):
-        pity_index = C0 + j
-        p = pity_prob(p0_c, tstart_c, tmax_c, pity_index)
-        Pno_char *= (1 - p * q_c)
+    p = pity_table(p0_c, tstart_c, tmax_c).take(np.arange(C0 + 1, C0 + w_c + 1), mode="clip")
+    Pno_char = float(np.prod(1 - p * q_c))
 
     # product for weapon banner
-    Pno_weap = 1.0
-    for j in range(1, w_w + 1):
-        pity_index = W0 + j
-        p = pity_prob(p0_w, tstart_w, tmax_w, pity_index)
-        Pno_weap *= (1 - p * q_w)
+    p = pity_table(p0_w, tstart_w, tmax_w).take(np.arange(W0 + 1, W0 + w_w + 1), mode="clip")
+    Pno_weap = float(np.prod(1 - p * q_w))
 
     return (1 - (Pno_char * Pno_weap)) * 100
 
+# best w_c for prob_wanted, every split at once from prefix products
+def best_split_prob_wanted(
+    C0: int, W0: int, N: int,
+    p0_c: float, tstart_c: int, tmax_c: int, q_c: float,
+    p0_w: float, tstart_w: int, tmax_w: int, q_w: float,
+) -> tuple:
+    p = pity_table(p0_c, tstart_c, tmax_c).take(np.arange(C0 + 1, C0 + N + 1), mode="clip")
+    Pno_char = np.concatenate(([1.0], np.cumprod(1 - p * q_c)))  # Pno_char[w_c]
+
+    p = pity_table(p0_w, tstart_w, tmax_w).take(np.arange(W0 + 1, W0 + N + 1), mode="clip")
+    Pno_weap = np.concatenate(([1.0], np.cumprod(1 - p * q_w)))  # Pno_weap[w_w]
+
+    probs = (1 - Pno_char * Pno_weap[::-1]) * 100
+    w_c = int(np.argmax(probs))
+    return w_c, float(probs[w_c])
+
 # ---------------- Example usage ----------------
 if __name__ == "__main__":
     # Example params (toy values, not exact Genshin)
@@ -0,0 +1,150 @@
+from collections import namedtuple
+
+import numpy as np
+
+from genshin_stats import CharBanner, WeaponBanner
+
+# one banner of the plan: wishes earned before it and the featured copies wanted
+PlannedBanner = namedtuple("PlannedBanner", ["income", "number_of_5_stars_char", "number_of_5_stars_weapon"])
+
+# targets[i]: chance to complete banner i, cumulative[i]: chance to complete
+# banners 0 to i, joint: chance to complete the whole plan
+PlanResult = namedtuple("PlanResult", ["targets", "cumulative", "joint"])
+
+CHAR, WEAPON = 0, 1
+
+
+def add_to(keys, key, bank):
+    # keys maps (char state id, weapon state id, every target met) to the
+    # distribution of the wishes left, vectors of different lengths are padded
+    if key in keys:
+        old = keys[key]
+        if len(old) < len(bank):
+            old, bank = bank, old
+        old = old.copy()
+        old[:len(bank)] += bank
+        bank = old
+    keys[key] = bank
+
+
+def mass(keys):
+    return float(sum(bank.sum() for bank in keys.values()))
+
+
+class WishPlanner:
+    """
+    Chance to reach the targets of a list of banners, pulling on each banner
+    until its character then its weapon target is met or the wishes run out.
+
+    The pity, garentee and radiance of both banners carry over from one banner
+    to the next. The state is kept as a mixture where the wishes left, the
+    character banner state and the weapon banner state are independent inside
+    every part: meeting a target leaves the banner at pity 0 with only the
+    radiance left to know, and missing it leaves no wish, so the mixture stays
+    small and the whole plan is computed exactly without sampling.
+    """
+
+    def __init__(self, wishes=0, initial_pity_char=0, garentee_char=False, radiance=0, initial_pity_weapon=0, garentee_weapon=False):
+        self.banners = (CharBanner(initial_pity=initial_pity_char), WeaponBanner(initial_pity=initial_pity_weapon))
+        # states[side][id]: distribution over (garentee and radiance, pity), the
+        # first ones are the states right after a wanted 5-star for every radiance
+        self.states = ([], [])
+        for side, banner in enumerate(self.banners):
+            for radiance_left in range(banner.number_of_radiance_states):
+                self.states[side].append(banner.exact_start(False, radiance_left, 0))
+        char_start = self.add_state(CHAR, self.banners[CHAR].exact_start(garentee_char, radiance, initial_pity_char))
+        weapon_start = self.add_state(WEAPON, self.banners[WEAPON].exact_start(garentee_weapon, 0, initial_pity_weapon))
+        bank = np.zeros(wishes + 1)
+        bank[wishes] = 1
+        self.start = {(char_start, weapon_start, True): bank}
+        self.runs = {}
+
+    def add_state(self, side, state):
+        self.states[side].append(state)
+        return len(self.states[side]) - 1
+
+    def run(self, side, state_id, number_of_wanted_5_stars, number_of_wishes):
+        # exact_run from a stored state, reused while it is long enough
+        key = (side, state_id, number_of_wanted_5_stars)
+        if key not in self.runs or len(self.runs[key][0]) <= number_of_wishes:
+            self.runs[key] = self.banners[side].exact_run(self.states[side][state_id], number_of_wanted_5_stars, number_of_wishes)
+        return self.runs[key]
+
+    def pull(self, side, number_of_wanted_5_stars, keys):
+        # pull one banner until its target, returns the parts that met it and
+        # the ones that ran out of wishes
+        if number_of_wanted_5_stars <= 0:
+            return keys, {}
+        success = {}
+        failure = {}
+        for key, bank in keys.items():
+            success_pmf, pulling = self.run(side, key[side], number_of_wanted_5_stars, len(bank) - 1)
+            for radiance_left in range(success_pmf.shape[1]):
+                # left[b] = sum_k bank[b + k] * success_pmf[k, radiance_left]
+                left = np.convolve(bank[::-1], success_pmf[:len(bank), radiance_left])[:len(bank)][::-1]
+                if left.any():
+                    new_key = list(key)
+                    new_key[side] = radiance_left
+                    add_to(success, tuple(new_key), left)
+            # out of wishes, the parts sharing the other banner state are merged
+            state = np.tensordot(bank, pulling[:len(bank)], axes=1)
+            other = key[1 - side]
+            failure[other] = failure.get(other, 0) + state
+        res = {}
+        for other, state in failure.items():
+            total = state.sum()
+            if total <= 0:
+                continue
+            new_key = [None, None, False]
+            new_key[side] = self.add_state(side, state / total)
+            new_key[1 - side] = other
+            add_to(res, tuple(new_key), np.array([total]))
+        return success, res
+
+    def plan(self, banners):
+        """
+        Chance of every target of the plan.
+
+        Parameters
+        ----------
+        banners : iterable of PlannedBanner or (income, characters, weapons)
+            Banners in order, income is the number of wishes earned before the
+            banner, characters / weapons the featured copies wanted on it
+            (C0=1, R1=1).
+
+        Returns
+        -------
+        PlanResult
+            Probabilities (0-1) per target, cumulative and for the whole plan.
+        """
+        keys = self.start
+        targets = []
+        cumulative = []
+        for banner in banners:
+            banner = PlannedBanner(*banner)
+            keys = {key: np.concatenate((np.zeros(banner.income), bank)) for key, bank in keys.items()}
+            char_success, char_failure = self.pull(CHAR, banner.number_of_5_stars_char, keys)
+            weapon_success, weapon_failure = self.pull(WEAPON, banner.number_of_5_stars_weapon, char_success)
+            targets.append(mass(weapon_success))
+            cumulative.append(mass({key: bank for key, bank in weapon_success.items() if key[2]}))
+            keys = {}
+            for key, bank in weapon_success.items():
+                add_to(keys, key, bank)
+            for part in (char_failure, weapon_failure):
+                for key, bank in part.items():
+                    add_to(keys, key[:2] + (False,), bank)
+        return PlanResult(targets, cumulative, cumulative[-1] if cumulative else 1.0)
+
+
+def plan_wishes(banners, wishes=0, initial_pity_char=0, garentee_char=False, radiance=0, initial_pity_weapon=0, garentee_weapon=False):
+    planner = WishPlanner(wishes, initial_pity_char, garentee_char, radiance, initial_pity_weapon, garentee_weapon)
+    return planner.plan(banners)
+
+
+if __name__ == "__main__":
+    # C0 of a first character then C2R1 of a second one, with ~75 wishes a banner
+    plan = [PlannedBanner(75, 1, 0), PlannedBanner(75, 0, 0), PlannedBanner(75, 0, 0), PlannedBanner(75, 3, 1)]
+    result = plan_wishes(plan, wishes=60, initial_pity_char=20)
+    for index, (target, cumulative) in enumerate(zip(result.targets, result.cumulative)):
+        print(f"Banner {index + 1}: {target:.2%} (with every target before it: {cumulative:.2%})")
+    print(f"Whole plan: {result.joint:.2%}")
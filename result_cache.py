@@ -0,0 +1,182 @@
+import hashlib
+import inspect
+import io
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+import numpy as np
+
+DEFAULT_PATH = os.getenv("GENSHIN_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "genshin", "results.sqlite"))
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024  # bytes
+
+
+def key_part(value):
+    # stable text for the key, functions (like the featured tables) by name
+    if callable(value):
+        return f"{value.__module__}.{value.__qualname__}"
+    if isinstance(value, np.ndarray):
+        return hashlib.sha256(value.tobytes()).hexdigest() + str(value.dtype) + str(value.shape)
+    if isinstance(value, (tuple, list)):
+        return "(" + ",".join(key_part(v) for v in value) + ")"
+    if isinstance(value, dict):
+        return "{" + ",".join(f"{k}:{key_part(v)}" for k, v in sorted(value.items())) + "}"
+    return repr(value)
+
+
+def make_key(namespace, rules, *query):
+    """Hash of the rules and the query, the key changes as soon as the rules do."""
+    return hashlib.sha256(key_part((namespace, rules, query)).encode()).hexdigest()
+
+
+def dump(value):
+    buffer = io.BytesIO()
+    np.save(buffer, np.asarray(value), allow_pickle=False)
+    return buffer.getvalue()
+
+
+def load(data):
+    value = np.load(io.BytesIO(data), allow_pickle=False)
+    if value.ndim == 0:
+        return value.item()
+    value.setflags(write=False)
+    return value
+
+
+class ResultCache:
+    """
+    Results and distributions kept in SQLite between runs, least recently used dropped first.
+
+    One connection is shared by the threads of a process behind a lock, a
+    process forked with the cache open (the parallel runner) opens its own.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_size=DEFAULT_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.open()
+        with self.lock:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value BLOB, size INTEGER, last_used REAL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+            self.connection.commit()
+
+    def open(self):
+        self.pid = os.getpid()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+
+    def locked(self):
+        # the lock to hold around the queries, a forked process gets its own
+        # connection and lock
+        if self.pid != os.getpid():
+            self.lock = threading.Lock()
+            self.open()
+        return self.lock
+
+    def get(self, key):
+        with self.locked():
+            row = self.connection.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.connection.commit()
+        return load(row[0])
+
+    def put(self, key, value):
+        data = dump(value)
+        if len(data) > self.max_size:
+            return
+        with self.locked():
+            self.connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", (key, data, len(data), time.time()))
+            self.evict()
+            self.connection.commit()
+
+    def size(self):
+        with self.locked():
+            return self.total_size()
+
+    def total_size(self):
+        return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def __len__(self):
+        with self.locked():
+            return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def evict(self):
+        excess = self.total_size() - self.max_size
+        if excess <= 0:
+            return
+        rows = self.connection.execute("SELECT key, size FROM results ORDER BY last_used")
+        keys = []
+        for key, size in rows:
+            if excess <= 0:
+                break
+            keys.append((key,))
+            excess -= size
+        self.connection.executemany("DELETE FROM results WHERE key = ?", keys)
+
+    def clear(self):
+        with self.locked():
+            self.connection.execute("DELETE FROM results")
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+# cache used by the persistent functions, None until enable_cache is called:
+# the disk cache is opt-in and nothing outlives the process without it
+cache = None
+
+
+def enable_cache(path=DEFAULT_PATH, max_size=DEFAULT_MAX_SIZE):
+    global cache
+    if cache is not None:
+        cache.close()
+    cache = ResultCache(path, max_size)
+    return cache
+
+
+def disable_cache():
+    global cache
+    if cache is not None:
+        cache.close()
+    cache = None
+
+
+def persistent(namespace, rules):
+    """
+    Keep the results of a function in the cache once enable_cache was called.
+
+    rules is called on every call and its result goes in the key, so changing
+    the banner rules never gives back an old result. The arguments are bound
+    to the signature with the defaults filled in, so f(1), f(1, 0) and
+    f(a=1) share a key. Only for deterministic functions: a Monte Carlo
+    result would be one random sample given back forever.
+
+    An in-memory memo (lru_cache) goes under this decorator, so every call
+    still reaches the disk cache once it is enabled, values computed before
+    enable_cache included.
+    """
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if cache is None:
+                return function(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = make_key(namespace, rules(), tuple(bound.arguments.items()))
+            value = cache.get(key)
+            if value is None:
+                value = function(*args, **kwargs)
+                cache.put(key, value)
+            return value
+        return wrapper
+    return decorator
@@ -1,3 +1,11 @@
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from convolution import convolve_power, convolve_rows, p_combine
+from result_cache import persistent
+
 # --------------------- list initializations -----------------------
 
 p_C0_pity_list = []
@@ -7,80 +15,144 @@ p_w_list = []
 
 # --------------------- construct drop chance lists ------------------------
 
+# banner rules: base rate, last pull at base rate, soft pity step and hard pity
+BannerRules = namedtuple("BannerRules", ["base_rate", "soft_pity", "soft_pity_step", "hard_pity"])
 
+CHAR_RULES = BannerRules(0.006, 73, 0.06, 90)
+WEAPON_RULES = BannerRules(0.007, 62, 0.07, 77)
 
-def calc_chance_char(a):
-    if a>90:
+
+def calc_chance(rules, a):
+    if a>rules.hard_pity:
         return 0
-    if a>73:
-        return (a-73)*0.06+0.006
-    if a==90:
+    if a>rules.soft_pity:
+        return (a-rules.soft_pity)*rules.soft_pity_step+rules.base_rate
+    if a==rules.hard_pity:
         return 1
-    return 0.006
+    return rules.base_rate
 
-def p_char(a, pity=0):
-    if a+pity>90:
-        return 0
-    prod = 1
-    for x in range(pity, a+pity):
-        prod = prod*(1-calc_chance_char(x))
-    return calc_chance_char(a + pity)*prod
+
+def calc_chance_char(a):
+    return calc_chance(CHAR_RULES, a)
 
 
 def calc_chance_weap(a):
-    if a>77:
-        return 0
-    if a>62:
-        return (a-62)*0.07+0.007
-    if a==77:
-        return 1
-    return 0.007
+    return calc_chance(WEAPON_RULES, a)
 
 
-def p_weap(a, pity=0):
-    if a+pity>77:
-        return 0
-    prod = 1
-    for x in range(pity, a+pity):
-        prod = prod*(1-calc_chance_weap(x))
-    return calc_chance_weap(a + pity)*prod
-
-def p_combine(f_list, g_list, a):
-    values = []
-    for x in range(a+1):
-        chance = 0
-        for b in range(x):
-            chance+=f_list[b]*g_list[x-b]
-        values.append(chance)
+# --------------------- cached distribution tables ------------------------
+# Every table only depends on the banner rules and the pity, it is computed
+# once and shared (read-only) by every call.
+
+def read_only(values):
+    values.setflags(write=False)
     return values
 
 
+@lru_cache(maxsize=None)
+def chance_table(rules):
+    """Drop chance of a 5★ at every pity, the hard pity one capped at 1."""
+    return read_only(np.minimum([calc_chance(rules, a) for a in range(rules.hard_pity + 1)], 1.0))
+
+
+@lru_cache(maxsize=256)
+def first_5_star_table(rules, pity=0):
+    """
+    Probability of getting the first 5★ exactly on pull 'a', for every 'a'.
+
+    The next pull is the pity + 1-th one, so nothing comes on pull 0 and the
+    table sums to 1: p_combine leaves out the pull 0 term without losing mass.
+    """
+    chances = chance_table(rules)[min(pity, rules.hard_pity - 1) + 1:]
+    survival = np.ones(len(chances))
+    survival[1:] = np.cumprod(1 - chances[:-1])
+    return read_only(np.concatenate(([0.0], chances * survival)))
+
+
+@lru_cache(maxsize=256)
+def featured_char_table(rules, pity=0):
+    """Table of p_C0: 50% for the first 5★, guaranteed for the next one."""
+    first = first_5_star_table(rules, pity)
+    size = len(first) + rules.hard_pity
+    table = np.zeros(size)
+    table[:len(first)] = first / 2
+    table += p_combine(first, first_5_star_table(rules), size - 1) / 2
+    return read_only(table)
+
+
+@lru_cache(maxsize=256)
+def featured_weapon_table(rules, pity=0):
+    """Table of p_R1: 3/8 on the first 5★, 17/64 on the second, 23/64 on the third."""
+    first = first_5_star_table(rules, pity)
+    fresh = first_5_star_table(rules)
+    size = len(first) + 2 * rules.hard_pity
+    table = np.zeros(size)
+    table[:len(first)] = first * 3/8
+    second = p_combine(first, fresh, size - 1)
+    table += second * 17/64
+    table += p_combine(second, fresh, size - 1) * 23/64
+    return read_only(table)
+
+
+def table_value(table, a):
+    return table[a] if 0 <= a < len(table) else 0
+
+
+def table_list(table, length):
+    """First 'length' values of a table, padded with zeros."""
+    values = np.zeros(length)
+    values[:min(len(table), length)] = table[:length]
+    return values
+
+
+def p_char(a, pity=0):
+    return table_value(first_5_star_table(CHAR_RULES, pity), a)
+
+
+def p_weap(a, pity=0):
+    return table_value(first_5_star_table(WEAPON_RULES, pity), a)
+
+
 def p_C0(a, pity=0):
     """Probability of getting a featured 5★ (C0) exactly on pull 'a'."""
-    chance = p_char(a, pity) / 2  # 50% chance it's featured
-    for b in range(a):
-        chance += p_char(b, pity) * p_char(a - b) / 2
-    return chance
+    return table_value(featured_char_table(CHAR_RULES, pity), a)
 
 
 def p_R1(a, pity=0):
     """Probability of getting a featured 5★ weapon (R1) exactly on pull 'a'."""
     # Using the ratios from test2.py
-    value = p_weap(a, pity) * 3/8  # 3/8 chance for featured weapon
-    for b in range(a):
-        # 17/64 ratio for getting featured after one non-featured
-        value += p_weap(b, pity) * p_weap(a-b) * 17/64
-        for c in range(b):
-            # 23/64 ratio for getting featured after two non-featured
-            value += p_weap(c, pity) * p_weap(b-c) * p_weap(a-b) * 23/64
-    return value
+    return table_value(featured_weapon_table(WEAPON_RULES, pity), a)
+
+
+@lru_cache(maxsize=256)
+def goal_distribution(rules, featured_table, number_of_5_stars, pity, guarantee, length):
+    """Probability of getting the wanted featured 5★ copies exactly on pull 'a'."""
+    # choose starting distribution depending on guarantee
+    if guarantee:
+        first = table_list(first_5_star_table(rules, pity), length)
+    else:
+        first = table_list(featured_table(rules, pity), length)
+    if number_of_5_stars <= 1:
+        return read_only(first)
+    # combine distributions to reach desired constellation / refinement
+    power = convolve_power(featured_table(rules), number_of_5_stars - 1, length - 1)
+    return read_only(p_combine(power, first, length - 1))
 
 
 def cumulative_prob(f_list, wishes):
     """Cumulative probability up to 'wishes' pulls."""
-    return sum(f_list[:wishes + 1])
+    return float(np.sum(f_list[:wishes + 1]))
+
+
+# bumped when the model changes, so result_cache never gives back old results
+MODEL_VERSION = 2
 
 
+def banner_rules():
+    return (CHAR_RULES, WEAPON_RULES, MODEL_VERSION)
+
+
+@persistent("test.get_proba", banner_rules)
 def get_proba(number_of_wishes, number_of_5_stars_char=0, initial_pity_char=0, guarantee_char=False, number_of_5_stars_weapon=0, initial_pity_weapon=0, guarantee_weapon=False):
     """
     Calculate the probability of obtaining a certain number of featured 5★ characters and/or weapons
@@ -108,73 +180,170 @@ def get_proba(number_of_wishes, number_of_5_stars_char=0, initial_pity_char=0, g
     float
         Probability (0-1) of achieving the goal.
     """
-    # ------------------- helper functions -------------------
+    max_wishes = number_of_wishes
 
+    if number_of_5_stars_char > 0:
+        char_list = goal_distribution(CHAR_RULES, featured_char_table, number_of_5_stars_char, initial_pity_char, bool(guarantee_char), max_wishes + 1)
+    if number_of_5_stars_weapon > 0:
+        weapon_list = goal_distribution(WEAPON_RULES, featured_weapon_table, number_of_5_stars_weapon, initial_pity_weapon, bool(guarantee_weapon), max_wishes + 1)
 
+    # Return appropriate probability
+    if number_of_5_stars_char > 0 and number_of_5_stars_weapon > 0:
+        # Both character and weapon - return combined probability
+        combined_list = p_combine(char_list, weapon_list, max_wishes)
+        return cumulative_prob(combined_list, number_of_wishes)
+    elif number_of_5_stars_char > 0:
+        return cumulative_prob(char_list, number_of_wishes)
+    elif number_of_5_stars_weapon > 0:
+        return cumulative_prob(weapon_list, number_of_wishes)
+    else:
+        return 1.0  # No requirements means 100% success
 
 
- 
-    # ------------------- setup -------------------
 
-    max_wishes = number_of_wishes
-    char_fct_lists = []
-    weapon_fct_lists = []
-    
-    # Character calculations
-    if number_of_5_stars_char > 0:
-        
-        # choose starting distribution depending on guarantee
-        if guarantee_char:
-            p_pity_list = [p_char(i, initial_pity_char) for i in range(max_wishes + 1)]
-            char_fct_lists = [p_pity_list]
-        else:
-            p_C0_pity_list = [p_C0(i, initial_pity_char) for i in range(max_wishes + 1)]
-            char_fct_lists = [p_C0_pity_list]
 
-        # Setup p_C0_list for subsequent calculations
-        if initial_pity_char == 0:
-            p_C0_list = char_fct_lists[0] if not guarantee_char else [p_C0(i) for i in range(max_wishes + 1)]
-        else:
-            p_C0_list = [p_C0(i) for i in range(max_wishes + 1)]
 
-        # combine distributions to reach desired constellation
-        for _ in range(number_of_5_stars_char - 1):
-            char_fct_lists.append(p_combine(p_C0_list, char_fct_lists[-1], max_wishes))
+def goal_distributions(rules, featured_table, number_of_5_stars, pities, guarantees, length):
+    """goal_distribution for every (pity, guarantee), as rows of one array."""
+    rows = []
+    for pity in pities:
+        for guarantee in guarantees:
+            if guarantee:
+                rows.append(table_list(first_5_star_table(rules, pity), length))
+            else:
+                rows.append(table_list(featured_table(rules, pity), length))
+    rows = np.array(rows)
+    if number_of_5_stars <= 1:
+        return rows
+    # the shared part of every row is only computed once
+    power = convolve_power(featured_table(rules), number_of_5_stars - 1, length - 1)
+    rows[:, 0] = 0
+    return convolve_rows(rows, power, length - 1)
 
-    # Weapon calculations
-    if number_of_5_stars_weapon > 0:
-        # choose starting distribution depending on guarantee
-        if guarantee_weapon:
-            p_weapon_pity_list = [p_weap(i, initial_pity_weapon) for i in range(max_wishes + 1)]
-            weapon_fct_lists = [p_weapon_pity_list]
-        else:
-            p_R1_pity_list = [p_R1(i, initial_pity_weapon) for i in range(max_wishes + 1)]
-            weapon_fct_lists = [p_R1_pity_list]
 
-        # Setup p_R1_list for subsequent calculations
-        if initial_pity_weapon == 0:
-            p_R1_list = weapon_fct_lists[0] if not guarantee_weapon else [p_R1(i) for i in range(max_wishes + 1)]
-        else:
-            p_R1_list = [p_R1(i) for i in range(max_wishes + 1)]
+def get_proba_surface(wishes, number_of_5_stars_char=0, char_pities=(0,), char_guarantees=(False,), number_of_5_stars_weapon=0, weapon_pities=(0,), weapon_guarantees=(False,)):
+    """
+    get_proba for every combination of the given wishes, pities and guarantees at once.
 
-        # combine distributions to reach desired refinement
-        for _ in range(number_of_5_stars_weapon - 1):
-            weapon_fct_lists.append(p_combine(p_R1_list, weapon_fct_lists[-1], max_wishes))
+    Parameters
+    ----------
+    wishes : iterable of int
+        Numbers of wishes to evaluate.
+    number_of_5_stars_char : int
+        Number of featured 5★ characters you want (C0=1, C1=2, etc.).
+    char_pities, weapon_pities : iterable of int, optional
+        Pity counts on the character / weapon banner at the start.
+    char_guarantees, weapon_guarantees : iterable of bool, optional
+        Guarantee flags of the character / weapon banner.
+    number_of_5_stars_weapon : int
+        Number of featured 5★ weapons you want (R1=1, R2=2, etc.).
+
+    Returns
+    -------
+    numpy.ndarray
+        Probabilities (0-1) with the axes
+        (wishes, char_pities, char_guarantees, weapon_pities, weapon_guarantees).
+    """
+    wishes = np.asarray(wishes, dtype=int)
+    char_pities, char_guarantees = list(char_pities), list(char_guarantees)
+    weapon_pities, weapon_guarantees = list(weapon_pities), list(weapon_guarantees)
+    shape = (len(wishes), len(char_pities), len(char_guarantees), len(weapon_pities), len(weapon_guarantees))
+    length = int(wishes.max()) + 1 if len(wishes) else 1
+    if number_of_5_stars_char <= 0 and number_of_5_stars_weapon <= 0:
+        return np.ones(shape)
+
+    if number_of_5_stars_char > 0:
+        char_rows = goal_distributions(CHAR_RULES, featured_char_table, number_of_5_stars_char, char_pities, char_guarantees, length)
+    if number_of_5_stars_weapon > 0:
+        weapon_rows = goal_distributions(WEAPON_RULES, featured_weapon_table, number_of_5_stars_weapon, weapon_pities, weapon_guarantees, length)
 
-    # Return appropriate probability
     if number_of_5_stars_char > 0 and number_of_5_stars_weapon > 0:
-        # Both character and weapon - return combined probability
-        combined_list = p_combine(char_fct_lists[-1], weapon_fct_lists[-1], max_wishes)
-        return cumulative_prob(combined_list, number_of_wishes)
+        # p_combine then cumulative_prob up to N is sum_b char[b] * weapon_cdf[N - b],
+        # weapon_cdf leaving out the pull 0 term like p_combine
+        weapon_cdf = np.cumsum(weapon_rows, axis=1) - weapon_rows[:, :1]
+        surface = np.empty((len(wishes), len(char_rows), len(weapon_rows)))
+        for index, number_of_wishes in enumerate(wishes):
+            surface[index] = char_rows[:, :number_of_wishes + 1] @ weapon_cdf[:, number_of_wishes::-1].T
     elif number_of_5_stars_char > 0:
-        return cumulative_prob(char_fct_lists[-1], number_of_wishes)
-    elif number_of_5_stars_weapon > 0:
-        return cumulative_prob(weapon_fct_lists[-1], number_of_wishes)
+        surface = np.cumsum(char_rows, axis=1)[:, wishes].T
     else:
-        return 1.0  # No requirements means 100% success
+        surface = np.cumsum(weapon_rows, axis=1)[:, wishes].T
+
+    # banners without a goal keep their axes, the values just don't depend on them
+    char_shape = shape[1:3] if number_of_5_stars_char > 0 else (1, 1)
+    weapon_shape = shape[3:] if number_of_5_stars_weapon > 0 else (1, 1)
+    surface = surface.reshape((len(wishes),) + char_shape + weapon_shape)
+    return np.broadcast_to(surface, shape).copy()
+
+
+# --------------------- number of wishes statistics ------------------------
+
+WishesStats = namedtuple("WishesStats", ["mean", "variance", "quantiles"])
+
 
+def support_length(rules, featured_table, number_of_5_stars, pity, guarantee):
+    """Number of pulls 'a' where goal_distribution can be non zero, plus one."""
+    first = first_5_star_table(rules, pity) if guarantee else featured_table(rules, pity)
+    return len(first) + (number_of_5_stars - 1) * (len(featured_table(rules)) - 1)
 
 
+@persistent("test.get_wishes_distribution", banner_rules)
+@lru_cache(maxsize=256)
+def get_wishes_distribution(number_of_5_stars_char=0, initial_pity_char=0, guarantee_char=False, number_of_5_stars_weapon=0, initial_pity_weapon=0, guarantee_weapon=False):
+    """Probability of reaching the goal exactly on pull 'a', over the whole support (it sums to 1)."""
+    distribution = np.ones(1)
+    if number_of_5_stars_char > 0:
+        length = support_length(CHAR_RULES, featured_char_table, number_of_5_stars_char, initial_pity_char, bool(guarantee_char))
+        distribution = goal_distribution(CHAR_RULES, featured_char_table, number_of_5_stars_char, initial_pity_char, bool(guarantee_char), length)
+    if number_of_5_stars_weapon > 0:
+        length = support_length(WEAPON_RULES, featured_weapon_table, number_of_5_stars_weapon, initial_pity_weapon, bool(guarantee_weapon))
+        weapon = goal_distribution(WEAPON_RULES, featured_weapon_table, number_of_5_stars_weapon, initial_pity_weapon, bool(guarantee_weapon), length)
+        if number_of_5_stars_char > 0:
+            distribution = p_combine(distribution, weapon, len(distribution) + len(weapon) - 2)
+        else:
+            distribution = weapon
+    # the convolutions leave rounding noise around 0, the values are not
+    # renormalized so their cumsum is the get_proba of every number of wishes
+    return read_only(np.clip(distribution, 0, None))
+
+
+def get_wishes_stats(number_of_5_stars_char=0, initial_pity_char=0, guarantee_char=False, number_of_5_stars_weapon=0, initial_pity_weapon=0, guarantee_weapon=False, quantiles=(0.25, 0.5, 0.75, 0.9)):
+    """
+    Mean, variance and quantiles of the number of wishes needed to reach a goal,
+    computed from the distribution instead of simulating pulls.
+
+    Parameters
+    ----------
+    number_of_5_stars_char : int
+        Number of featured 5★ characters you want (C0=1, C1=2, etc.).
+    initial_pity_char : int, optional
+        Pity count on the character banner at the start. Default = 0.
+    guarantee_char : bool, optional
+        Whether your next 5★ character is guaranteed featured. Default = False.
+    number_of_5_stars_weapon : int
+        Number of featured 5★ weapons you want (R1=1, R2=2, etc.).
+    initial_pity_weapon : int, optional
+        Pity count on the weapon banner at the start. Default = 0.
+    guarantee_weapon : bool, optional
+        Whether your next 5★ weapon is guaranteed featured. Default = False.
+    quantiles : iterable of float, optional
+        Probabilities (0-1) to get the number of wishes of, 0.9 gives the wishes
+        needed for 90% certainty.
+
+    Returns
+    -------
+    WishesStats
+        (mean, variance, quantiles) with quantiles a list of wishes in the
+        order of the given probabilities.
+    """
+    distribution = get_wishes_distribution(number_of_5_stars_char, initial_pity_char, bool(guarantee_char), number_of_5_stars_weapon, initial_pity_weapon, bool(guarantee_weapon))
+    pulls = np.arange(len(distribution))
+    mean = float(pulls @ distribution)
+    variance = float((pulls - mean) ** 2 @ distribution)
+    cdf = np.cumsum(distribution)
+    # smallest number of wishes with cdf >= q, the tolerance absorbs rounding in the cumsum
+    wishes = np.searchsorted(cdf, np.asarray(quantiles, dtype=float) - 1e-12)
+    return WishesStats(mean, variance, np.minimum(wishes, len(cdf) - 1).tolist())
 
 
 if __name__ == "__main__":
@@ -18,8 +18,12 @@ If you have any questions regarding this program, you can e-mail me on:
 
 """
 
-import matplotlib.pyplot as plt
+from abc import ABC, abstractmethod
+from functools import lru_cache
 
+import numpy as np
+
+from convolution import convolve
 
 
 # --------------------- list initializations -----------------------
@@ -112,27 +116,17 @@ def p_w(a, pity=0):
 # --------------------              and to make stuff easier               ----------------------
 
 
-def p_combine(f_list, g_list, a):
-    values = []
-    for x in range(a+1):
-        chance = 0
-        for b in range(x):
-            chance+=f_list[b]*g_list[x-b]
-        values.append(chance)
-    return values
-
-
 def P_f(f_list, a):
     if type(a) == int:
-        return round(sum(f_list)*100, 2)
+        return round(float(np.sum(f_list))*100, 2)
     elif type(a) == range:
-        values = []
-        for b in range(len(a)):
-            values.append(sum(f_list[0:b+1]))
-        return values
+        return np.cumsum(f_list)[:len(a)].tolist()
 
 
 def plot(f_list, title, ylabel, xlabel):
+    # matplotlib is only needed to plot, importing test2 works without it
+    import matplotlib.pyplot as plt
+
     a = len(f_list)
     w = range(a)
     plt.plot(w,f_list)
@@ -145,6 +139,149 @@ def plot(f_list, title, ylabel, xlabel):
 
 # ------------------------ final function --------------------------
 
+# -------------------- incremental distributions ----------------------
+# The distributions below keep the values they already computed, asking for a
+# longer horizon only computes the new pulls.
+
+class Distribution(ABC):
+    """Probability of reaching a goal exactly at pull a, for a growing range of a."""
+
+    def __init__(self):
+        self.values = np.zeros(0)
+
+    @abstractmethod
+    def compute(self, start, stop):
+        """Values for the pulls start to stop-1."""
+
+    def extend(self, length):
+        """The first 'length' values, only computing the ones not known yet."""
+        if length > len(self.values):
+            self.values = np.concatenate((self.values, self.compute(len(self.values), length)))
+        return self.values[:length]
+
+
+class FirstFiveStar(Distribution):
+    """p or p_w: first 5-star at pull a, from some pity."""
+
+    def __init__(self, drop_chance_list, pity=0):
+        super().__init__()
+        chances = np.array(drop_chance_list[pity:], dtype=float)
+        survival = np.ones(len(chances))
+        survival[1:] = np.cumprod(1 - chances[:-1])
+        self.table = chances * survival
+
+    def compute(self, start, stop):
+        values = np.zeros(stop - start)
+        table = self.table[start:stop]
+        values[:len(table)] = table
+        return values
+
+
+class Convolution(Distribution):
+    """f then g, with skip_first the pull 0 term of g is left out like p_combine."""
+
+    def __init__(self, f, g, skip_first=False):
+        super().__init__()
+        self.f, self.g = f, g
+        self.skip_first = skip_first
+
+    def compute(self, start, stop):
+        f = self.f.extend(stop)
+        g = self.g.extend(stop).copy()
+        if self.skip_first and len(g):
+            g[0] = 0
+        if start == 0:
+            return convolve(f, g, stop - 1)
+        # only the new terms, each one is a dot product with the reversed g
+        return np.array([np.dot(f[:k + 1], g[k::-1]) for k in range(start, stop)])
+
+
+class Mixture(Distribution):
+    """Weighted sum of distributions."""
+
+    def __init__(self, weighted):
+        super().__init__()
+        self.weighted = weighted
+
+    def compute(self, start, stop):
+        return sum(weight * distribution.extend(stop)[start:] for weight, distribution in self.weighted)
+
+
+class Delta(Distribution):
+    """Goal reached at pull 0, the neutral element of the convolution."""
+
+    def compute(self, start, stop):
+        values = np.zeros(stop - start)
+        if start == 0:
+            values[0] = 1
+        return values
+
+
+def power(distribution, n):
+    """distribution convolved n times with itself, by squaring (log2(n) squares)."""
+    result = Delta()
+    square = distribution
+    while n > 0:
+        if n & 1:
+            result = Convolution(result, square)
+        n >>= 1
+        if n:
+            square = Convolution(square, square)
+    return result
+
+
+# distributions already built by chance are kept between calls, at most
+# CACHE_SIZE of each kind (every pity is its own distribution)
+CACHE_SIZE = 256
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def first_char(pity=0):
+    return FirstFiveStar(drop_chance, pity)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def first_weapon(pity=0):
+    return FirstFiveStar(drop_chance_w, pity)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def featured_char(pity=0):
+    # p_C0: 50% on the first 5-star, guaranteed on the next one
+    return Mixture([(1/2, first_char(pity)), (1/2, Convolution(first_char(pity), first_char(), True))])
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def featured_weapon(pity=0):
+    # p_R1: 3/8 on the first 5-star, 17/64 on the second, 23/64 on the third
+    second = Convolution(first_weapon(pity), first_weapon(), True)
+    third = Convolution(second, first_weapon(), True)
+    return Mixture([(3/8, first_weapon(pity)), (17/64, second), (23/64, third)])
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def goal_distribution(characters, refinements, character_pity=0, weapon_pity=0, guarantee="no"):
+    """Distribution of the pull reaching the goal, None for an invalid guarantee."""
+    char = weap = None
+    if characters > 0:
+        if guarantee == "no":
+            char = featured_char(character_pity)
+        elif guarantee == "yes":
+            char = first_char(character_pity)
+        else:
+            return None
+        if characters > 1:
+            char = Convolution(power(featured_char(), characters - 1), char, True)
+    if refinements > 0:
+        weap = featured_weapon(weapon_pity)
+        if refinements > 1:
+            # the refinements after the first use the weapon pity too, as p_R1 always did
+            weap = Convolution(power(featured_weapon(weapon_pity), refinements - 1), weap, True)
+    if char is not None and weap is not None:
+        return Convolution(char, weap, True)
+    return char if char is not None else weap
+
+
 def chance(goal, wishes=0, character_pity=0, weapon_pity=0, guarantee = "no"):
     """
     This function returns the chance of obtaining the goal within "wishes" number of wishes
@@ -182,18 +319,14 @@ def chance(goal, wishes=0, character_pity=0, weapon_pity=0, guarantee = "no"):
     #------------------- easy computations ---------------------
     
     if goal == "any character" or (goal == "c0" and guarantee == "yes"):
-        p_pity_list = []
-        for i in range(a+1):
-            p_pity_list.append(p(i, character_pity))
+        p_pity_list = first_char(character_pity).extend(a+1)
         
         print(str(P_f(p_pity_list, wishes))+"%")
         return P_f(p_pity_list, wishes)
     
     
     elif goal == "any weapon":
-        p_pity_list = []
-        for i in range(a+1):
-            p_pity_list.append(p_w(i, weapon_pity))
+        p_pity_list = first_weapon(weapon_pity).extend(a+1)
         
         print(str(P_f(p_pity_list, wishes))+"%")
         return P_f(p_pity_list, wishes)
@@ -212,264 +345,142 @@ def chance(goal, wishes=0, character_pity=0, weapon_pity=0, guarantee = "no"):
             refinements = int(letter)
         prev = letter
     
-    
-    
-    #------------------- function definitions --------------------
-    
-    def p_C0(a, pity=0):
-        if type(a) == int:
-            chance = p(a, pity)/2
-            for b in range(a):
-                chance+=p(b, pity)*p(a-b)/2
-            return chance
-        if type(a) == range:
-            values = []
-            for x in range(len(a)):
-                chance = p(x, pity)/2
-                for b in range(x):
-                    chance+=p(b, pity)*p(x-b)/2
-                values.append(chance)
-            return values
-    
-    
-    def p_R1(a, pity=0):
-        if type(a) == int:
-            value = p_w_pity_list[a]*3/8
-            for b in range(a):
-                # value+=(p_w_list[b]*1/4)*(p_w_list[a-b]*1/2)
-                # value+=(p_w_list[b]*3/8)*(p_w_list[a-b]*3/8)
-                value+= p_w_pity_list[b]*p_w_list[a-b]*17/64
-                for c in range(b):
-                    # value+= (p_w_list[c]*3/8)*(p_w_list[b-c]*5/8)*p_w_list[a-b]
-                    # value+= (p_w_list[c]*0.25)*(p_w_list[b-c]*0.5)*p_w_list[a-b]
-                    value += p_w_pity_list[c]*p_w_list[b-c]*p_w_list[a-b]*23/64
-            return value
-        if type(a) == range:
-            values = []
-            for x in range(len(a)):
-                value = p_w_list(x)*3/8
-                for b in range(x):
-                    value+= p_w_list[b]*p_w_list[x-b]*17/64
-                    for c in range(b):
-                        value += p_w_list[c]*p_w_list[b-c]*p_w_list[x-b]*23/64
-                values.append(value)
-            return values
-    
-    
-    #------------------- setup of lists to reduce computation time --------------------
-    
-    if characters>0:
-        p_pity_list = []
-        for i in range(a+1):
-            p_pity_list.append(p(i, character_pity))
-        
-        p_C0_pity_list = []
-        for i in range(a+1):
-            p_C0_pity_list.append(p_C0(i, character_pity))
-
-        if character_pity == 0:
-            p_C0_list = p_C0_pity_list
-        else:
-            p_C0_list = []
-            for i in range(a+1):
-                p_C0_list.append(p_C0(i))
-                
-    if refinements>0:
-        p_w_pity_list = []
-        for i in range(a+1):
-            p_w_pity_list.append(p_w(i, weapon_pity))
-        
-        if weapon_pity == 0:
-            p_w_list = p_w_pity_list
-        else:
-            p_w_list = []
-            for i in range(a+1):
-                p_w_list.append(p_w(i))
-        
-        p_R1_pity_list = []
-        for i in range(a+1):
-            p_R1_pity_list.append(p_R1(i, weapon_pity))
-            
-        
-        if weapon_pity == 0:
-            p_R1_list = p_R1_pity_list
-        else:
-            p_R1_list = []
-            for i in range(a+1):
-                p_R1_list.append(p_R1(i))
-    
-    
-    
-    #------------------- mix and match functions -----------------
-    
-    if guarantee == "no" and characters>0:
-        char_fct_lists = [p_C0_pity_list]
-    elif guarantee == "yes" and characters>0:
-        char_fct_lists = [p_pity_list]
-    elif characters == 0:
-        pass
-    else:
+    if characters == 0 and refinements == 0:
+        print("You probably made a typo. Please try again.")
+        return None
+    distribution = goal_distribution(characters, refinements, character_pity, weapon_pity, guarantee)
+    if distribution is None:
         print("invalid guarantee input")
-    if refinements>0:
-        weap_fct_lists = [p_R1_pity_list]
-    
-    
-    for i in range(characters-1):
-        char_fct_lists.append(p_combine(p_C0_list, char_fct_lists[-1], a))
-    
-    for i in range(refinements-1):
-        weap_fct_lists.append(p_combine(p_R1_list, weap_fct_lists[-1], a))
-
-    
-    if characters>0 and refinements>0:
-        chance_list = p_combine(char_fct_lists[-1], weap_fct_lists[-1], a)
-        print(str(P_f(chance_list, wishes))+"%")
-        return P_f(chance_list, wishes)
-    elif characters>0 and refinements == 0:
-        print(str(P_f(char_fct_lists[-1], wishes))+"%")
-        return P_f(char_fct_lists[-1], wishes)
-    elif characters == 0 and refinements>0:
-        print(str(P_f(weap_fct_lists[-1], wishes))+"%")
-        return P_f(weap_fct_lists[-1], wishes)
-    
-    print("You probably made a typo. Please try again.")
+        return None
+    chance_list = distribution.extend(a+1)
+    print(str(P_f(chance_list, wishes))+"%")
+    return P_f(chance_list, wishes)
 
 
 # -------------------------- program loop ------------------------------
 
-running = True
-noob = True
-
-while running:
-    if noob:
-        print("Welcome to this wish chance calculator. The questions you will get "+
-              "(if applicable) to calculate your odds, are:\n"+"\n"+
-              "goal (any character, any weapon, C0, R1, C4R2, etc.):\n"+
-              "number of wishes:\n"+
-              "pity for the character banner:\n"+
-              "guarantee (yes/no):\n"+
-              "pity for the weapon banner:\n"+
-              "Would you like to see a graph of your chances? (yes/no):\n"+"\n"+
-              "The tutorial will explain each question in more detail.")
-        tutorial = input("Would you like to follow the tutorial? (yes/no): ")
-    noob = False
-    
-    if tutorial == "yes":
-        print("\n Welcome to the tutorial. You will now be guided step-by-step through" +  
-              " program. Let's get started.\n" + 
-              "(hit enter to reveal a new line of the tutorial).")
-        input()
-        input("The first question is about your goal.")
-        input("You will now be shown all possible entries for this question, "+
-              "hopefully making clear what the question is about.\n")
-        input("If you want to know your chances of obtaining your next 5-star character, "+
-              "just enter: any character.")
-        input("Please do not enter the name of the character, because this program "+
-              "doesn't know the names of Genshin characters.\n ")
-        input("If you want to know your odds of obtaining your next 5-star weapon "+
-              "on the weapon banner, just enter: any weapon. Note that this program also doesn't "+
-              "recognize weapon names.\n")
-        input("If you would like your odds of getting a featured 5-star character, enter: C0. " + 
-              "This is because a new 5-star character is a C0 character (it has constellation 0).\n")
-        input("You can also calculate your chances for higher constellations or more characters. "+
-              "Simply enter the constellation you want, for example: C2.")
-        input("Note that a C2 character is the same as getting featured characters three times.\n")
-        input("You can also calculate the chance of getting the 5-star weapon you select on the "+
-              "weapon banner. Enter 'R1' for the chances of obtaining the selected weapon once, "+ 
-              "and R2 for getting the weapon twice, etc.\n")
-        input("Lastly, you can also combine characters and weapons. For example, entering: C2R1 "+
-              "means that you will calculate the odds of getting a featured character three times "+
-              "and the weapon you selected on the weapon banner.\n")
-        input("This is all you need to know about the 'goal' question, we will now review the "+
-              "rest of the program quickly.\n")
-        input("The next question you get is to enter the number of wishes. This is the number of "+
-              "wishes you want to calculate your chances for. For example, if you enter 50, the "+
-              "program will calculate your odds of obtaining your goal within 50 wishes.\n")
-        input("Next, depending on your goal, the program will ask about your pity for the "+
-              "character banner, the weapon banner or both. Your pity is the number of "+
-              "wishes that you have made after obtaining your previous 5-star item. You can"+
-              " check your pity in the wish history in Genshin Impact, or you can use a "+
-              "website as paimon.moe or a similar website to calculate your pity.\n")
-        input("After you get a standard character on a non-standard banner, you are guaranteed "+
-              "that the next 5-star is the featured 5-star character. This question asks "+
-              "whether this is the case or not.\n")
-        input("Finally, the program asks whether you want to see a graph of your chances. This "+
-              "question is pretty straightforward.\n Last, but not least: you can quit this program "+
-              "simply by hitting 'enter' as answer to a question.\n"+
-              "\n"+"Enjoy!\n")
-        tutorial = "no"
+if __name__ == "__main__":
+    running = True
+    noob = True
+
+    while running:
+        if noob:
+            print("Welcome to this wish chance calculator. The questions you will get "+
+                  "(if applicable) to calculate your odds, are:\n"+"\n"+
+                  "goal (any character, any weapon, C0, R1, C4R2, etc.):\n"+
+                  "number of wishes:\n"+
+                  "pity for the character banner:\n"+
+                  "guarantee (yes/no):\n"+
+                  "pity for the weapon banner:\n"+
+                  "Would you like to see a graph of your chances? (yes/no):\n"+"\n"+
+                  "The tutorial will explain each question in more detail.")
+            tutorial = input("Would you like to follow the tutorial? (yes/no): ")
+        noob = False
+    
+        if tutorial == "yes":
+            print("\n Welcome to the tutorial. You will now be guided step-by-step through" +  
+                  " program. Let's get started.\n" + 
+                  "(hit enter to reveal a new line of the tutorial).")
+            input()
+            input("The first question is about your goal.")
+            input("You will now be shown all possible entries for this question, "+
+                  "hopefully making clear what the question is about.\n")
+            input("If you want to know your chances of obtaining your next 5-star character, "+
+                  "just enter: any character.")
+            input("Please do not enter the name of the character, because this program "+
+                  "doesn't know the names of Genshin characters.\n ")
+            input("If you want to know your odds of obtaining your next 5-star weapon "+
+                  "on the weapon banner, just enter: any weapon. Note that this program also doesn't "+
+                  "recognize weapon names.\n")
+            input("If you would like your odds of getting a featured 5-star character, enter: C0. " + 
+                  "This is because a new 5-star character is a C0 character (it has constellation 0).\n")
+            input("You can also calculate your chances for higher constellations or more characters. "+
+                  "Simply enter the constellation you want, for example: C2.")
+            input("Note that a C2 character is the same as getting featured characters three times.\n")
+            input("You can also calculate the chance of getting the 5-star weapon you select on the "+
+                  "weapon banner. Enter 'R1' for the chances of obtaining the selected weapon once, "+ 
+                  "and R2 for getting the weapon twice, etc.\n")
+            input("Lastly, you can also combine characters and weapons. For example, entering: C2R1 "+
+                  "means that you will calculate the odds of getting a featured character three times "+
+                  "and the weapon you selected on the weapon banner.\n")
+            input("This is all you need to know about the 'goal' question, we will now review the "+
+                  "rest of the program quickly.\n")
+            input("The next question you get is to enter the number of wishes. This is the number of "+
+                  "wishes you want to calculate your chances for. For example, if you enter 50, the "+
+                  "program will calculate your odds of obtaining your goal within 50 wishes.\n")
+            input("Next, depending on your goal, the program will ask about your pity for the "+
+                  "character banner, the weapon banner or both. Your pity is the number of "+
+                  "wishes that you have made after obtaining your previous 5-star item. You can"+
+                  " check your pity in the wish history in Genshin Impact, or you can use a "+
+                  "website as paimon.moe or a similar website to calculate your pity.\n")
+            input("After you get a standard character on a non-standard banner, you are guaranteed "+
+                  "that the next 5-star is the featured 5-star character. This question asks "+
+                  "whether this is the case or not.\n")
+            input("Finally, the program asks whether you want to see a graph of your chances. This "+
+                  "question is pretty straightforward.\n Last, but not least: you can quit this program "+
+                  "simply by hitting 'enter' as answer to a question.\n"+
+                  "\n"+"Enjoy!\n")
+            tutorial = "no"
         
     
     
-    goal = input("goal (any character, any weapon, C0, R1, C4R2, etc.): ").lower()
-    if goal == "":
-        running = False
-        continue
-    wishes = input("number of wishes: ")
-    if wishes == "":
-        running = False
-        continue
-    wishes = int(wishes)
+        goal = input("goal (any character, any weapon, C0, R1, C4R2, etc.): ").lower()
+        if goal == "":
+            running = False
+            continue
+        wishes = input("number of wishes: ")
+        if wishes == "":
+            running = False
+            continue
+        wishes = int(wishes)
     
     
-    # --------- determining goal -------------
-    characters, refinements = 0,0
+        # --------- determining goal -------------
+        characters, refinements = 0,0
     
-    prev = ''
-    for letter in goal:
-        if letter.isdigit() == True and prev == "c":
-            characters = int(letter)+1
-        elif letter.isdigit() == True and prev == "r":
-            refinements = int(letter)
-        prev = letter
+        prev = ''
+        for letter in goal:
+            if letter.isdigit() == True and prev == "c":
+                characters = int(letter)+1
+            elif letter.isdigit() == True and prev == "r":
+                refinements = int(letter)
+            prev = letter
     
-    # ---------- determining next questions ----------
-    character_pity = 0
-    weapon_pity = 0
-    guarantee = "no"
+        # ---------- determining next questions ----------
+        character_pity = 0
+        weapon_pity = 0
+        guarantee = "no"
     
-    if characters>0 or goal == "any character":
-        character_pity = int(input("pity for the character banner: "))
-        if character_pity == "":
-            running = False
-            continue
-        if characters>0:
-            guarantee = input("guarantee (yes/no): ")
-            if guarantee == "":
+        if characters>0 or goal == "any character":
+            character_pity = int(input("pity for the character banner: "))
+            if character_pity == "":
                 running = False
                 continue
-    if refinements>0 or goal == "any weapon":
-        weapon_pity = int(input("pity for the weapon banner: "))
-        if weapon_pity == "":
-            continue
+            if characters>0:
+                guarantee = input("guarantee (yes/no): ")
+                if guarantee == "":
+                    running = False
+                    continue
+        if refinements>0 or goal == "any weapon":
+            weapon_pity = int(input("pity for the weapon banner: "))
+            if weapon_pity == "":
+                continue
     
-    graph = input("Would you like to see a graph of your chances? (yes/no): ")
-    print("")
-    if graph == "":
-        running = False
-        continue
-    if graph == "yes":
-        plot(chance(goal, range(wishes+40), character_pity, weapon_pity, guarantee), 
-             "Chance of pulling " + goal, "chance", "number of pulls")
-    else:
-        print("The chance of obtaining your goal is: ")
-        chance(goal, wishes, character_pity, weapon_pity, guarantee)
-    print("")
+        graph = input("Would you like to see a graph of your chances? (yes/no): ")
+        print("")
+        if graph == "":
+            running = False
+            continue
+        if graph == "yes":
+            plot(chance(goal, range(wishes+40), character_pity, weapon_pity, guarantee), 
+                 "Chance of pulling " + goal, "chance", "number of pulls")
+        else:
+            print("The chance of obtaining your goal is: ")
+            chance(goal, wishes, character_pity, weapon_pity, guarantee)
+        print("")
 
 
 # -------------------------- test space ------------------------------
 
 def get_character_proba(number_of_wishes, number_of_5_stars_char, initial_pity_char=0):
-    
-
-
-
-
-
-
-
-
-
-
-
-
+    return chance("C" + str(number_of_5_stars_char - 1), number_of_wishes, initial_pity_char)
@@ -0,0 +1,262 @@
+import numpy as np
+import pytest
+
+import genshin_stats
+
+# 20 000 trials per check, 5 standard deviations of the binomial and a few
+# trials of slack for the tails where the normal approximation is poor
+NUMBER_OF_TRIALS = 20_000
+
+
+def binomial_tolerance(p, n=NUMBER_OF_TRIALS):
+    return 5 * np.sqrt(p * (1 - p) / n) + 5 / n
+
+
+@pytest.mark.parametrize("banner, number_of_wanted_5_stars", [
+    (genshin_stats.CharBanner(), 1),
+    (genshin_stats.CharBanner(), 3),
+    (genshin_stats.CharBanner(initial_pity=70), 1),
+    (genshin_stats.WeaponBanner(), 2),
+])
+def test_batch_matches_exact_cdf(banner, number_of_wanted_5_stars):
+    rng = np.random.default_rng(1)
+    spent = banner.pull_until_wanted_5_star_batch(NUMBER_OF_TRIALS, number_of_wanted_5_stars, rng)
+    exact = banner.exact_cdf(int(spent.max()), number_of_wanted_5_stars)
+    simulated = genshin_stats.PullHistogram().add(spent).cdf()
+    assert np.all(np.abs(simulated - exact) <= binomial_tolerance(exact))
+
+
+def test_try_pull_batch_matches_exact_cdf():
+    banner = genshin_stats.CharBanner()
+    exact = banner.exact_cdf(200, 2)
+    for number_of_wishes in (60, 120, 200):
+        success, _ = banner.try_pull_batch(NUMBER_OF_TRIALS, number_of_wishes, 2, np.random.default_rng(number_of_wishes))
+        assert abs(success.mean() - exact[number_of_wishes]) <= binomial_tolerance(exact[number_of_wishes])
+
+
+@pytest.mark.parametrize("number_of_wishes, number_of_wanted_5_stars, number_of_wanted_char_5_stars", [(90, 1, 1), (150, 2, 1), (300, 3, 2), (80, 1, 0)])
+def test_combined_batch_matches_exact_proba(number_of_wishes, number_of_wanted_5_stars, number_of_wanted_char_5_stars):
+    combined_banner = genshin_stats.CombinedBanner()
+    success = combined_banner.test_number_of_pulls_batch(number_of_wishes, number_of_wanted_5_stars, number_of_wanted_char_5_stars, NUMBER_OF_TRIALS, np.random.default_rng(2))
+    exact = combined_banner.get_exact_proba(number_of_wishes, number_of_wanted_5_stars, number_of_wanted_char_5_stars) / 100
+    assert abs(success.mean() - exact) <= binomial_tolerance(exact)
+
+
+def test_batch_is_reproducible():
+    banner = genshin_stats.CharBanner()
+    first = banner.pull_until_wanted_5_star_batch(1_000, 2, np.random.default_rng(3))
+    second = banner.pull_until_wanted_5_star_batch(1_000, 2, np.random.default_rng(3))
+    assert first.tolist() == second.tolist()
+
+
+def test_try_pull_batch_remaining_wishes():
+    # a hard pity of 1 gives a 5-star on every wish and the weapon banner
+    # garentee the featured one on the second
+    banner = genshin_stats.WeaponBanner(rate_5_star=100, hard_pity=1, soft_pity_start=1)
+    success, remaining = banner.try_pull_batch(1_000, 5, 2, np.random.default_rng(4))
+    assert success.all()
+    # same count as try_pull: number_of_pulls - wishes spent + 2
+    assert set(remaining.tolist()) <= {3, 4, 5}
+    success, remaining = banner.try_pull_batch(10, 1, 3, np.random.default_rng(4))
+    assert not success.any() and not remaining.any()
+
+
+def test_exact_cdf_hand_computed():
+    # rates 0.5 then 1 on the second wish, a 5-star is the featured one with
+    # probability 0.375 and garenteed after a loss
+    banner = genshin_stats.WeaponBanner(rate_5_star=50, hard_pity=2, soft_pity_start=2)
+    assert banner.rate_table.tolist() == [0.5, 0.5, 1]
+    # 1 wish: 0.5 * 0.375
+    # 2 wishes: + 0.5 * 0.375 won on the second wish, + 0.5 * 0.625 * 0.5 lost then garenteed
+    # 3 wishes: only a loss on the second wish and no 5-star on the third misses, 0.5 * 0.625 * 0.5
+    assert banner.exact_cdf(4).tolist() == pytest.approx([0, 0.1875, 0.53125, 0.84375, 1])
+
+
+def test_exact_cdf_sums_outcomes():
+    banner = genshin_stats.CharBanner()
+    cdf = banner.exact_cdf(1_000, 2)
+    assert np.all(np.diff(cdf) >= 0)
+    assert cdf[-1] == pytest.approx(1, abs=1e-12)
+    assert banner.exact_cdf(10, 0).tolist() == [1] * 11
+
+
+@pytest.mark.parametrize("pity", [0, 89, 95])
+def test_exact_start_any_pity(pity):
+    banner = genshin_stats.CharBanner()
+    start = banner.exact_start(True, 1, pity)
+    assert start.sum() == 1 and start[banner.number_of_radiance_states + 1, pity] == 1
+    success, pulling = banner.exact_run(start, 1, 1)
+    # garenteed, and a 5-star is certain on the next wish from the hard pity on
+    assert success[1].sum() == pytest.approx(banner.calc_rate_batch(np.array([pity + 1]))[0])
+    assert success[1].sum() + pulling[1].sum() == pytest.approx(1)
+
+
+def test_parallel_does_not_depend_on_workers(monkeypatch):
+    # small chunks so the trials are spread over several workers
+    monkeypatch.setattr(genshin_stats, "CHUNK_SIZE", 2_000)
+    banner = genshin_stats.CharBanner()
+    serial = banner.test_banner_garentee_parallel(10_000, 2, seed=5, max_workers=1)
+    parallel = banner.test_banner_garentee_parallel(10_000, 2, seed=5, max_workers=3)
+    assert len(serial) == 10_000
+    assert serial.counts.tolist() == parallel.counts.tolist()
+    serial = banner.test_number_of_pulls_parallel(100, 1, 10_000, seed=5, max_workers=1)
+    parallel = banner.test_number_of_pulls_parallel(100, 1, 10_000, seed=5, max_workers=3)
+    assert (serial.successes, serial.trials) == (parallel.successes, parallel.trials)
+    combined_banner = genshin_stats.CombinedBanner()
+    serial = combined_banner.get_proba_parallel(150, 2, 1, 10_000, seed=5, max_workers=1)
+    assert combined_banner.get_proba_parallel(150, 2, 1, 10_000, seed=5, max_workers=3) == serial
+    assert combined_banner.get_proba_parallel(150, 2, 1, 10_000, seed=6, max_workers=1) != serial
+
+
+def test_pull_histogram():
+    histogram = genshin_stats.PullHistogram().add(np.array([1, 3, 3, 4])).add(2)
+    assert histogram.counts.tolist() == [0, 1, 1, 2, 1]
+    assert len(histogram) == 5
+    assert histogram.mean() == pytest.approx(13 / 5)
+    assert histogram.variance() == pytest.approx(np.var([1, 3, 3, 4, 2]))
+    assert histogram.cdf().tolist() == pytest.approx([0, 0.2, 0.4, 0.8, 1])
+    assert histogram.quantiles() == [2, 3, 3]
+    lower, upper = histogram.confidence_interval()
+    assert lower < histogram.mean() < upper
+    # larger pulls grow the histogram, merging works both ways
+    other = genshin_stats.PullHistogram().add([7])
+    assert genshin_stats.PullHistogram().merge(histogram).merge(other).counts.tolist() == [0, 1, 1, 2, 1, 0, 0, 1]
+    assert other.merge(histogram).counts.tolist() == [0, 1, 1, 2, 1, 0, 0, 1]
+
+
+def test_histogram_matches_list_results():
+    banner = genshin_stats.CharBanner()
+    spent = banner.pull_until_wanted_5_star_batch(5_000, 1, np.random.default_rng(7))
+    histogram = genshin_stats.PullHistogram().add(spent)
+    assert histogram.mean() == pytest.approx(spent.mean())
+    assert histogram.variance() == pytest.approx(spent.var())
+    assert histogram.quantile(0.5) == int(np.quantile(spent, 0.5, method="inverted_cdf"))
+
+
+def test_success_counter():
+    counter = genshin_stats.SuccessCounter().add(True).add(np.array([True, False, False]))
+    assert (counter.successes, counter.trials, len(counter)) == (2, 4, 4)
+    assert counter.proportion() == 0.5
+    counter.merge(genshin_stats.SuccessCounter(3, 4))
+    assert counter.proportion() == 5 / 8
+
+
+def test_confidence_intervals():
+    # 5 / 10 at 95%, Wilson (0.2366, 0.7634) and Clopper-Pearson (0.1871, 0.8129)
+    counter = genshin_stats.SuccessCounter(5, 10)
+    assert counter.confidence_interval() == pytest.approx((0.2366, 0.7634), abs=1e-4)
+    assert counter.confidence_interval(method="clopper-pearson") == pytest.approx((0.1871, 0.8129), abs=1e-4)
+    # no success: the Clopper-Pearson upper bound is 1 - 0.025 ** (1 / n)
+    assert genshin_stats.SuccessCounter(0, 10).confidence_interval(method="clopper-pearson") == pytest.approx((0, 1 - 0.025 ** 0.1))
+    assert genshin_stats.SuccessCounter(10, 10).confidence_interval(method="clopper-pearson") == pytest.approx((0.025 ** 0.1, 1))
+    with pytest.raises(ValueError):
+        counter.confidence_interval(method="wald")
+
+
+def test_empty_counter():
+    with pytest.raises(ValueError):
+        genshin_stats.SuccessCounter().proportion()
+    with pytest.raises(ValueError):
+        genshin_stats.SuccessCounter().confidence_interval()
+
+
+def test_adaptive_stops_at_the_width():
+    combined_banner = genshin_stats.CombinedBanner()
+    res = combined_banner.test_number_of_pulls_adaptive(150, 2, 1, ci_width=2, seed=8)
+    lower, upper = res.confidence_interval()
+    assert (upper - lower) * 100 <= 2
+    exact = combined_banner.get_exact_proba(150, 2, 1) / 100
+    assert lower - 0.01 <= exact <= upper + 0.01
+    proba, trials = combined_banner.get_proba_adaptive(150, 2, 1, ci_width=2, seed=8)
+    assert (proba, trials) == (res.proportion() * 100, len(res))
+
+
+def test_adaptive_limits():
+    combined_banner = genshin_stats.CombinedBanner()
+    assert len(combined_banner.test_number_of_pulls_adaptive(150, 2, 1, ci_width=0.01, max_pulls=2_500, seed=9)) == 2_500
+    assert len(combined_banner.test_number_of_pulls_adaptive(150, 2, 1, ci_width=0.01, time_budget=0, seed=9)) == 1_000
+    for max_pulls in (0, -5):
+        with pytest.raises(ValueError):
+            combined_banner.test_number_of_pulls_adaptive(150, 2, 1, max_pulls=max_pulls)
+
+
+@pytest.mark.parametrize("banner, soft_pity_step", [(genshin_stats.CharBanner(), 6), (genshin_stats.WeaponBanner(), 7)])
+def test_get_proba_rates(banner, soft_pity_step):
+    rates = banner.get_proba()
+    assert len(rates) == banner.hard_pity
+    # the formula of calc_rate, in % for pulls 1 to hard_pity, capped at 100
+    expected = [banner.rate_5_star * 100 + soft_pity_step * max(0, pity - banner.soft_pity_start + 1) for pity in range(1, banner.hard_pity + 1)]
+    assert rates == pytest.approx(np.minimum(expected, 100).tolist())
+    # the uncapped formula went over 100 on the hard pity (102.6 on the character banner)
+    assert expected[-1] > 100 and rates[-1] == 100
+    assert rates[banner.soft_pity_start - 2] == pytest.approx(banner.rate_5_star * 100)
+
+
+@pytest.mark.parametrize("number_of_wishes, number_of_5_stars_char, number_of_5_stars_weapon", [(150, 1, 1), (300, 2, 1), (120, 1, 0), (100, 0, 1)])
+def test_best_allocation(number_of_wishes, number_of_5_stars_char, number_of_5_stars_weapon):
+    combined_banner = genshin_stats.CombinedBanner()
+    char_wishes, split_proba, sequential_proba = genshin_stats.get_best_allocation(number_of_wishes, number_of_5_stars_char, number_of_5_stars_weapon)
+    char_cdf = combined_banner.char_banner.exact_cdf(number_of_wishes, number_of_5_stars_char)
+    weapon_cdf = combined_banner.weapon_banner.exact_cdf(number_of_wishes, number_of_5_stars_weapon)
+    # every fixed split tried by hand
+    splits = [char_cdf[wishes] * weapon_cdf[number_of_wishes - wishes] for wishes in range(number_of_wishes + 1)]
+    assert split_proba == pytest.approx(max(splits) * 100)
+    assert splits[char_wishes] == max(splits)
+    # pulling each banner until its goal: the total wishes needed fit in the budget
+    needed = sum((char_cdf[a] - (char_cdf[a - 1] if a else 0)) * weapon_cdf[number_of_wishes - a] for a in range(number_of_wishes + 1))
+    assert sequential_proba == pytest.approx(needed * 100)
+    assert sequential_proba >= split_proba - 1e-9
+
+
+def test_best_allocation_single_banner():
+    # without weapon goal every wish goes to the character banner
+    char_wishes, split_proba, sequential_proba = genshin_stats.get_best_allocation(120, 1, 0)
+    assert char_wishes == 120
+    assert split_proba == pytest.approx(sequential_proba)
+    assert split_proba == pytest.approx(genshin_stats.CharBanner().exact_cdf(120)[-1] * 100)
+
+
+def test_starglitter_refunds():
+    five_star = np.array([True, True, False, False, False])
+    wanted = np.array([False, True, False, False, False])
+    four_star = np.array([False, False, True, True, False])
+    featured = np.array([False, False, True, False, False])
+    rng = np.random.default_rng(10)
+    assert genshin_stats.WeaponBanner().starglitter_batch(five_star, wanted, four_star, featured, rng).tolist() == [10, 10, 2, 2, 0]
+    # the featured 4-stars of the character banner give nothing on the first
+    # copy, 2 up to the 7th and 5 after, rng picks which of the 3 came out
+    banner = genshin_stats.CharBanner()
+    banner.init_batch(1)
+    draws = np.random.default_rng(11)
+    counts = [0, 0, 0]
+    rng = np.random.default_rng(11)
+    for _ in range(30):
+        refund = banner.starglitter_batch(np.array([False]), np.array([False]), np.array([True]), np.array([True]), rng)
+        last_4_star = draws.integers(0, 3, 1)[0]
+        counts[last_4_star] += 1
+        assert refund.tolist() == [5 if counts[last_4_star] > 7 else 2 if counts[last_4_star] > 1 else 0]
+
+
+def test_funded_pulls_without_starglitter_match_exact():
+    # without refunds both banners share the paid wishes, as the sequential policy of get_best_allocation
+    _, _, sequential_proba = genshin_stats.get_best_allocation(200, 1, 1)
+    proba = genshin_stats.get_funded_proba(200, 1, 1, number_of_pulls=NUMBER_OF_TRIALS, use_starglitter=False, seed=12) / 100
+    assert abs(proba - sequential_proba / 100) <= binomial_tolerance(sequential_proba / 100)
+    assert genshin_stats.get_funded_proba(200, 1, 1, number_of_pulls=NUMBER_OF_TRIALS, seed=12) / 100 > proba
+
+
+def test_funded_pulls_seed():
+    combined_banner = genshin_stats.CombinedBanner()
+    first = combined_banner.get_funded_proba(150, 2, 1, number_of_pulls=2_000, seed=13)
+    assert combined_banner.get_funded_proba(150, 2, 1, number_of_pulls=2_000, seed=13) == first
+    assert combined_banner.get_funded_proba(150, 2, 1, number_of_pulls=2_000, rng=np.random.default_rng(13)) == first
+    assert genshin_stats.get_funded_proba(150, 1, 1, number_of_pulls=2_000, seed=13) == first
+    assert combined_banner.get_funded_proba(150, 2, 1, number_of_pulls=2_000, seed=14) != first
+
+
+def test_funded_pulls_with_starglitter_only():
+    combined_banner = genshin_stats.CombinedBanner()
+    # no paid wish, 1 000 wishes worth of starglitter
+    res = combined_banner.test_funded_pulls(0, 2, 1, 5_000, number_of_pulls=1_000, seed=15)
+    assert res.proportion() == 1
+    assert combined_banner.test_funded_pulls(0, 2, 1, 5_000, number_of_pulls=1_000, use_starglitter=False, seed=15).proportion() == 0
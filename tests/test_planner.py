@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import genshin_stats
+import planner
+from planner import PlannedBanner
+
+
+@pytest.fixture
+def hard_pity_1(monkeypatch):
+    # a 5-star on every wish, so only the 50/50s and the garentees are left
+    monkeypatch.setattr(planner, "CharBanner", lambda initial_pity=0: genshin_stats.CharBanner(100, 1, 1, initial_pity))
+    monkeypatch.setattr(planner, "WeaponBanner", lambda initial_pity=0: genshin_stats.WeaponBanner(100, 1, 1, initial_pity))
+
+
+def test_hand_case(hard_pity_1):
+    # the featured character on the first wish half the time, garenteed on the second
+    assert planner.plan_wishes([PlannedBanner(1, 1, 0)]).joint == pytest.approx(0.5)
+    assert planner.plan_wishes([PlannedBanner(2, 1, 0)]).joint == pytest.approx(1)
+    # the weapon 0.375 on a wish, then garenteed
+    assert planner.plan_wishes([PlannedBanner(1, 0, 1)]).joint == pytest.approx(0.375)
+    # character then weapon on 2 wishes: both first try only
+    assert planner.plan_wishes([PlannedBanner(2, 1, 1)]).joint == pytest.approx(0.5 * 0.375)
+
+
+def test_garentee_carried_over(hard_pity_1):
+    # a loss on the first banner leaves the garentee for the second:
+    # 0.5 * 0.5 after a win, 0.5 * 1 after a loss
+    result = planner.plan_wishes([PlannedBanner(1, 1, 0), PlannedBanner(1, 1, 0)])
+    assert result.targets == pytest.approx([0.5, 0.75])
+    assert result.cumulative == pytest.approx([0.5, 0.25])
+    assert result.joint == pytest.approx(0.25)
+    result = planner.plan_wishes([PlannedBanner(1, 0, 1), PlannedBanner(1, 0, 1)])
+    assert result.targets == pytest.approx([0.375, 0.375 * 0.375 + 0.625])
+    # a garentee given at the start
+    assert planner.plan_wishes([PlannedBanner(1, 1, 0)], garentee_char=True).joint == pytest.approx(1)
+
+
+def test_wishes_carried_over(hard_pity_1):
+    # the wish left after a first try win is spent on the next banner
+    result = planner.plan_wishes([PlannedBanner(2, 1, 0), PlannedBanner(0, 1, 0)])
+    assert result.targets == pytest.approx([1, 0.25])
+
+
+def test_pity_carried_over():
+    # the second banner is met when the first C0 comes in its wishes after a
+    # miss, or when the second C0 comes within the 100 wishes after a first
+    # C0 on the first banner, from the radiance it left
+    char_banner = genshin_stats.CharBanner()
+    one = char_banner.exact_cdf(100)
+    first, _ = char_banner.exact_run(char_banner.exact_start(), 1, 50)
+    after = [np.cumsum(char_banner.exact_run(char_banner.exact_start(False, radiance, 0), 1, 100)[0].sum(axis=1)) for radiance in range(first.shape[1])]
+    both = sum(first[k, radiance] * after[radiance][100 - k] for k in range(51) for radiance in range(first.shape[1]))
+    result = planner.plan_wishes([PlannedBanner(50, 1, 0), PlannedBanner(50, 1, 0)])
+    assert result.targets == pytest.approx([one[50], one[100] - one[50] + both], abs=1e-12)
+    assert result.joint == pytest.approx(both, abs=1e-12)
+    # a banner without target leaves its wishes and the pity untouched
+    assert planner.plan_wishes([PlannedBanner(30, 0, 0), PlannedBanner(60, 1, 0)]).targets[1] == pytest.approx(char_banner.exact_cdf(90)[90], abs=1e-12)
+    # the 90th wish is a sure 5-star
+    assert planner.plan_wishes([PlannedBanner(1, 1, 0)], initial_pity_char=89).joint == pytest.approx(0.5)
+    weapon_banner = genshin_stats.WeaponBanner(initial_pity=40)
+    assert planner.plan_wishes([PlannedBanner(60, 0, 1)], initial_pity_weapon=40).joint == pytest.approx(weapon_banner.exact_cdf(60)[60], abs=1e-12)
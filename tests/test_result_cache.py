@@ -0,0 +1,101 @@
+import threading
+
+import numpy as np
+import pytest
+
+import result_cache
+
+
+@pytest.fixture
+def cache():
+    res = result_cache.enable_cache(":memory:")
+    yield res
+    result_cache.disable_cache()
+
+
+def test_put_get_round_trip(cache):
+    cache.put("scalar", 0.25)
+    cache.put("array", np.arange(5.0))
+    assert cache.get("scalar") == 0.25
+    assert cache.get("array").tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert cache.get("missing") is None
+
+
+def test_least_recently_used_evicted():
+    cache = result_cache.ResultCache(":memory:", max_size=1000)
+    cache.put("old", np.zeros(50))
+    cache.put("new", np.zeros(50))
+    assert cache.get("old") is None
+    assert cache.get("new") is not None
+    assert cache.size() <= 1000
+
+
+def test_persistent_key_normalized(cache):
+    calls = []
+
+    @result_cache.persistent("test.add", lambda: 1)
+    def add(a, b=0):
+        calls.append((a, b))
+        return a + b
+
+    assert add(1) == add(1, 0) == add(a=1) == add(b=0, a=1) == 1
+    assert calls == [(1, 0)]
+    assert add(1, 2) == 3
+    assert len(calls) == 2
+
+
+def test_persistent_rules_in_key(cache):
+    rules = [1]
+
+    @result_cache.persistent("test.rules", lambda: rules[0])
+    def value():
+        return rules[0]
+
+    assert value() == 1
+    rules[0] = 2
+    assert value() == 2
+
+
+def test_threads_share_cache(cache):
+    errors = []
+
+    def work(thread):
+        try:
+            for index in range(20):
+                cache.put(f"{thread}:{index}", index)
+                assert cache.get(f"{thread}:{index}") == index
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=work, args=(thread,)) for thread in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(cache) == 80
+
+
+def test_disabled_by_default():
+    assert result_cache.cache is None
+
+    @result_cache.persistent("test.identity", lambda: 1)
+    def identity(a):
+        return a
+
+    assert identity(3) == 3
+
+
+def test_memo_under_persistent():
+    # values memoized before enable_cache still reach the disk cache
+    import test
+
+    test.get_wishes_distribution(1, 10)
+    cache = result_cache.enable_cache(":memory:")
+    try:
+        expected = test.get_wishes_distribution(1, 10)
+        assert len(cache) == 1
+        assert test.get_wishes_distribution(initial_pity_char=10, number_of_5_stars_char=1).tolist() == expected.tolist()
+        assert len(cache) == 1
+    finally:
+        result_cache.disable_cache()
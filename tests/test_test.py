@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+import test
+
+GOALS = [
+    # (characters, character pity, guarantee, weapons, weapon pity, guarantee)
+    (1, 0, False, 0, 0, False),
+    (3, 0, False, 1, 0, False),
+    (7, 0, False, 5, 0, False),
+    (1, 70, True, 0, 0, False),
+    (0, 0, False, 2, 60, True),
+    (2, 89, False, 2, 76, True),
+]
+
+
+def test_first_5_star_table_hand_computed():
+    rules = test.BannerRules(0.5, 1, 0.25, 3)
+    # chances 0.5, 0.75, 1 on pulls 1 to 3, nothing on pull 0
+    assert test.first_5_star_table(rules).tolist() == pytest.approx([0, 0.5, 0.5 * 0.75, 0.5 * 0.25])
+    assert test.first_5_star_table(rules, 1).tolist() == pytest.approx([0, 0.75, 0.25])
+
+
+@pytest.mark.parametrize("rules", [test.CHAR_RULES, test.WEAPON_RULES])
+def test_tables_sum_to_one(rules):
+    for pity in (0, 50, rules.hard_pity - 1):
+        assert test.first_5_star_table(rules, pity).sum() == pytest.approx(1, abs=1e-12)
+        assert test.featured_char_table(rules, pity).sum() == pytest.approx(1, abs=1e-12)
+        assert test.featured_weapon_table(rules, pity).sum() == pytest.approx(1, abs=1e-12)
+
+
+@pytest.mark.parametrize("goal", GOALS)
+def test_wishes_distribution_sums_to_one(goal):
+    assert test.get_wishes_distribution(*goal).sum() == pytest.approx(1, abs=1e-12)
+
+
+@pytest.mark.parametrize("goal", GOALS)
+def test_quantiles_agree_with_get_proba(goal):
+    characters, character_pity, character_guarantee, weapons, weapon_pity, weapon_guarantee = goal
+    quantiles = (0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+    stats = test.get_wishes_stats(*goal, quantiles=quantiles)
+    for q, wishes in zip(quantiles, stats.quantiles):
+        # the quantile is the smallest number of wishes with get_proba >= q
+        assert test.get_proba(wishes, characters, character_pity, character_guarantee, weapons, weapon_pity, weapon_guarantee) >= q - 1e-12
+        assert test.get_proba(wishes - 1, characters, character_pity, character_guarantee, weapons, weapon_pity, weapon_guarantee) < q
+
+
+def test_wishes_stats_guaranteed_hard_pity():
+    # pity 89 with the guarantee: the next pull is the featured 5★
+    stats = test.get_wishes_stats(1, 89, True)
+    assert stats.mean == pytest.approx(1)
+    assert stats.variance == pytest.approx(0, abs=1e-12)
+    assert stats.quantiles == [1, 1, 1, 1]
+
+
+def test_get_proba_without_wishes():
+    assert test.get_proba(0, 1) == 0
+    assert test.get_proba(90, 0) == 1.0
+    assert np.isclose(test.get_proba(90, 1, 0, True), 1)
+
+
+@pytest.mark.parametrize("characters, weapons", [(1, 0), (0, 1), (2, 1), (3, 2)])
+def test_get_proba_surface_matches_get_proba(characters, weapons):
+    wishes = [0, 1, 75, 160, 300]
+    char_pities, char_guarantees = (0, 40, 85), (False, True)
+    weapon_pities, weapon_guarantees = (0, 70), (False, True)
+    surface = test.get_proba_surface(wishes, characters, char_pities, char_guarantees, weapons, weapon_pities, weapon_guarantees)
+    assert surface.shape == (5, 3, 2, 2, 2)
+    for index in np.ndindex(surface.shape):
+        w, cp, cg, wp, wg = index
+        expected = test.get_proba(wishes[w], characters, char_pities[cp], char_guarantees[cg], weapons, weapon_pities[wp], weapon_guarantees[wg])
+        assert surface[index] == pytest.approx(expected, abs=1e-12)
+
+
+def test_get_proba_surface_without_goal():
+    assert np.all(test.get_proba_surface([10, 20], 0, (0, 5), (False,), 0) == 1)
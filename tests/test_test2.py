@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+import test2
+
+
+def test_power_matches_repeated_convolution():
+    distribution = test2.FirstFiveStar(test2.drop_chance_w)
+    for n in range(7):
+        chain = test2.Delta()
+        for _ in range(n):
+            chain = test2.Convolution(chain, distribution)
+        assert np.allclose(test2.power(distribution, n).extend(500), chain.extend(500))
+
+
+def test_power_node_count_is_logarithmic():
+    def nodes(distribution, seen):
+        # distinct Convolution nodes, the squares are shared
+        if isinstance(distribution, test2.Convolution) and id(distribution) not in seen:
+            seen.add(id(distribution))
+            nodes(distribution.f, seen)
+            nodes(distribution.g, seen)
+        return len(seen)
+
+    # 6 squares and 1 convolution per set bit for n = 127
+    assert nodes(test2.power(test2.Delta(), 127), set()) == 6 + 7
+
+
+def test_extend_is_incremental():
+    distribution = test2.goal_distribution(3, 1)
+    short = distribution.extend(200).copy()
+    assert np.allclose(distribution.extend(600)[:200], short)
+    assert np.allclose(test2.goal_distribution.__wrapped__(3, 1).extend(600), distribution.extend(600))
+
+
+def test_distribution_is_abstract():
+    with pytest.raises(TypeError):
+        test2.Distribution()
+
+
+def test_memo_is_bounded():
+    test2.first_char.cache_clear()
+    for pity in range(test2.CACHE_SIZE + 10):
+        test2.first_char(pity)
+    assert test2.first_char.cache_info().currsize <= test2.CACHE_SIZE
+
+
+def test_chance_of_any_character():
+    # 1 - product of the no 5-star chances of the first 90 pulls, with hard pity
+    assert test2.chance("any character", 90) == 100.0
+    assert test2.chance("any character", 10) == round((1 - 0.994 ** 10) * 100, 2)